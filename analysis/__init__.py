@@ -4,4 +4,11 @@
 @Author: TZ
 @Date: 2024/09/06 11:46
 @Desc: This script is designed to handle data loading tasks.
-'''
\ No newline at end of file
+'''
+
+import os
+
+# Figures are only ever rendered to files, so matplotlib is forced onto the non-interactive Agg backend.
+# This avoids probing for a GUI toolkit on import, which is slow and fails on headless machines.
+# Nothing heavy is imported here: the modules import scikit-learn, matplotlib and joblib when they are first used.
+os.environ['MPLBACKEND'] = 'Agg'
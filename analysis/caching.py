@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/09/20 10:12
+@Desc: This module provides a binary columnar cache for raw input documents, 
+       and a content-addressed cache for the results of the analysis stages.
+       Each parsed document is stored next to its source as per-column .npy files, grouped in row groups,
+       so that later loads can memory-map the columns instead of parsing the text again.
+       Stage results are keyed by a fingerprint of the input data, the stage code (including the helpers it calls
+       and the configuration it reads) and the stage parameters, so that a rerun only recomputes the stages
+       from the first changed one onward.
+'''
+
+from .config import DATA_CACHE_CONFIG, STAGE_CACHE_CONFIG
+from .report_generation import ReportRecorder
+import pandas as pd
+import numpy as np
+import inspect
+import hashlib
+import pickle
+import shutil
+import json
+import os
+
+
+CACHE_FORMAT_VERSION = 2
+
+
+class ColumnarCache:
+    """A per-column .npy cache of one source document.
+
+    The cache is keyed by the absolute source path, its size, its modification time and a SHA-256
+    hash of its content. It is rebuilt automatically whenever the source changes.
+    Nothing is pickled: text columns are stored as fixed-width unicode arrays with a mask of the missing values,
+    and the dtype of every column is recorded so that loads return the dtypes the document was parsed with.
+    Documents with other columns (e.g. mixed Python objects) are not cached.
+    A document parsed with explicit dtypes (e.g. {'zip': str}, which keeps leading zeros) has its own cache.
+    """
+
+    def __init__(self, source_path, cache_dir=None, dtype=None):
+        """Initializes the cache of a source document.
+
+        Args:
+            source_path (str): The path of the source document.
+            cache_dir (str, optional): The directory of the cache. Defaults to a directory
+                named after the source inside DATA_CACHE_CONFIG['cache_dir'], next to the source, 
+                with a suffix identifying the dtype.
+            dtype (dict, optional): The explicit dtypes the document is parsed with.
+        """
+        self.source_path = os.path.abspath(source_path)
+        self.dtype = _dtype_key(dtype)
+        if cache_dir is None:
+            name = os.path.basename(self.source_path)
+            if self.dtype is not None:
+                name = f"{name}.dtype-{hashlib.sha256(self.dtype.encode('utf-8')).hexdigest()[:16]}"
+            cache_dir = os.path.join(os.path.dirname(self.source_path), DATA_CACHE_CONFIG['cache_dir'], name)
+        self.cache_dir = cache_dir
+        self.meta_path = os.path.join(cache_dir, 'meta.json')
+
+    def is_valid(self) -> bool:
+        """Checks whether the cache matches the current source document.
+
+        The size and modification time are checked first. The content hash is only computed
+        when the size matches but the modification time differs, e.g. after the source was touched or copied.
+
+        Returns:
+            bool: True if the cache can be used, False if it has to be rebuilt.
+        """
+        meta = self._read_meta()
+        if meta is None or meta.get('version') != CACHE_FORMAT_VERSION or meta.get('source') != self.source_path:
+            return False
+        if meta.get('dtype') != self.dtype:
+            return False
+        stat = os.stat(self.source_path)
+        if stat.st_size != meta['size']:
+            return False
+        if stat.st_mtime_ns == meta['mtime_ns']:
+            return True
+        if _file_digest(self.source_path) != meta['sha256']:
+            return False
+        # Same content with a new modification time, so only the key needs to be refreshed
+        meta['mtime_ns'] = stat.st_mtime_ns
+        self._write_meta(meta, self.cache_dir)
+        return True
+
+    def n_rows(self) -> int:
+        """Returns the number of rows in the cached document."""
+        meta = self._read_meta()
+        return sum(meta['row_groups']) if meta else 0
+
+    def load(self, usecols=None) -> pd.DataFrame:
+        """Loads the cached document as a DataFrame, memory-mapping the columns.
+
+        Args:
+            usecols (list, optional): The subset of columns to load. Other columns are never read.
+
+        Returns:
+            pd.DataFrame: The cached data.
+        """
+        meta = self._read_meta()
+        columns = self._select_columns(meta, usecols)
+        # Row groups are concatenated like the parsed chunks would be, which may differ in dtype
+        frames = [pd.DataFrame({column: self._load_column(meta, group, index) for index, column in columns}, copy=False)
+                  for group in range(len(meta['row_groups']))]
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def iter_chunks(self, chunksize, usecols=None):
+        """Yields the cached document as DataFrame chunks of at most chunksize rows.
+
+        Args:
+            chunksize (int): The number of rows per chunk.
+            usecols (list, optional): The subset of columns to load.
+
+        Yields:
+            pd.DataFrame: The next chunk of the cached data.
+        """
+        meta = self._read_meta()
+        columns = self._select_columns(meta, usecols)
+        for group, n_rows in enumerate(meta['row_groups']):
+            arrays = {column: self._load_column(meta, group, index) for index, column in columns}
+            for start in range(0, n_rows, chunksize):
+                yield pd.DataFrame({column: array[start:start + chunksize] for column, array in arrays.items()}, copy=False)
+
+    def build(self, chunks):
+        """Rebuilds the cache from an iterable of DataFrame chunks, yielding each chunk as it is written.
+
+        Every chunk becomes one row group, so the cache can be built while the source is streamed.
+        The new cache only replaces the old one once the iterable is exhausted;
+        if the consumer stops early, or a column cannot be stored without pickling, the partial cache is discarded.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): The parsed source document, with all columns and parsed with the dtype of the cache.
+
+        Yields:
+            pd.DataFrame: The chunks passed in, unchanged.
+        """
+        stat = os.stat(self.source_path)
+        build_dir = f'{self.cache_dir}.building.{os.getpid()}'
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+        row_groups = []
+        dtypes = []
+        columns = None
+        storable = True
+        completed = False
+        try:
+            for chunk in chunks:
+                if columns is None:
+                    columns = chunk.columns.tolist()
+                if storable:
+                    group_dtypes = [_save_column(build_dir, len(row_groups), index, chunk[column])
+                                    for index, column in enumerate(columns)]
+                    storable = None not in group_dtypes
+                    row_groups.append(chunk.shape[0])
+                    dtypes.append(group_dtypes)
+                yield chunk
+            completed = storable
+        finally:
+            if completed:
+                meta = {
+                    'version': CACHE_FORMAT_VERSION,
+                    'source': self.source_path,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'sha256': _file_digest(self.source_path),
+                    'dtype': self.dtype,
+                    'columns': columns or [],
+                    'row_groups': row_groups,
+                    'dtypes': dtypes,
+                }
+                self._write_meta(meta, build_dir)
+                shutil.rmtree(self.cache_dir, ignore_errors=True)
+                os.replace(build_dir, self.cache_dir)
+            else:
+                shutil.rmtree(build_dir, ignore_errors=True)
+
+    def clear(self):
+        """Removes the cache from disk."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _load_column(self, meta, group, index):
+        path = os.path.join(self.cache_dir, _array_name(group, index))
+        # Copy-on-write mapping: pages are shared with the file until they are modified
+        values = np.load(path, mmap_mode='c')
+        dtype = meta['dtypes'][group][index]
+        if values.dtype.kind != 'U':
+            return values
+        # Text is restored with its missing values, as the object or string dtype it was parsed as
+        missing = np.load(os.path.join(self.cache_dir, _mask_name(group, index)))
+        text = values.astype(object)
+        text[missing] = np.nan
+        return text if dtype == 'object' else pd.array(text, dtype=dtype)
+
+    def _select_columns(self, meta, usecols):
+        columns = list(enumerate(meta['columns']))
+        if usecols is None:
+            return columns
+        missing = set(usecols) - set(meta['columns'])
+        if missing:
+            raise ValueError(f'Columns not found in {self.source_path}: {sorted(missing)}')
+        return [(index, column) for index, column in columns if column in usecols]
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta, directory):
+        path = os.path.join(directory, 'meta.json')
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(f'{path}.tmp', path)
+
+
+class StageCache:
+    """A size-bounded, content-addressed cache of analysis stage results.
+
+    A stage is a function called as stage(data, pdf=pdf, **params) that returns a DataFrame,
+    such as remove_duplicates, handle_missing_values, handle_outliers or select_features.
+    The cached entry holds the returned DataFrame together with the report section the stage added
+    to the PDF and the figures it referenced, so that a cache hit reproduces the same report.
+    The least recently used entries are evicted once the cache grows beyond its size limit.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, enabled=None):
+        """Initializes the stage cache.
+
+        Args:
+            cache_dir (str, optional): The directory of the cache. Defaults to STAGE_CACHE_CONFIG['cache_dir'].
+            max_bytes (int, optional): The size limit of the cache. Defaults to STAGE_CACHE_CONFIG['max_bytes'].
+            enabled (bool, optional): Whether results are cached at all. Defaults to STAGE_CACHE_CONFIG['enabled'].
+        """
+        self.cache_dir = cache_dir or STAGE_CACHE_CONFIG['cache_dir']
+        self.max_bytes = max_bytes if max_bytes is not None else STAGE_CACHE_CONFIG['max_bytes']
+        self.enabled = enabled if enabled is not None else STAGE_CACHE_CONFIG['enabled']
+        self._pending = []
+
+    def run(self, stage, data, pdf=None, renderer=None, **params) -> pd.DataFrame:
+        """Runs a stage, or loads its result from the cache if the stage has already run on the same input.
+
+        Args:
+            stage (callable): The stage function.
+            data (pd.DataFrame): The input DataFrame of the stage.
+            pdf (PDF, optional): An optional PDF object for report generation.
+            renderer (FigureRenderer, optional): An optional renderer for the figures of the stage. It is not part of the cache key.
+            **params: The parameters of the stage (e.g. method, threshold, group_by, negative_values).
+
+        Returns:
+            pd.DataFrame: The result of the stage.
+        """
+        if renderer is not None:
+            params_with_renderer = dict(params, renderer=renderer)
+        else:
+            params_with_renderer = params
+        if not self.enabled:
+            return stage(data, pdf=pdf, **params_with_renderer)
+
+        key = stage_key(stage, data, params)
+        entry = self._load(key)
+        if entry is not None:
+            print('+------------------------------------------------------------------------------------------------------------+')
+            print(f'Stage {stage.__name__} is unchanged, loaded the cached result.')
+            result, recorder = entry['data'], entry['report']
+            _restore_images(entry['images'])
+        else:
+            recorder = ReportRecorder()
+            result = stage(data, pdf=recorder, **params_with_renderer)
+            self._pending.append((key, result, recorder))
+            if renderer is None:
+                self.flush()
+
+        if pdf is not None:
+            recorder.replay(pdf)
+        return result
+
+    def flush(self):
+        """Stores the results of the stages that ran since the last flush.
+
+        Entries are only stored once the figures of their stages have been rendered, so when stages render 
+        in the background this is deferred until flush() is called, e.g. at the end of the pipeline.
+        """
+        for key, result, recorder in self._pending:
+            self._store(key, {'data': result, 'report': recorder.resolve(), 'images': _read_images(recorder.image_paths())})
+        self._pending = []
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits into its size limit."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """Removes all entries from the cache."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((os.path.join(self.cache_dir, name), stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def _load(self, key):
+        path = os.path.join(self.cache_dir, f'{key}.pkl')
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except Exception:
+            # Any entry that cannot be unpickled, e.g. one stored by an older version of the classes it holds, is a miss
+            return None
+        # Mark the entry as recently used
+        os.utime(path)
+        return entry
+
+    def _store(self, key, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, f'{key}.pkl')
+        with open(f'{path}.tmp', 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.tmp', path)
+
+
+def data_fingerprint(data) -> str:
+    """Computes a fingerprint of the content of a DataFrame, including its index, columns and dtypes.
+
+    Args:
+        data (pd.DataFrame): The DataFrame to fingerprint.
+
+    Returns:
+        str: The hexadecimal SHA-256 fingerprint.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in data.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def stage_key(stage, data, params) -> str:
+    """Computes the cache key of a stage run from the input data, the stage code and the stage parameters.
+
+    The code covers the stage and, recursively, the functions and classes of the analysis package it refers to 
+    (e.g. iqr_bounds and QuantileSketch for handle_outliers), and the configuration dicts they read 
+    (e.g. OUTLIER_CONFIG), so that changing a helper or a setting invalidates the cached results.
+
+    Args:
+        stage (callable): The stage function.
+        data (pd.DataFrame): The input DataFrame of the stage.
+        params (dict): The parameters of the stage.
+
+    Returns:
+        str: The hexadecimal SHA-256 cache key.
+    """
+    digest = hashlib.sha256()
+    for name, source in sorted(code_dependencies(stage).items()):
+        digest.update(name.encode())
+        digest.update(source.encode())
+    digest.update(repr(sorted(params.items())).encode())
+    digest.update(data_fingerprint(data).encode())
+    return digest.hexdigest()
+
+
+def code_dependencies(func, dependencies=None) -> dict:
+    """Collects the code a function depends on within the analysis package.
+
+    Args:
+        func (callable or type): The function (or class).
+        dependencies (dict, optional): The dependencies collected so far, which are extended.
+
+    Returns:
+        dict: The qualified names of the function and of the functions and classes of the package it refers to, 
+        directly or through each other, mapped to their source, and the names of the configuration dicts 
+        they read mapped to their contents. The functions of registries such as rendering.PLOTTERS are included as well.
+    """
+    dependencies = {} if dependencies is None else dependencies
+    # Instrumented functions are keyed by the code of the decorated function, not of the wrapper
+    func = inspect.unwrap(func)
+    name = f'{func.__module__}.{func.__qualname__}'
+    if name in dependencies:
+        return dependencies
+    try:
+        dependencies[name] = inspect.getsource(func)
+    except (OSError, TypeError):
+        code = getattr(func, '__code__', None)
+        dependencies[name] = repr((code.co_code, code.co_consts)) if code is not None else name
+
+    if isinstance(func, type):
+        members = [member for member in vars(func).values() if inspect.isfunction(member)]
+    elif inspect.isfunction(func):
+        members = [func]
+    else:
+        members = []
+    package = __name__.split('.')[0]
+    for member in members:
+        for global_name in _global_names(member.__code__):
+            value = member.__globals__.get(global_name)
+            if isinstance(value, dict) and global_name.endswith('_CONFIG'):
+                dependencies[f'config.{global_name}'] = repr(value)
+                candidates = []
+            elif isinstance(value, dict) and global_name.isupper():
+                # A registry of functions, such as the plotters of the rendering module
+                candidates = value.values()
+            else:
+                candidates = [value]
+            for candidate in candidates:
+                if (inspect.isfunction(candidate) or inspect.isclass(candidate)) and candidate.__module__.split('.')[0] == package:
+                    code_dependencies(candidate, dependencies)
+    return dependencies
+
+
+def _global_names(code):
+    # The names a function refers to, including those of its nested functions, lambdas and comprehensions
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _global_names(const)
+    return names
+
+
+def _read_images(paths):
+    images = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            images[path] = f.read()
+    return images
+
+
+def _restore_images(images):
+    # Figures may have been overwritten by another run since the entry was stored
+    for path, content in images.items():
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+
+def _array_name(group, index):
+    return f'rg{group:05d}_c{index:04d}.npy'
+
+
+def _mask_name(group, index):
+    return f'rg{group:05d}_c{index:04d}.missing.npy'
+
+
+def _save_column(directory, group, index, column):
+    """Saves a column of a row group without pickling.
+
+    Numeric, boolean and datetime columns are saved as they are. Object and string columns holding only text
+    are saved as a fixed-width unicode array, with the missing values in a separate boolean mask.
+
+    Returns:
+        str: The dtype of the column, or None if the column cannot be saved without pickling.
+    """
+    path = os.path.join(directory, _array_name(group, index))
+    if isinstance(column.dtype, np.dtype) and column.dtype != object:
+        np.save(path, column.to_numpy(), allow_pickle=False)
+        return str(column.dtype)
+    if column.dtype != object and not isinstance(column.dtype, pd.StringDtype):
+        return None
+    missing = column.isna().to_numpy()
+    values = column.to_numpy(dtype=object)
+    if pd.api.types.infer_dtype(values[~missing], skipna=False) not in ('string', 'empty'):
+        return None
+    np.save(path, np.where(missing, '', values).astype(str), allow_pickle=False)
+    np.save(os.path.join(directory, _mask_name(group, index)), missing, allow_pickle=False)
+    return str(column.dtype)
+
+
+def _dtype_key(dtype):
+    """A stable text key of the dtype argument of a parser, or None without explicit dtypes."""
+    if dtype is None:
+        return None
+    if isinstance(dtype, dict):
+        return json.dumps({str(column): str(pd.api.types.pandas_dtype(value)) for column, value in dtype.items()}, sort_keys=True)
+    return json.dumps(str(pd.api.types.pandas_dtype(dtype)))
+
+
+def _file_digest(file_path, block_size=1 << 20) -> str:
+    """Computes the SHA-256 hash of a file, reading it in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
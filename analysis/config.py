@@ -18,10 +18,43 @@ DATA_PATH = {
     'processed': 'data/processed/',
 }
 
+# Intermediate data of the cleaning steps, which the analysis never reads back
+PROCESSED_DATA_CONFIG = {
+    'save_steps': False,  # Save the data after every cleaning step to DATA_PATH['processed'] as CSV, for inspection
+}
+
 # Specific data file paths
 CSV_FILE_PATH = os.path.join(DATA_PATH['raw'], 'housing_data_raw.csv')
 EXCEL_FILE_PATH = os.path.join(DATA_PATH['raw'], 'sample.xlsx')
 
+# Data loading configuration
+DATA_LOADING_CONFIG = {
+    'chunk_size': 100000,  # Rows per chunk in streaming mode
+}
+
+# Binary columnar cache of parsed raw documents
+DATA_CACHE_CONFIG = {
+    'enabled': True,
+    'cache_dir': '.cache',  # Created next to the source document
+}
+
+# Dtype optimization of loaded data
+DTYPE_CONFIG = {
+    'enabled': True,
+    # 'exact': floats are stored as float32 only if it holds every value exactly.
+    # 'decimal' (opt-in): also if every value has at most 6 significant digits, e.g. as parsed from a CSV document,
+    # which float32 keeps as the same decimal although the value used in computations changes by up to ~3e-8 relative.
+    'float_downcast': 'exact',
+    'category_max_ratio': 0.5,   # Text columns with at most this fraction of distinct values become categoricals
+}
+
+# Content-addressed cache of analysis stage results
+STAGE_CACHE_CONFIG = {
+    'enabled': True,
+    'cache_dir': 'data/processed/.stage_cache/',
+    'max_bytes': 512 * 1024 * 1024,  # Least recently used entries are evicted beyond this size
+}
+
 # API keys (if the project needs to use external APIs)
 API_KEYS = {
     'api_key': 'YOUR_API_KEY_HERE',
@@ -33,6 +66,27 @@ ANALYSIS_CONFIG = {
     'parameter2': 'value2',
 }
 
+# Summary statistics configuration
+STATISTICS_CONFIG = {
+    'sample_size': 5,     # Rows in the random sample of the data
+    'sketch_size': 1000,  # Quantiles are exact up to this many values per column, approximate beyond
+}
+
+# Outlier handling configuration
+OUTLIER_CONFIG = {
+    'iqr_factor': 1.5,               # Bounds are q1 - factor * iqr and q3 + factor * iqr
+    'min_unique_percentage': 1,      # Only filter columns with more unique values than this percentage of rows
+    'min_retained_fraction': 0.97,   # Only filter columns if more than this fraction of rows is within the bounds
+    'sketch_size': 200,              # Accuracy of the approximate quantile sketches
+}
+
+# Correlation engine configuration
+CORRELATION_CONFIG = {
+    'dtype': 'float64',          # 'float32' halves the memory use on wide datasets
+    'column_block_size': 256,    # Columns per block when correlating features with the target
+    'row_block_size': 100000,    # Rows per block when computing the full correlation matrix
+}
+
 # Logging configuration
 LOGGING_CONFIG = {
     'log_file_path': 'logs/analysis.log',
@@ -47,6 +101,7 @@ VISUALIZATION_CONFIG = {
     'plot_height_subplots': 12,
 
     'resolution': 150,
+    'render_workers': None,  # Worker processes rendering figures in the background, None for the number of CPUs
     'font_size': 12,
     'font': 'Arial',
     'background_color': '#ffffff',
@@ -97,6 +152,8 @@ VISUALIZATION_CONFIG = {
     'correlation_matrix_text_color': 'black',
     'correlation_matrix_colorbar_shrink': 0.6,
     'correlation_matrix_ticks_position': 'bottom',
+    'correlation_matrix_max_columns': 40,    # Wider heatmaps only show the features most correlated with the target
+    'correlation_matrix_annotate_max': 20,   # Wider heatmaps are not annotated with the correlation values
     
     'scatter_alpha': 0.7,
     'scatter_color': 'blue',
@@ -105,6 +162,12 @@ VISUALIZATION_CONFIG = {
     'scatter_line_color': 'red',
     'scatter_line_style': '--',
     'scatter_line_width': 2,
+
+    'aggregation_threshold': 100000,  # Scatter and line plots of more points are aggregated
+    'density_bins': 200,              # Bins per axis of the 2D histograms replacing scatter plots
+    'density_cmap': 'Blues',
+    'line_max_points': 2000,          # Points kept when decimating line plots
+    'line_decimation': 'lttb',        # 'lttb' (Largest-Triangle-Three-Buckets) or 'minmax'
     
     'line_color1': 'red',
     'line_color2': 'blue',
@@ -124,4 +187,110 @@ MODEL_CONFIG = {
     'random_state': 42,
     'n_clusters': 3,
     'n_components': 2,
-}
\ No newline at end of file
+    'n_jobs': -1,    # Worker processes of the model grid, cross-validation and tuning (-1: one per core, within the limit of a pipeline stage)
+    # Hyperparameter values searched by tuning, per problem type and method
+    'search_space': {
+        'regression': {
+            'linear_regression': {},
+            'decision_tree': {'max_depth': [3, 5, 8, 12, None], 'min_samples_leaf': [1, 2, 5, 10]},
+            'random_forest': {'max_depth': [5, 10, None], 'max_features': [0.33, 0.5, 1.0], 'min_samples_leaf': [1, 2, 5]},
+        },
+        'classification': {
+            'logistic_regression': {'C': [0.01, 0.1, 1.0, 10.0], 'max_iter': [1000]},
+            'decision_tree': {'max_depth': [3, 5, 8, 12, None], 'min_samples_leaf': [1, 2, 5, 10]},
+            'random_forest': {'max_depth': [5, 10, None], 'max_features': ['sqrt', 0.5, 1.0], 'min_samples_leaf': [1, 2, 5]},
+        },
+    },
+}
+
+# Successive halving tuning configuration
+TUNING_CONFIG = {
+    'resource': 'n_samples',    # The budget grown per rung: training rows ('n_samples') or trees of forests ('n_estimators')
+    'factor': 3,                # Candidates kept per rung are 1 / factor, and their resource is multiplied by factor
+    'min_samples': 50,          # Training rows in the first rung
+    'min_estimators': 10,       # Trees in the first rung
+    'max_estimators': 300,      # Trees in the last rung
+    'budget_seconds': 60,       # Wall-clock budget; no rung is started that is expected to exceed it
+}
+
+# Cross-validation configuration
+CROSS_VALIDATION_CONFIG = {
+    'strategy': 'kfold',    # 'kfold', 'stratified', 'repeated' or 'timeseries'
+    'n_splits': 5,
+    'n_repeats': 3,         # Repetitions of the 'repeated' strategy
+    'shuffle': True,        # Shuffle the rows before splitting (not for 'timeseries')
+}
+
+# Candidates of the model grid, as (method, hyperparameters) per problem type
+MODEL_GRID_CONFIG = {
+    'regression': [
+        ('linear_regression', {}),
+        ('decision_tree', {}),
+        ('decision_tree', {'max_depth': 5}),
+        ('random_forest', {'n_estimators': 100}),
+        ('random_forest', {'n_estimators': 300, 'max_features': 0.5}),
+    ],
+    'classification': [
+        ('logistic_regression', {'max_iter': 1000}),
+        ('decision_tree', {}),
+        ('decision_tree', {'max_depth': 5}),
+        ('random_forest', {'n_estimators': 100}),
+        ('random_forest', {'n_estimators': 300, 'max_features': 0.5}),
+    ],
+}
+
+# Incremental (out-of-core) training configuration
+INCREMENTAL_CONFIG = {
+    'epochs': 1,                    # Passes over the data
+    'validation_fraction': 0.1,     # Rows of every chunk held out for validation (without a separate validation stream)
+    'checkpoint_every': 10,         # Chunks between checkpoints and validation reports
+    'checkpoint_dir': 'models/.checkpoints/',
+}
+
+# Versioned registry of trained models
+MODEL_REGISTRY_CONFIG = {
+    'root': 'models/',    # Models are saved to <root>/<name>/v<version>/
+}
+
+# Batch inference configuration
+INFERENCE_CONFIG = {
+    'chunk_size': 100000,   # Rows per chunk streamed through the model
+    'max_workers': None,    # Worker processes (None: one per core)
+}
+
+# Bootstrap confidence intervals of the evaluation metrics
+BOOTSTRAP_CONFIG = {
+    'n_resamples': 2000,                # Resamples of the test set
+    'confidence_level': 0.95,
+    'max_batch_elements': 5000000,      # Resampled values held in memory at once (resamples per batch x samples)
+    'budget_seconds': 10,               # Wall-clock budget; fewer resamples are used if it runs out
+    'random_state': 42,
+}
+
+# Clustering configuration
+CLUSTERING_CONFIG = {
+    'method': 'minibatch_kmeans',           # 'minibatch_kmeans' scales to large data, 'kmeans' is exact
+    'k_range': list(range(2, 11)),          # Numbers of clusters swept
+    'batch_size': 4096,                     # Rows per mini-batch of MiniBatchKMeans
+    'scale': True,                          # Standardize the features before clustering
+    'silhouette_sample_size': 5000,         # Rows sampled for the silhouette, which is quadratic in the rows
+    'selection_metric': 'Silhouette',       # 'Silhouette', 'Calinski-Harabasz' or 'Davies-Bouldin'
+}
+
+# Pipeline configuration
+PIPELINE_CONFIG = {
+    'max_workers': 4,       # Stages run at once, on a thread pool
+    'stage_jobs': None,     # Worker processes of joblib within a stage while stages run at once (None: the cores divided among the stages)
+}
+
+# Profiling configuration
+PROFILING_CONFIG = {
+    'enabled': True,                        # Record the calls of the instrumented analysis functions
+    'trace_memory': False,                  # Trace Python allocations with tracemalloc (slower), instead of sampling the RSS
+    'rss_sample_interval': 0.01,            # Seconds between RSS samples while an instrumented call is running
+    'cprofile_function': None,              # The name of one function to run under cProfile, e.g. 'train_model_grid'
+    'cprofile_dir': 'reports/profiles/',
+    'cprofile_top': 20,                     # Functions logged from the cProfile statistics
+    'run_record_dir': 'reports/runs/',      # JSON run records
+    'pdf_appendix': True,                   # Add a timing appendix to the PDF report
+}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/09/27 15:20
+@Desc: This module computes correlations for feature selection on wide datasets.
+       It provides a fast path for the correlations of every feature with the target variable only,
+       and a full correlation matrix computed in row blocks, optionally in float32.
+'''
+
+from .config import CORRELATION_CONFIG
+from .streaming import CorrelationAccumulator
+import pandas as pd
+import numpy as np
+
+
+def target_correlations(data, target=None, dtype=None, block_size=None) -> pd.Series:
+    """Compute the correlation of every numeric column with the target variable.
+
+    Like DataFrame.corr(), missing values are excluded pairwise. Only the p correlations with 
+    the target are computed instead of the full p x p matrix, in blocks of columns to bound the memory use.
+
+    Args:
+        data (pd.DataFrame): The input DataFrame containing the data.
+        target (str, optional): The target column. Defaults to the last column.
+        dtype (np.dtype, optional): The floating point type of the computation. Defaults to CORRELATION_CONFIG['dtype'].
+        block_size (int, optional): The number of columns per block. Defaults to CORRELATION_CONFIG['column_block_size'].
+
+    Returns:
+        pd.Series: The correlations, indexed by column (the target itself included).
+    """
+    dtype = np.dtype(dtype or CORRELATION_CONFIG['dtype'])
+    block_size = block_size or CORRELATION_CONFIG['column_block_size']
+    target = data.columns[-1] if target is None else target
+    numeric = data.select_dtypes('number')
+    y = numeric[target].to_numpy(dtype=dtype)
+    y_valid = ~np.isnan(y)
+
+    correlations = np.empty(numeric.shape[1], dtype=dtype)
+    y_complete = y_valid.all()
+    for start in range(0, numeric.shape[1], block_size):
+        X = numeric.iloc[:, start:start + block_size].to_numpy(dtype=dtype)
+        block = slice(start, start + X.shape[1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if y_complete and not np.isnan(X).any():
+                # Complete block: a single matrix-vector product
+                x_centered = X - X.mean(axis=0)
+                y_centered = y - y.mean()
+                correlations[block] = ((y_centered @ x_centered) /
+                                       np.sqrt((x_centered ** 2).sum(axis=0) * (y_centered @ y_centered)))
+                continue
+            # Otherwise every column only uses the rows where both values are present
+            valid = ~np.isnan(X) & y_valid[:, None]
+            count = valid.sum(axis=0)
+            x_centered = np.where(valid, X - np.where(valid, X, 0).sum(axis=0) / count, 0)
+            y_centered = np.where(valid, y[:, None] - np.where(valid, y[:, None], 0).sum(axis=0) / count, 0)
+            correlations[block] = ((x_centered * y_centered).sum(axis=0) /
+                                   np.sqrt((x_centered ** 2).sum(axis=0) * (y_centered ** 2).sum(axis=0)))
+    return pd.Series(np.clip(correlations, -1, 1), index=numeric.columns)
+
+
+def correlation_matrix(data, dtype=None, block_size=None) -> pd.DataFrame:
+    """Compute the full correlation matrix of the numeric columns.
+
+    Complete data is processed in blocks of rows, whose co-moments are merged by a CorrelationAccumulator,
+    so only one block has to be converted at a time. Data with missing values falls back to the pairwise 
+    computation of DataFrame.corr().
+
+    Args:
+        data (pd.DataFrame): The input DataFrame containing the data.
+        dtype (np.dtype, optional): The floating point type of the computation. Defaults to CORRELATION_CONFIG['dtype'].
+        block_size (int, optional): The number of rows per block. Defaults to CORRELATION_CONFIG['row_block_size'].
+
+    Returns:
+        pd.DataFrame: The correlation matrix.
+    """
+    dtype = np.dtype(dtype or CORRELATION_CONFIG['dtype'])
+    block_size = block_size or CORRELATION_CONFIG['row_block_size']
+    numeric = data.select_dtypes('number')
+    if numeric.isnull().to_numpy().any():
+        return numeric.corr().astype(dtype)
+    accumulator = CorrelationAccumulator(dtype=dtype)
+    for start in range(0, max(numeric.shape[0], 1), block_size):
+        accumulator.update(numeric.iloc[start:start + block_size])
+    return accumulator.correlation()
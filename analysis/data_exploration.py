@@ -6,58 +6,79 @@
 @Desc: This module performs Exploratory Data Analysis (EDA), including statistical analysis and visualization.
 '''
 
+from .config import STATISTICS_CONFIG
 from .report_generation import PDF
+from .streaming import StatisticsAccumulator
+from .profiling import instrument
 import pandas as pd
 
 
-def summary_statistics(data, pdf=None) -> None:
+@instrument
+def summary_statistics(data, pdf=None) -> StatisticsAccumulator:
     """Generate summary statistics for the dataset.
 
     This function prints various statistical insights about the dataset, 
     including data size, basic information, random sample, and descriptive statistics.
+    All statistics are gathered in a single pass by a StatisticsAccumulator, 
+    so the dataset can also be passed as chunks that do not fit into memory together.
 
     Args:
-        data (pd.DataFrame): The pandas DataFrame for which to generate statistics.
+        data (pd.DataFrame, Iterable[pd.DataFrame] or StatisticsAccumulator): The pandas DataFrame for which to generate statistics, 
+            an iterable of DataFrame chunks, or an accumulator that has already been filled (e.g. merged from worker processes).
+        pdf (PDF, optional): An optional PDF object for report generation.
 
     Returns:
-        None: This function does not return any value but prints the statistics directly.
+        StatisticsAccumulator: The accumulator the statistics were generated from.
     """
     
+    if isinstance(data, StatisticsAccumulator):
+        stats = data
+    else:
+        stats = StatisticsAccumulator(sample_size=STATISTICS_CONFIG['sample_size'], 
+                                      sketch_size=STATISTICS_CONFIG['sketch_size'])
+        for chunk in ([data] if isinstance(data, pd.DataFrame) else data):
+            stats.update(chunk)
+
+    total_missing = stats.total_missing()
+    percentage_missing = round(total_missing / stats.size * 100, 2) if stats.size else 0.0
+
     print('+------------------------------------------------------------------------------------------------------------+')
     print("                                         -Data Size-")
 
-    print("Total number of entries:", data.shape[0])
-    print("Total number of columns:", data.shape[1])
-    print("Total number of data points:", data.size)
-    print("Total number of missing values: ", data.isnull().sum().sum())
-    print("Percentage of missing values: ", ((data.isnull().sum().sum() / data.size) * 100).round(2))
+    print("Total number of entries:", stats.n_rows)
+    print("Total number of columns:", stats.n_columns)
+    print("Total number of data points:", stats.size)
+    print("Total number of missing values: ", total_missing)
+    print("Percentage of missing values: ", percentage_missing)
     print("Percentage of missing values in each column:")
-    print(data.isnull().sum() / data.shape[0] * 100)
+    print(stats.null_counts / max(stats.n_rows, 1) * 100)
 
     print('+------------------------------------------------------------------------------------------------------------+')
     print('                                         -Data Basic Information-')
-    info = data.info()
+    print(stats.info())
+    print(f'Memory usage: {stats.memory_usage / 1024:.1f} KB')
 
     print('+------------------------------------------------------------------------------------------------------------+')
     print('                                         -Random Sample of Data-')
-    sample = data.sample(5).round(2)
+    sample = stats.sample.round(2)
     print(sample)
     
     print('+------------------------------------------------------------------------------------------------------------+')
     print('                                         -Data Statistics-')
-    description = data.describe().round(2)
+    description = stats.describe().round(2)
     print(description)
     
     # Generate PDF report
     if pdf != None:
         pdf.chapter_sub_title('Data Size')
-        pdf.chapter_body(f'Total number of entries: {data.shape[0]}\n'
-                         f'Total number of columns: {data.shape[1]}\n'
-                         f'Total number of data points: {data.size}\n'
-                         f'Total number of missing values: {data.isnull().sum().sum()}\n'
-                         f'Percentage of missing values: {(data.isnull().sum().sum() / data.size) * 100}')
+        pdf.chapter_body(f'Total number of entries: {stats.n_rows}\n'
+                         f'Total number of columns: {stats.n_columns}\n'
+                         f'Total number of data points: {stats.size}\n'
+                         f'Total number of missing values: {total_missing}\n'
+                         f'Percentage of missing values: {percentage_missing}')
         pdf.chapter_sub_title('Random Sample of Data')
         pdf.chapter_body(f'{sample}')
         pdf.chapter_sub_title('Data Statistics')
         pdf.chapter_body(f'{description}')
-    
\ No newline at end of file
+
+    return stats
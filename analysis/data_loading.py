@@ -4,27 +4,228 @@
 @Author: TZ
 @Date: 2024/09/06 11:36
 @Desc: This module provides a function to load data from specified document types.
+       CSV documents can also be streamed as an iterator of DataFrame chunks for out-of-core processing.
+       Loaded data can be downcast to compact dtypes, with a report of the memory saved per column.
 '''
 
-from .config import CSV_FILE_PATH, EXCEL_FILE_PATH
+from .config import CSV_FILE_PATH, EXCEL_FILE_PATH, DATA_CACHE_CONFIG, DTYPE_CONFIG
+from .caching import ColumnarCache
+from .profiling import instrument
 import pandas as pd
+import numpy as np
+import os
 
-def load_data(doc_type: str) -> pd.DataFrame:
+def load_data(doc_type: str, file_path=None, chunksize=None, dtype=None, usecols=None, progress=None, use_cache=None, 
+              optimize=False):
     """Load data from a specified document type (CSV or Excel).
 
     Args:
         doc_type (str): The type of the document to load, either 'csv' or 'excel'.
+        file_path (str, optional): The path of the document. Defaults to the path configured for the document type.
+        chunksize (int, optional): If given, stream the CSV document as DataFrame chunks of this many rows.
+        dtype (dict, optional): Explicit column dtypes, which skips type inference while parsing.
+        usecols (list, optional): The subset of columns to load.
+        progress (callable, optional): A hook called as progress(rows_loaded, bytes_read, total_bytes)
+            after each chunk (or once when the document is loaded in one go).
+        use_cache (bool, optional): Whether to build and reuse the binary columnar cache of the document.
+            Defaults to DATA_CACHE_CONFIG['enabled']. A document loaded with an explicit dtype has its own cache.
+        optimize (bool): Whether to downcast the loaded data with optimize_dtypes. Streamed chunks are not optimized, 
+            since every chunk would get its own dtypes; optimize the concatenated chunks instead.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the loaded data.
+        pd.DataFrame or Iterator[pd.DataFrame]: A DataFrame containing the loaded data,
+        or an iterator of DataFrame chunks if chunksize is given.
 
     Raises:
-        ValueError: If an invalid document type is provided.
+        ValueError: If an invalid document type is provided, or streaming is requested for an Excel document.
     """
+    if use_cache is None:
+        use_cache = DATA_CACHE_CONFIG['enabled']
+
     # Load data based on the document type
     if doc_type == 'csv':
-        return pd.read_csv(CSV_FILE_PATH)
+        file_path = file_path or CSV_FILE_PATH
+        if chunksize is not None:
+            return _stream_csv(file_path, chunksize, dtype, usecols, progress, use_cache)
+        if use_cache:
+            data = _load_cached(file_path, pd.read_csv, dtype, usecols)
+        else:
+            data = pd.read_csv(file_path, dtype=dtype, usecols=usecols)
     elif doc_type == 'excel':
-        return pd.read_excel(EXCEL_FILE_PATH)
+        if chunksize is not None:
+            raise ValueError('Streaming mode is only supported for CSV documents.')
+        file_path = file_path or EXCEL_FILE_PATH
+        if use_cache:
+            data = _load_cached(file_path, pd.read_excel, dtype, usecols)
+        else:
+            data = pd.read_excel(file_path, dtype=dtype, usecols=usecols)
     else:
-        raise ValueError('Invalid document type. Please provide either "csv" or "excel".')
\ No newline at end of file
+        raise ValueError('Invalid document type. Please provide either "csv" or "excel".')
+
+    if progress is not None:
+        total_bytes = os.path.getsize(file_path)
+        progress(data.shape[0], total_bytes, total_bytes)
+    if optimize:
+        data = optimize_dtypes(data)
+    return data
+
+
+@instrument
+def optimize_dtypes(data, pdf=None) -> pd.DataFrame:
+    """Downcast the columns of a DataFrame to the narrowest dtypes that hold their values.
+
+    Args:
+        data (pd.DataFrame): The loaded data.
+        pdf (PDF, optional): An optional PDF object for report generation.
+
+    Returns:
+        pd.DataFrame: The data with compact dtypes.
+
+    Description:
+        Integer columns are downcast to the smallest (unsigned if possible) integer type, e.g. CHAS to uint8. 
+        Float columns become float32 only if that is lossless: by default if float32 holds every value exactly 
+        (e.g. RAD and TAX, whose values are integers). With DTYPE_CONFIG['float_downcast'] = 'decimal', also if every value 
+        is a decimal with at most 6 significant digits, which float32 keeps as the same decimal (see _is_short_decimal). 
+        Text columns with at most DTYPE_CONFIG['category_max_ratio'] distinct values per row (e.g. the authors of crawled videos) 
+        become categoricals. Numeric codes such as RAD stay numeric, so that correlations and models can use them.
+        The memory of every column before and after is printed and added to the report.
+    """
+
+    print('+------------------------------------------------------------------------------------------------------------+')
+    print('                                         -Optimize Dtypes-')
+
+    optimized = data.copy(deep=False)
+    for column in data.columns:
+        optimized[column] = _compact_column(data[column])
+
+    before, after = data.memory_usage(index=False, deep=True), optimized.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({'Column': data.columns,
+                           'Dtype Before': data.dtypes.astype(str).to_numpy(),
+                           'Dtype After': optimized.dtypes.astype(str).to_numpy(),
+                           'Before (KB)': before.to_numpy() / 1024,
+                           'After (KB)': after.to_numpy() / 1024})
+    report['Saved (%)'] = (1 - report['After (KB)'] / report['Before (KB)'].where(report['Before (KB)'] > 0)).fillna(0) * 100
+    saved = (1 - after.sum() / before.sum()) * 100 if before.sum() else 0.0
+    summary = f'Memory usage: {before.sum() / 1024:.1f} KB before, {after.sum() / 1024:.1f} KB after ({saved:.1f}% saved).'
+    print(report.round(2).to_string(index=False))
+    print(summary)
+
+    # Generate PDF report
+    if pdf != None:
+        pdf.chapter_sub_title('Optimize Dtypes')
+        pdf.chapter_body(summary)
+        pdf.add_table(report, float_format='{:.2f}')
+
+    return optimized
+
+
+def _compact_column(column) -> pd.Series:
+    """Returns a column downcast to the narrowest dtype that holds its values, or the column itself."""
+    if pd.api.types.is_bool_dtype(column.dtype) or isinstance(column.dtype, pd.CategoricalDtype):
+        return column
+    if pd.api.types.is_integer_dtype(column.dtype):
+        return pd.to_numeric(column, downcast='unsigned' if len(column) and column.min() >= 0 else 'integer')
+    if pd.api.types.is_float_dtype(column.dtype):
+        values = column.to_numpy()
+        with np.errstate(over='ignore', invalid='ignore'):
+            compact = values.astype(np.float32)
+        exact = (compact.astype(values.dtype) == values) | np.isnan(values)
+        if exact.all() or (DTYPE_CONFIG['float_downcast'] == 'decimal' and _is_short_decimal(values[~exact]).all()):
+            return column.astype(np.float32)
+        return column
+    if pd.api.types.is_object_dtype(column.dtype) or pd.api.types.is_string_dtype(column.dtype):
+        if column.nunique() <= DTYPE_CONFIG['category_max_ratio'] * len(column):
+            return column.astype('category')
+    return column
+
+
+def _is_short_decimal(values, digits=6) -> np.ndarray:
+    """Returns whether every value is the float64 closest to a decimal with at most the given significant digits.
+
+    Such a decimal survives the conversion to float32 and back to text unchanged, since float32 
+    represents every decimal of up to 6 significant digits within its normal range.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.zeros(values.shape, dtype=bool)
+    magnitude = np.abs(values)
+    normal = np.isfinite(values) & (magnitude >= np.finfo(np.float32).tiny) & (magnitude <= np.finfo(np.float32).max)
+    # The power of ten that scales a value to an integer of the given digits, within the range of exact powers of ten
+    scale = digits - 1 - np.floor(np.log10(magnitude, where=normal, out=np.ones_like(values)))
+    candidates = normal & (np.abs(scale) <= 22)
+    scale = scale[candidates].astype(int)
+    power = 10.0 ** np.abs(scale)
+    integers = np.rint(np.where(scale >= 0, values[candidates] * power, values[candidates] / power))
+    # Dividing or multiplying an integer by an exact power of ten rounds correctly to the closest float64
+    result[candidates] = np.where(scale >= 0, integers / power, integers * power) == values[candidates]
+    return result | (values == 0)
+
+
+def _load_cached(file_path, parse, dtype, usecols):
+    """Load a document through its columnar cache, parsing it only if the cache is missing or stale."""
+    cache = ColumnarCache(file_path, dtype=dtype)
+    if not cache.is_valid():
+        data = parse(file_path, dtype=dtype)
+        for _ in cache.build([data]):
+            pass
+        if not cache.is_valid():
+            # The document has columns that the cache cannot store
+            return _project(data, usecols)
+    return cache.load(usecols=usecols)
+
+
+def _stream_csv(file_path, chunksize, dtype, usecols, progress, use_cache):
+    """Yield DataFrame chunks of a CSV document, reporting progress after each chunk.
+
+    A valid columnar cache is streamed instead of the CSV document. Otherwise the file is opened here 
+    rather than by pandas so that the number of bytes consumed so far can be read from the file handle, 
+    and the cache is rebuilt from the chunks as they are parsed.
+    """
+    total_bytes = os.path.getsize(file_path)
+    rows_loaded = 0
+    cache = ColumnarCache(file_path, dtype=dtype) if use_cache else None
+
+    if cache is not None and cache.is_valid():
+        total_rows = cache.n_rows()
+        for chunk in cache.iter_chunks(chunksize, usecols=usecols):
+            rows_loaded += chunk.shape[0]
+            if progress is not None:
+                progress(rows_loaded, total_bytes * rows_loaded // max(total_rows, 1), total_bytes)
+            yield chunk
+        return
+
+    with open(file_path, 'rb') as handle:
+        # The cache stores every column, so the projection is applied afterwards
+        with pd.read_csv(handle, chunksize=chunksize, dtype=dtype, 
+                         usecols=None if cache is not None else usecols) as reader:
+            chunks = cache.build(reader) if cache is not None else reader
+            try:
+                for chunk in chunks:
+                    if cache is not None:
+                        chunk = _project(chunk, usecols)
+                    rows_loaded += chunk.shape[0]
+                    if progress is not None:
+                        progress(rows_loaded, min(handle.tell(), total_bytes), total_bytes)
+                    yield chunk
+            finally:
+                if cache is not None:
+                    # Discard a partially built cache if the consumer stops early
+                    chunks.close()
+
+
+def _project(chunk, usecols):
+    """Apply column projection to a chunk parsed with all columns."""
+    if usecols is not None:
+        chunk = chunk[[column for column in chunk.columns if column in usecols]]
+    return chunk
+
+
+def print_progress(rows_loaded, bytes_read, total_bytes) -> None:
+    """A progress hook for load_data that prints how far ingestion has got.
+
+    Args:
+        rows_loaded (int): The number of rows loaded so far.
+        bytes_read (int): The number of bytes of the document consumed so far.
+        total_bytes (int): The size of the document in bytes.
+    """
+    percentage = bytes_read / total_bytes * 100 if total_bytes else 100.0
+    print(f'Loaded {rows_loaded} rows ({percentage:.1f}% of {total_bytes} bytes).')
@@ -7,12 +7,31 @@
        and functions for data transformation and normalization.
 '''
 
-from .config import VISUALIZATION_CONFIG
+from .config import OUTLIER_CONFIG, PROCESSED_DATA_CONFIG, DATA_PATH
 from .report_generation import PDF
-from matplotlib import pyplot as plt
+from .streaming import QuantileSketch, DistinctSketch
+from .rendering import PlotSpec, draw
+from .profiling import instrument
 import pandas as pd
+import numpy as np
+import os
 
 
+def save_step(data, file_name) -> None:
+    """Save the data after a cleaning step to DATA_PATH['processed'] if PROCESSED_DATA_CONFIG['save_steps'] is set.
+
+    The files are only for inspection and are never read back. Steps whose result is reused from the stage cache are not saved again.
+
+    Args:
+        data (pd.DataFrame): The data after the step.
+        file_name (str): The name of the CSV file.
+    """
+    if PROCESSED_DATA_CONFIG['save_steps']:
+        os.makedirs(DATA_PATH['processed'], exist_ok=True)
+        data.to_csv(os.path.join(DATA_PATH['processed'], file_name), index=False)
+
+
+@instrument
 def remove_duplicates(data, pdf=None) -> pd.DataFrame:
     """Remove duplicate rows from the dataset.
 
@@ -24,7 +43,7 @@ def remove_duplicates(data, pdf=None) -> pd.DataFrame:
 
     Description:
         This function identifies and removes duplicate rows from the dataset. 
-        It prints the number of duplicates found and saves the cleaned data to a CSV file.
+        It prints the number of duplicates found and can save the cleaned data to a CSV file (see save_step).
     """
 
     print('+------------------------------------------------------------------------------------------------------------+')
@@ -36,8 +55,8 @@ def remove_duplicates(data, pdf=None) -> pd.DataFrame:
     data = data.drop_duplicates(keep='first', inplace=False)
     print('Duplicates removed.')
 
-    # Save the cleaned data
-    data.to_csv('data/processed/data_drop_duplicates.csv', index=False)
+    # Save the cleaned data for inspection, if enabled
+    save_step(data, 'data_drop_duplicates.csv')
 
     # Generate PDF report
     if pdf != None:
@@ -48,6 +67,7 @@ def remove_duplicates(data, pdf=None) -> pd.DataFrame:
     return data
 
 
+@instrument
 def handle_missing_values(data, method, group_by=None, pdf=None) -> pd.DataFrame:
     """Handle missing values in the dataset.
 
@@ -62,7 +82,7 @@ def handle_missing_values(data, method, group_by=None, pdf=None) -> pd.DataFrame
     Description:
         This function detects and handles missing values in the dataset using various methods. 
         It supports dropping rows with missing values, filling them with previous/next row values, 
-        column mean/median, or group mean/median based on the specified method. It also saves the cleaned data to a CSV file.
+        column mean/median, or group mean/median based on the specified method. It can also save the cleaned data to a CSV file (see save_step).
     """
 
     print('+------------------------------------------------------------------------------------------------------------+')
@@ -112,8 +132,8 @@ def handle_missing_values(data, method, group_by=None, pdf=None) -> pd.DataFrame
     else:
         pass
 
-    # Save the cleaned data
-    data.to_csv('data/processed/data_handle_missing_values.csv', index=False)
+    # Save the cleaned data for inspection, if enabled
+    save_step(data, 'data_handle_missing_values.csv')
 
     # Generate PDF report
     if pdf != None:
@@ -126,7 +146,8 @@ def handle_missing_values(data, method, group_by=None, pdf=None) -> pd.DataFrame
     return data
 
 
-def handle_outliers(data, method, negative_values=False, pdf=None) -> pd.DataFrame:
+@instrument
+def handle_outliers(data, method, negative_values=False, approximate=False, pdf=None, renderer=None) -> pd.DataFrame:
     """
     Handle outliers in the dataset.
 
@@ -134,6 +155,9 @@ def handle_outliers(data, method, negative_values=False, pdf=None) -> pd.DataFra
         data (pd.DataFrame): The input DataFrame containing the data.
         method (str): The method to use for handling outliers ('iqr').
         negative_values (bool): Flag to remove negative values from the dataset.
+        approximate (bool): Flag to compute the IQR bounds from approximate quantile sketches instead of exact quantiles.
+        pdf (PDF, optional): An optional PDF object for report generation.
+        renderer (FigureRenderer, optional): An optional renderer drawing the boxplots in the background.
 
     Returns:
         pd.DataFrame: A DataFrame with outliers handled according to the specified method.
@@ -141,7 +165,8 @@ def handle_outliers(data, method, negative_values=False, pdf=None) -> pd.DataFra
     Description:
         This function identifies and handles outliers in the dataset. 
         It supports removing negative values and outliers detected using the Interquartile Range (IQR) method. 
-        It visualizes the data using boxplots and saves the cleaned data to a CSV file.
+        The IQR bounds of all columns are computed in one pass and the rows are filtered once with a combined mask.
+        It visualizes the data using boxplots and can save the cleaned data to a CSV file (see save_step).
     """
 
     print('+------------------------------------------------------------------------------------------------------------+')
@@ -149,56 +174,25 @@ def handle_outliers(data, method, negative_values=False, pdf=None) -> pd.DataFra
 
     if negative_values:
         # Remove negative values
-        data = data[data >= 0]
+        data = remove_negative_values(data)
         print('Negative values removed.')
-        pdf.chapter_body('Negative values removed.')
 
     if method == 'iqr':
-        plt.figure(figsize=(VISUALIZATION_CONFIG['plot_width'], VISUALIZATION_CONFIG['plot_height']))
-        data.boxplot(figsize=(VISUALIZATION_CONFIG['plot_width'], VISUALIZATION_CONFIG['plot_height']),
-                     fontsize=VISUALIZATION_CONFIG['font_size'],
-                     grid=True,
-                     boxprops=VISUALIZATION_CONFIG['boxprops'],
-                     whiskerprops=VISUALIZATION_CONFIG['whiskerprops'],
-                     capprops=VISUALIZATION_CONFIG['capprops'],
-                     medianprops=VISUALIZATION_CONFIG['medianprops'],
-                     flierprops=VISUALIZATION_CONFIG['flierprops']
-                     )
-        plt.savefig('reports/figures/boxplot.png', dpi=VISUALIZATION_CONFIG['resolution'])        
+        boxplot = draw(_boxplot_spec(data, 'reports/figures/boxplot.png'), renderer)
         before = data.shape[0]
 
-        # Calculate the unique values and their percentage
-        unique_values = data.nunique()
-        unique_values_percentage = unique_values / data.shape[0] * 100
-
         # Remove outliers using IQR method
-        for column in data.columns:
-            q1 = data[column].quantile(0.25)
-            q3 = data[column].quantile(0.75)
-            iqr = q3 - q1
-            lower_bound = q1 - 1.5 * iqr
-            upper_bound = q3 + 1.5 * iqr
-            # Remove outliers if the unique values percentage is greater than 1 and the percentage of data within the bounds is greater than 97%
-            if unique_values_percentage[column] > 1 and data.query(f'{lower_bound} <= {column} <= {upper_bound}').shape[0] / data.shape[0] > 0.97:
-                data = data.query(f'{lower_bound} <= {column} <= {upper_bound}')
+        bounds = iqr_bounds(data, approximate=approximate)
+        data = filter_outliers(data, bounds)
         print('Outliers removed using IQR method.')
-        plt.figure(figsize=(VISUALIZATION_CONFIG['plot_width'], VISUALIZATION_CONFIG['plot_height']))
-        data.boxplot(figsize=(VISUALIZATION_CONFIG['plot_width'], VISUALIZATION_CONFIG['plot_height']),
-                     fontsize=VISUALIZATION_CONFIG['font_size'],
-                     grid=True,
-                     boxprops=VISUALIZATION_CONFIG['boxprops'],
-                     whiskerprops=VISUALIZATION_CONFIG['whiskerprops'],
-                     capprops=VISUALIZATION_CONFIG['capprops'],
-                     medianprops=VISUALIZATION_CONFIG['medianprops'],
-                     flierprops=VISUALIZATION_CONFIG['flierprops']                    
-                     )
-        plt.savefig('reports/figures/boxplot_cleaned.png', dpi=VISUALIZATION_CONFIG['resolution'])
+        print('Filtered columns:', bounds.index[bounds['filter']].tolist())
+        boxplot_cleaned = draw(_boxplot_spec(data, 'reports/figures/boxplot_cleaned.png'), renderer)
         after = data.shape[0]
 
         print('Before:', before, 'After:', after)
 
-    # Save the cleaned data
-    data.to_csv('data/processed/data_handle_outliers.csv', index=False)
+    # Save the cleaned data for inspection, if enabled
+    save_step(data, 'data_handle_outliers.csv')
 
     if pdf != None:
         pdf.chapter_sub_title('Handle Outliers')
@@ -208,9 +202,115 @@ def handle_outliers(data, method, negative_values=False, pdf=None) -> pd.DataFra
             pdf.chapter_body('Outliers removed using IQR method.')
             pdf.add_page()
             pdf.chapter_body('Before:')
-            pdf.add_image('reports/figures/boxplot.png')
+            pdf.add_image(boxplot)
             pdf.chapter_body('After:')
-            pdf.add_image('reports/figures/boxplot_cleaned.png')
+            pdf.add_image(boxplot_cleaned)
 
 
-    return data
\ No newline at end of file
+    return data
+
+
+def remove_negative_values(data) -> pd.DataFrame:
+    """Replace the negative values of the numeric columns with missing values, keeping compact dtypes.
+
+    Float columns keep their dtype. Integer columns are only converted if they contain negative values, 
+    to float32 if it represents all their values exactly (up to 16 bits) and to float64 otherwise.
+    Other columns are left unchanged.
+
+    Args:
+        data (pd.DataFrame): The input DataFrame containing the data.
+
+    Returns:
+        pd.DataFrame: The data without negative values.
+    """
+    data = data.copy(deep=False)
+    for column in data.select_dtypes('number').columns:
+        values = data[column]
+        negative = values < 0
+        if not negative.any():
+            continue
+        if pd.api.types.is_integer_dtype(values.dtype):
+            values = values.astype(np.float32 if values.dtype.itemsize <= 2 else np.float64)
+        data[column] = values.mask(negative)
+    return data
+
+
+def _boxplot_spec(data, path) -> PlotSpec:
+    """Build the specification of a boxplot of all numeric columns."""
+    numeric = data.select_dtypes('number')
+    return PlotSpec('boxplot', path,
+                    columns=numeric.columns.tolist(),
+                    values=[numeric[column].to_numpy(dtype=float) for column in numeric.columns])
+
+
+def iqr_bounds(data, approximate=False) -> pd.DataFrame:
+    """Compute the IQR outlier bounds of all numeric columns in one pass.
+
+    Args:
+        data (pd.DataFrame or Iterable[pd.DataFrame]): The input DataFrame, or an iterable of DataFrame chunks.
+        approximate (bool): Flag to use approximate quantile and distinct-count sketches. 
+            Chunked input is always summarized with sketches, so that it never has to fit into memory.
+
+    Returns:
+        pd.DataFrame: One row per numeric column with the quartiles ('q1', 'q3'), the bounds ('lower', 'upper'), 
+        the percentage of unique values ('unique_percentage'), the fraction of rows within the bounds ('retained'), 
+        and whether the column is filtered ('filter'). A column is filtered if its unique values exceed 
+        OUTLIER_CONFIG['min_unique_percentage'] percent of the rows and more than 
+        OUTLIER_CONFIG['min_retained_fraction'] of the rows are within its bounds.
+    """
+    factor = OUTLIER_CONFIG['iqr_factor']
+
+    if isinstance(data, pd.DataFrame) and not approximate:
+        numeric = data.select_dtypes('number')
+        n_rows = numeric.shape[0]
+        quartiles = numeric.quantile([0.25, 0.75])
+        q1, q3 = quartiles.iloc[0].to_numpy(dtype=float), quartiles.iloc[1].to_numpy(dtype=float)
+        lower, upper = q1 - factor * (q3 - q1), q3 + factor * (q3 - q1)
+        values = numeric.to_numpy(dtype=float)
+        within = ((values >= lower) & (values <= upper)).sum(axis=0)
+        unique = numeric.nunique().to_numpy()
+        columns = numeric.columns
+    else:
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        quantile_sketches, distinct_sketches = {}, {}
+        n_rows = 0
+        for chunk in chunks:
+            numeric = chunk.select_dtypes('number')
+            n_rows += numeric.shape[0]
+            for column in numeric.columns:
+                values = numeric[column].to_numpy(dtype=float)
+                quantile_sketches.setdefault(column, QuantileSketch(k=OUTLIER_CONFIG['sketch_size'])).update(values)
+                distinct_sketches.setdefault(column, DistinctSketch()).update(values)
+        columns = pd.Index(list(quantile_sketches))
+        q1 = np.array([quantile_sketches[column].quantile(0.25) for column in columns], dtype=float)
+        q3 = np.array([quantile_sketches[column].quantile(0.75) for column in columns], dtype=float)
+        lower, upper = q1 - factor * (q3 - q1), q3 + factor * (q3 - q1)
+        within = np.array([quantile_sketches[column].rank(upper[i]) - quantile_sketches[column].rank(lower[i], inclusive=False)
+                           for i, column in enumerate(columns)] if len(columns) else [], dtype=float)
+        unique = np.array([distinct_sketches[column].count() for column in columns], dtype=float)
+
+    n_rows = max(n_rows, 1)
+    bounds = pd.DataFrame({'q1': q1, 'q3': q3, 'lower': lower, 'upper': upper,
+                           'unique_percentage': unique / n_rows * 100,
+                           'retained': within / n_rows}, index=columns)
+    bounds['filter'] = ((bounds['unique_percentage'] > OUTLIER_CONFIG['min_unique_percentage']) &
+                        (bounds['retained'] > OUTLIER_CONFIG['min_retained_fraction']))
+    return bounds
+
+
+def filter_outliers(data, bounds):
+    """Remove the rows outside the IQR bounds of the filtered columns with one combined mask.
+
+    Args:
+        data (pd.DataFrame or Iterable[pd.DataFrame]): The input DataFrame, or an iterable of DataFrame chunks.
+        bounds (pd.DataFrame): The bounds computed by iqr_bounds.
+
+    Returns:
+        pd.DataFrame or Iterator[pd.DataFrame]: The filtered DataFrame, or an iterator of filtered chunks.
+    """
+    bounds = bounds[bounds['filter']]
+    if not isinstance(data, pd.DataFrame):
+        return (filter_outliers(chunk, bounds) for chunk in data)
+    values = data[bounds.index].to_numpy(dtype=float)
+    mask = ((values >= bounds['lower'].to_numpy()) & (values <= bounds['upper'].to_numpy())).all(axis=1)
+    return data[mask]
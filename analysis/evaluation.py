@@ -6,24 +6,433 @@
 @Desc: This script evaluates the performance of various machine learning models by calculating different metrics based on the problem type. 
        It supports classification, regression, clustering, anomaly detection, dimensionality reduction, and reinforcement learning. 
        For regression, it also includes plotting of actual vs predicted values.
+       The metrics are computed by mergeable accumulators that take batches of predictions, 
+       so that chunked or parallel predictions can be evaluated exactly without concatenating them.
+       Bootstrap confidence intervals of the metrics, and paired comparisons of two models, are computed 
+       in batches of resamples with NumPy rather than one resample at a time.
 '''
 
 import pandas as pd
-from .config import VISUALIZATION_CONFIG
+import numpy as np
+import time
+from .config import MODEL_CONFIG, BOOTSTRAP_CONFIG, CLUSTERING_CONFIG
 from .report_generation import PDF
-from matplotlib import pyplot as plt
-from sklearn.metrics import mean_squared_error, r2_score, accuracy_score, precision_score, recall_score, f1_score, silhouette_score
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
+from .rendering import PlotSpec, draw, scatter_points, line_points
+from .profiling import instrument
+
+
+class RegressionMetrics:
+    """A mergeable accumulator of regression metrics over batches of predictions.
+
+    It keeps the count, the sums of squared and absolute errors, and the mean and sum of squared deviations 
+    of the true values (merged with Chan's formula), from which MSE, MAE and R^2 are exact.
+    """
+
+    def __init__(self):
+        """Initializes an empty accumulator."""
+        self.n = 0
+        self.sse = 0.0
+        self.sae = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, y_true, y_pred):
+        """Adds a batch of true and predicted values.
+
+        Args:
+            y_true (array-like): True values.
+            y_pred (array-like): Predicted values.
+        """
+        y_true = np.asarray(y_true, dtype=np.float64).ravel()
+        error = np.asarray(y_pred, dtype=np.float64).ravel() - y_true
+        if y_true.size == 0:
+            return
+        mean = y_true.mean()
+        centered = y_true - mean
+        self._merge(y_true.size, float(error @ error), float(np.abs(error).sum()), mean, float(centered @ centered))
+
+    def merge(self, other):
+        """Merges an accumulator built on other batches (e.g. in another process) into this accumulator.
+
+        Args:
+            other (RegressionMetrics): The accumulator to merge.
+        """
+        if other.n:
+            self._merge(other.n, other.sse, other.sae, other.mean, other.m2)
+
+    def result(self) -> dict:
+        """Returns the metrics.
+
+        Returns:
+            dict: 'MSE', 'MAE' and 'R^2' (NaN if there is no variance in the true values).
+        """
+        if self.n == 0:
+            return {'MSE': np.nan, 'MAE': np.nan, 'R^2': np.nan}
+        return {'MSE': self.sse / self.n, 
+                'MAE': self.sae / self.n, 
+                'R^2': 1 - self.sse / self.m2 if self.m2 > 0 else np.nan}
+
+    def _merge(self, n, sse, sae, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * n / total
+        self.sse += sse
+        self.sae += sae
+        self.n = total
+
+
+class ClassificationMetrics:
+    """A mergeable accumulator of classification metrics over batches of predictions.
+
+    It keeps an incremental confusion matrix (true labels in rows, predicted labels in columns), 
+    growing as new labels appear, from which all metrics are derived in one pass over the predictions.
+    The position of every label is kept in a dict, so that checking for new labels takes constant time per label.
+    """
+
+    def __init__(self):
+        """Initializes an empty accumulator."""
+        self.labels = pd.Index([])
+        self.positions = {}
+        self.matrix = np.zeros((0, 0), dtype=np.int64)
+
+    def update(self, y_true, y_pred):
+        """Adds a batch of true and predicted labels.
+
+        Args:
+            y_true (array-like): True labels.
+            y_pred (array-like): Predicted labels.
+        """
+        y_true, y_pred = np.asarray(y_true).ravel(), np.asarray(y_pred).ravel()
+        self._add_labels(pd.unique(np.concatenate([y_true, y_pred])))
+        k = len(self.labels)
+        codes = self.labels.get_indexer(y_true) * k + self.labels.get_indexer(y_pred)
+        self.matrix += np.bincount(codes, minlength=k * k).reshape(k, k)
+
+    def merge(self, other):
+        """Merges an accumulator built on other batches (e.g. in another process) into this accumulator.
+
+        Args:
+            other (ClassificationMetrics): The accumulator to merge.
+        """
+        self._add_labels(other.labels)
+        index = self.labels.get_indexer(other.labels)
+        self.matrix[np.ix_(index, index)] += other.matrix
+
+    def confusion_matrix(self) -> pd.DataFrame:
+        """Returns the confusion matrix, with true labels in rows and predicted labels in columns."""
+        return pd.DataFrame(self.matrix, index=self.labels, columns=self.labels)
+
+    def result(self) -> dict:
+        """Returns the metrics, averaging precision, recall and F1 over the labels weighted by their support.
+
+        Returns:
+            dict: 'Accuracy', 'Precision', 'Recall' and 'F1'. Labels without predictions 
+            (or without true values) count as 0 precision (or recall), as in scikit-learn.
+        """
+        n = self.matrix.sum()
+        if n == 0:
+            return {'Accuracy': np.nan, 'Precision': np.nan, 'Recall': np.nan, 'F1': np.nan}
+        true_positives = np.diag(self.matrix).astype(np.float64)
+        support = self.matrix.sum(axis=1)
+        predicted = self.matrix.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+            recall = np.where(support > 0, true_positives / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        weights = support / n
+        return {'Accuracy': true_positives.sum() / n, 
+                'Precision': float(weights @ precision), 
+                'Recall': float(weights @ recall), 
+                'F1': float(weights @ f1)}
+
+    def _add_labels(self, labels):
+        new = [label for label in labels if label not in self.positions]
+        if new:
+            for label in new:
+                self.positions[label] = len(self.positions)
+            self.labels = self.labels.append(pd.Index(new))
+            self.matrix = np.pad(self.matrix, ((0, len(new)), (0, len(new))))
+
+
+def metric_accumulator(problem_type):
+    """Returns an empty metric accumulator for a problem type ('regression' or 'classification').
+
+    Raises:
+        ValueError: If the problem type has no metric accumulator.
+    """
+    if problem_type == 'regression':
+        return RegressionMetrics()
+    elif problem_type == 'classification':
+        return ClassificationMetrics()
+    raise ValueError(f"No metric accumulator for the problem type {problem_type}")
+
+
+def compute_metrics(y_true, y_pred, problem_type) -> dict:
+    """Computes the metrics of a problem type in one pass over the predictions.
+
+    Args:
+        y_true (array-like): True labels or values.
+        y_pred (array-like): Predicted labels or values.
+        problem_type (str): 'regression' or 'classification'.
+
+    Returns:
+        dict: The metrics, see RegressionMetrics.result and ClassificationMetrics.result.
+    """
+    metrics = metric_accumulator(problem_type)
+    metrics.update(y_true, y_pred)
+    return metrics.result()
+
+
+# Metrics for which a lower value is better, the others are better when higher
+LOWER_IS_BETTER = ('MSE', 'MAE', 'Davies-Bouldin', 'Inertia')
+
+
+def clustering_metrics(X, labels, sample_size=None, random_state=None) -> dict:
+    """Computes clustering metrics whose cost stays bounded on large data.
+
+    Calinski-Harabasz and Davies-Bouldin are linear in the number of rows. The silhouette is quadratic, 
+    so it is computed on a random sample of rows, with the pairwise distances computed block by block.
+
+    Args:
+        X (array-like): The clustered feature matrix.
+        labels (array-like): The cluster label of every row.
+        sample_size (int, optional): Rows sampled for the silhouette. Defaults to CLUSTERING_CONFIG['silhouette_sample_size'].
+        random_state (int, optional): The seed of the sample. Defaults to MODEL_CONFIG['random_state'].
+
+    Returns:
+        dict: 'Silhouette', 'Calinski-Harabasz' and 'Davies-Bouldin' (NaN if there are fewer than 2 clusters).
+    """
+    from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
+    X = np.asarray(X, dtype=np.float64)
+    labels = np.asarray(labels).ravel()
+    n_clusters = len(np.unique(labels))
+    if n_clusters < 2 or n_clusters >= len(labels):
+        return {'Silhouette': np.nan, 'Calinski-Harabasz': np.nan, 'Davies-Bouldin': np.nan}
+    sample_size = sample_size or CLUSTERING_CONFIG['silhouette_sample_size']
+    random_state = MODEL_CONFIG['random_state'] if random_state is None else random_state
+    try:
+        silhouette = silhouette_score(X, labels, sample_size=sample_size if len(labels) > sample_size else None, 
+                                      random_state=random_state)
+    except ValueError:
+        # The sample contains a single cluster
+        silhouette = np.nan
+    return {'Silhouette': silhouette, 
+            'Calinski-Harabasz': calinski_harabasz_score(X, labels), 
+            'Davies-Bouldin': davies_bouldin_score(X, labels)}
+
+
+def batch_metrics(y_true, y_preds, index, problem_type) -> list:
+    """Computes the metrics of a batch of resamples at once.
+
+    Args:
+        y_true (np.ndarray): True values, or label codes for classification.
+        y_preds (list): Predictions of one or more models, aligned with y_true (label codes for classification).
+        index (np.ndarray): A resample index matrix, one resample of row positions per row.
+        problem_type (str): 'regression' or 'classification'.
+
+    Returns:
+        list: For every model, a dict of the metrics with one value per resample.
+    """
+    n_resamples, n = index.shape
+    if problem_type == 'regression':
+        y = y_true[index]
+        centered = y - y.mean(axis=1, keepdims=True)
+        m2 = np.einsum('ij,ij->i', centered, centered)
+        results = []
+        for y_pred in y_preds:
+            error = y_pred[index] - y
+            sse = np.einsum('ij,ij->i', error, error)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                r2 = np.where(m2 > 0, 1 - sse / m2, np.nan)
+            results.append({'MSE': sse / n, 'MAE': np.abs(error).sum(axis=1) / n, 'R^2': r2})
+        return results
+
+    # One confusion matrix per resample, counted with a single bincount over offset codes
+    k = int(max(y_true.max(), *(y_pred.max() for y_pred in y_preds))) + 1
+    offsets = np.arange(n_resamples)[:, None] * k * k
+    true_codes = offsets + y_true[index] * k
+    results = []
+    for y_pred in y_preds:
+        matrix = np.bincount((true_codes + y_pred[index]).ravel(), minlength=n_resamples * k * k).reshape(n_resamples, k, k)
+        true_positives = np.diagonal(matrix, axis1=1, axis2=2).astype(np.float64)
+        support = matrix.sum(axis=2)
+        predicted = matrix.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+            recall = np.where(support > 0, true_positives / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        weights = support / n
+        results.append({'Accuracy': true_positives.sum(axis=1) / n, 
+                        'Precision': (weights * precision).sum(axis=1), 
+                        'Recall': (weights * recall).sum(axis=1), 
+                        'F1': (weights * f1).sum(axis=1)})
+    return results
 
-def evaluate_model(y_test, y_pred, problem_type, pdf=None) -> None:
-    '''Evaluates the performance of a machine learning model based on the problem type.
+
+def bootstrap_distribution(y_true, y_preds, problem_type, n_resamples=None, budget=None, random_state=None) -> tuple:
+    """Draws bootstrap resamples of the test set and computes the metrics of one or more models on each.
+
+    Every model is evaluated on the same resamples, so their metrics are paired. The resample index matrix 
+    is drawn and evaluated in batches sized by BOOTSTRAP_CONFIG['max_batch_elements'], which bounds the memory use, 
+    and no batch is started that is expected to exceed the time budget.
+
+    Args:
+        y_true (array-like): True labels or values.
+        y_preds (list): Predictions of one or more models, aligned with y_true.
+        problem_type (str): 'regression' or 'classification'.
+        n_resamples (int, optional): The number of resamples. Defaults to BOOTSTRAP_CONFIG['n_resamples'].
+        budget (float, optional): The wall-clock budget in seconds. Defaults to BOOTSTRAP_CONFIG['budget_seconds'].
+        random_state (int, optional): The seed of the resamples. Defaults to BOOTSTRAP_CONFIG['random_state'].
+
+    Returns:
+        tuple: For every model, a dict of the metrics with one value per resample, and the number of resamples drawn.
+
+    Raises:
+        ValueError: If the problem type has no metrics to resample.
+    """
+    if problem_type not in ('regression', 'classification'):
+        raise ValueError(f"Bootstrap is not supported for the problem type {problem_type}")
+    n_resamples = n_resamples or BOOTSTRAP_CONFIG['n_resamples']
+    budget = budget or BOOTSTRAP_CONFIG['budget_seconds']
+    random_state = BOOTSTRAP_CONFIG['random_state'] if random_state is None else random_state
+
+    y_true = np.asarray(y_true).ravel()
+    y_preds = [np.asarray(y_pred).ravel() for y_pred in y_preds]
+    if problem_type == 'regression':
+        y_true = y_true.astype(np.float64)
+        y_preds = [y_pred.astype(np.float64) for y_pred in y_preds]
+    else:
+        # Resample integer label codes, so that the confusion matrices can be counted with bincount
+        labels = pd.Index(pd.unique(np.concatenate([y_true, *y_preds])))
+        y_true = labels.get_indexer(y_true)
+        y_preds = [labels.get_indexer(y_pred) for y_pred in y_preds]
+
+    n = y_true.size
+    batch_size = max(1, min(n_resamples, BOOTSTRAP_CONFIG['max_batch_elements'] // max(n, 1)))
+    rng = np.random.default_rng(random_state)
+    batches = [[] for _ in y_preds]
+    drawn = 0
+    start = time.perf_counter()
+    while drawn < n_resamples:
+        size = min(batch_size, n_resamples - drawn)
+        index = rng.integers(0, n, size=(size, n))
+        for batch, metrics in zip(batches, batch_metrics(y_true, y_preds, index, problem_type)):
+            batch.append(metrics)
+        drawn += size
+        elapsed = time.perf_counter() - start
+        if drawn < n_resamples and elapsed * (drawn + batch_size) / drawn > budget:
+            break
+    distributions = [{metric: np.concatenate([metrics[metric] for metrics in batch]) for metric in batch[0]} 
+                     for batch in batches]
+    return distributions, drawn
+
+
+def bootstrap_metrics(y_true, y_pred, problem_type, confidence_level=None, n_resamples=None, budget=None, 
+                      random_state=None) -> pd.DataFrame:
+    """Computes percentile bootstrap confidence intervals of the metrics of a model.
 
     Args:
-        y_test (array-like): True labels or values.
+        y_true (array-like): True labels or values.
         y_pred (array-like): Predicted labels or values.
+        problem_type (str): 'regression' or 'classification'.
+        confidence_level (float, optional): The confidence level. Defaults to BOOTSTRAP_CONFIG['confidence_level'].
+        n_resamples, budget, random_state: See bootstrap_distribution.
+
+    Returns:
+        pd.DataFrame: One row per metric with the point estimate, the standard error and the interval bounds. 
+        The number of resamples drawn within the budget is in attrs['n_resamples'].
+    """
+    confidence_level = confidence_level or BOOTSTRAP_CONFIG['confidence_level']
+    (distribution,), drawn = bootstrap_distribution(y_true, [y_pred], problem_type, n_resamples, budget, random_state)
+    estimates = compute_metrics(y_true, y_pred, problem_type)
+    alpha = (1 - confidence_level) / 2
+    intervals = pd.DataFrame([{'Metric': metric, 
+                               'Estimate': estimates[metric], 
+                               'Std Error': np.nanstd(values, ddof=1) if drawn > 1 else np.nan, 
+                               'Lower': np.nanquantile(values, alpha), 
+                               'Upper': np.nanquantile(values, 1 - alpha)} 
+                              for metric, values in distribution.items()])
+    intervals.attrs.update(n_resamples=drawn, confidence_level=confidence_level)
+    return intervals
+
+
+@instrument
+def compare_models(y_true, y_pred_a, y_pred_b, problem_type, names=('A', 'B'), confidence_level=None, 
+                   n_resamples=None, budget=None, random_state=None, pdf=None) -> pd.DataFrame:
+    """Compares two models evaluated on the same samples with a paired bootstrap.
+
+    Both models are evaluated on the same resamples, so the interval of the difference of their metrics 
+    accounts for the samples that are hard for both. A difference whose interval excludes 0 is significant.
+
+    Args:
+        y_true (array-like): True labels or values.
+        y_pred_a (array-like): Predictions of the first model.
+        y_pred_b (array-like): Predictions of the second model, aligned with y_pred_a.
+        problem_type (str): 'regression' or 'classification'.
+        names (tuple): The names of the two models.
+        confidence_level (float, optional): The confidence level. Defaults to BOOTSTRAP_CONFIG['confidence_level'].
+        n_resamples, budget, random_state: See bootstrap_distribution.
+        pdf (PDF, optional): PDF object for generating a report. Default is None.
+
+    Returns:
+        pd.DataFrame: One row per metric with the difference (first model - second model), its interval bounds, 
+        the fraction of resamples on which the first model is better, and whether the difference is significant.
+    """
+    
+    print('+------------------------------------------------------------------------------------------------------------+')
+    print('                                         -Compare Models-')
+
+    confidence_level = confidence_level or BOOTSTRAP_CONFIG['confidence_level']
+    (distribution_a, distribution_b), drawn = bootstrap_distribution(y_true, [y_pred_a, y_pred_b], problem_type, 
+                                                                     n_resamples, budget, random_state)
+    estimates_a = compute_metrics(y_true, y_pred_a, problem_type)
+    estimates_b = compute_metrics(y_true, y_pred_b, problem_type)
+    alpha = (1 - confidence_level) / 2
+    rows = []
+    for metric in distribution_a:
+        difference = distribution_a[metric] - distribution_b[metric]
+        better = difference < 0 if metric in LOWER_IS_BETTER else difference > 0
+        lower, upper = np.nanquantile(difference, alpha), np.nanquantile(difference, 1 - alpha)
+        rows.append({'Metric': metric, 
+                     names[0]: estimates_a[metric], 
+                     names[1]: estimates_b[metric], 
+                     'Difference': estimates_a[metric] - estimates_b[metric], 
+                     'Lower': lower, 
+                     'Upper': upper, 
+                     f'{names[0]} Better': better.mean(), 
+                     'Significant': 'yes' if lower > 0 or upper < 0 else 'no'})
+    comparison = pd.DataFrame(rows)
+    comparison.attrs.update(n_resamples=drawn, confidence_level=confidence_level)
+
+    print(f'{names[0]} vs. {names[1]} on {len(np.asarray(y_true))} samples, '
+          f'{confidence_level:.0%} intervals of the difference from {drawn} paired bootstrap resamples:')
+    print(comparison.to_string(index=False))
+
+    if pdf != None:
+        pdf.chapter_sub_title('Model Comparison')
+        pdf.chapter_body(f'{names[0]} vs. {names[1]}: {confidence_level:.0%} intervals of the difference '
+                         f'({names[0]} - {names[1]}) from {drawn} paired bootstrap resamples.')
+        pdf.add_table(comparison)
+
+    return comparison
+
+
+@instrument
+def evaluate_model(y_test, y_pred, problem_type, pdf=None, renderer=None, fold_scores=None, title='Model Evaluation', 
+                   bootstrap=True) -> None:
+    '''Evaluates the performance of a machine learning model based on the problem type.
+
+    Args:
+        y_test (array-like): True labels or values, or the clustered feature matrix for clustering.
+        y_pred (array-like): Predicted labels or values, or the cluster labels for clustering.
         problem_type (str): Type of the problem. Supported types are 'classification', 'regression', 'clustering', 'anomaly_detection', 'dimensionality_reduction', and 'reinforcement_learning'.
         pdf (PDF, optional): PDF object for generating a report. Default is None.
+        renderer (FigureRenderer, optional): Renderer drawing the regression plots in the background. Default is None.
+        fold_scores (pd.DataFrame, optional): The per-fold metrics of model_building.cross_validate_model, 
+            reported as mean ± std. Default is None.
+        title (str): The title of the report section, which also names the figures. Default is 'Model Evaluation'.
+        bootstrap (bool): Whether to report bootstrap confidence intervals of the metrics. Default is True.
 
     Returns:
         None
@@ -39,87 +448,61 @@ def evaluate_model(y_test, y_pred, problem_type, pdf=None) -> None:
     print('+------------------------------------------------------------------------------------------------------------+')
     print('                                         -Evaluate Model-')
     
+    figure_name = title.lower().replace(' ', '_').replace('-', '_')
     if pdf != None:
-        pdf.chapter_sub_title('Model Evaluation')
+        pdf.chapter_sub_title(title)
 
     if problem_type == 'classification':
-        accuracy = accuracy_score(y_test, y_pred)
-        precision = precision_score(y_test, y_pred, average='weighted')
-        recall = recall_score(y_test, y_pred, average='weighted')
-        f1 = f1_score(y_test, y_pred, average='weighted')
+        metrics = compute_metrics(y_test, y_pred, problem_type)
+        accuracy, precision, recall, f1 = metrics['Accuracy'], metrics['Precision'], metrics['Recall'], metrics['F1']
         print(f'Accuracy: {accuracy:.2f}')
         print(f'Precision: {precision:.2f}')
         print(f'Recall: {recall:.2f}')
         print(f'F1 Score: {f1:.2f}')
         if pdf != None:
             pdf.chapter_body(f'Accuracy: {accuracy:.2f}\nPrecision: {precision:.2f}\nRecall: {recall:.2f}\nF1 Score: {f1:.2f}')
+        if bootstrap:
+            report_intervals(bootstrap_metrics(y_test, y_pred, problem_type), pdf)
+        report_fold_scores(fold_scores, pdf)
     
     elif problem_type == 'regression':
-        mse = mean_squared_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
+        metrics = compute_metrics(y_test, y_pred, problem_type)
+        mse, mae, r2 = metrics['MSE'], metrics['MAE'], metrics['R^2']
         print(f'Mean Squared Error (MSE): {mse:.2f}')
+        print(f'Mean Absolute Error (MAE): {mae:.2f}')
         print(f'R^2 Score: {r2:.2f}')
 
-        # Visualize the results by value
-        plt.figure(figsize=(VISUALIZATION_CONFIG['plot_width'], VISUALIZATION_CONFIG['plot_height']))
-        plt.scatter(y_test, y_pred, 
-                    alpha=VISUALIZATION_CONFIG['scatter_alpha'],
-                    color=VISUALIZATION_CONFIG['scatter_color'],
-                    s=VISUALIZATION_CONFIG['scatter_size'],
-                    marker=VISUALIZATION_CONFIG['scatter_marker'])
-        min_val = min(min(y_test), min(y_pred))
-        max_val = max(max(y_test), max(y_pred))
-        plt.plot([min_val, max_val], [min_val, max_val], 
-                 color=VISUALIZATION_CONFIG['scatter_line_color'], 
-                 linestyle=VISUALIZATION_CONFIG['scatter_line_style'], 
-                 linewidth=VISUALIZATION_CONFIG['scatter_line_width'])
-        plt.xlabel('Actual')
-        plt.ylabel('Predicted')
-        plt.grid(True)
-        plt.title('Scatter plot for actual vs. predicted values')
-        plt.savefig('reports/figures/model_evaluation_regression_scatter.png', dpi=VISUALIZATION_CONFIG['resolution'])
+        # Visualize the results by value (large test sets are aggregated, see rendering.scatter_points)
+        scatter_plot = draw(PlotSpec('regression_scatter', f'reports/figures/{figure_name}_regression_scatter.png',
+                                     points=scatter_points(y_test, y_pred),
+                                     min_val=min(np.min(y_test), np.min(y_pred)),
+                                     max_val=max(np.max(y_test), np.max(y_pred))), renderer)
 
         # Visualize the results by index
-        plt.figure(figsize=(VISUALIZATION_CONFIG['plot_width'], VISUALIZATION_CONFIG['plot_height']), 
-                dpi=VISUALIZATION_CONFIG['resolution'])
-        plt.plot(range(len(y_test)), y_test, 
-                 color=VISUALIZATION_CONFIG['line_color1'], 
-                 label='Actual', 
-                 alpha=VISUALIZATION_CONFIG['line_alpha'],
-                 linewidth=VISUALIZATION_CONFIG['line_width'],
-                 marker=VISUALIZATION_CONFIG['line_marker'],
-                 markersize=VISUALIZATION_CONFIG['line_marker_size'],
-                 markerfacecolor=VISUALIZATION_CONFIG['line_marker_color1'],
-                 linestyle=VISUALIZATION_CONFIG['line_style1'])
-        plt.plot(range(len(y_pred)), y_pred, 
-                 color=VISUALIZATION_CONFIG['line_color2'], 
-                 label='Predicted', 
-                 alpha=VISUALIZATION_CONFIG['line_alpha'],
-                 linewidth=VISUALIZATION_CONFIG['line_width'],
-                 marker=VISUALIZATION_CONFIG['line_marker'],
-                 markersize=VISUALIZATION_CONFIG['line_marker_size'],
-                 markerfacecolor=VISUALIZATION_CONFIG['line_marker_color2'],
-                 linestyle=VISUALIZATION_CONFIG['line_style2'])
-        plt.title('Line plot for actual vs. predicted values')
-        plt.legend()
-        plt.grid(True)
-        plt.xlabel('Index')
-        plt.ylabel('Value')
-        plt.savefig('reports/figures/model_evaluation_regression_line.png', dpi=VISUALIZATION_CONFIG['resolution'])
+        line_plot = draw(PlotSpec('regression_line', f'reports/figures/{figure_name}_regression_line.png',
+                                  actual=line_points(y_test), predicted=line_points(y_pred)), renderer)
+
+        if pdf != None:
+            pdf.chapter_body(f'Mean Squared Error (MSE): {mse:.2f}\nMean Absolute Error (MAE): {mae:.2f}\nR^2 Score: {r2:.2f}')
+        if bootstrap:
+            report_intervals(bootstrap_metrics(y_test, y_pred, problem_type), pdf)
+        report_fold_scores(fold_scores, pdf)
 
         if pdf != None:
-            pdf.chapter_body(f'Mean Squared Error (MSE): {mse:.2f}\nR^2 Score: {r2:.2f}')
             pdf.add_page()
             pdf.chapter_body('Scatter plot for actual vs. predicted values')
-            pdf.add_image('reports/figures/model_evaluation_regression_scatter.png')
+            pdf.add_image(scatter_plot)
             pdf.chapter_body('Line plot for actual vs. predicted values')
-            pdf.add_image('reports/figures/model_evaluation_regression_line.png')
+            pdf.add_image(line_plot)
 
     elif problem_type == 'clustering':
-        silhouette_avg = silhouette_score(y_test, y_pred)
-        print(f'Silhouette Score: {silhouette_avg:.2f}')
+        # The clustered features are evaluated, as there are no true labels
+        metrics = clustering_metrics(y_test, y_pred)
+        lines = [f'{metric}: {value:.2f}' for metric, value in metrics.items()]
+        for line in lines:
+            print(line)
         if pdf != None:
-            pdf.chapter_body(f'Silhouette Score: {silhouette_avg:.2f}')
+            pdf.chapter_body('\n'.join(lines))
     elif problem_type == 'anomaly_detection':
         # TODO: Add specific metrics for anomaly detection
         pass
@@ -130,4 +513,39 @@ def evaluate_model(y_test, y_pred, problem_type, pdf=None) -> None:
         # TODO: Add specific metrics for reinforcement learning
         pass
     else:
-        raise ValueError(f"Unsupported problem type {problem_type}")
\ No newline at end of file
+        raise ValueError(f"Unsupported problem type {problem_type}")
+
+
+def report_fold_scores(fold_scores, pdf=None) -> None:
+    '''Reports the metrics of cross-validation folds as mean ± standard deviation.
+
+    Args:
+        fold_scores (pd.DataFrame): One row per fold, as returned by model_building.cross_validate_model. 
+            Nothing is reported if None.
+        pdf (PDF, optional): PDF object for generating a report. Default is None.
+    '''
+    if fold_scores is None:
+        return
+    metrics = [column for column in fold_scores.columns if column not in ('Repeat', 'Fold')]
+    lines = [f'{metric}: {fold_scores[metric].mean():.2f} ± {fold_scores[metric].std():.2f}' for metric in metrics]
+    print(f'Cross-validated over {len(fold_scores)} folds (mean ± std):')
+    for line in lines:
+        print(line)
+    if pdf != None:
+        pdf.chapter_body(f'Cross-validated over {len(fold_scores)} folds (mean ± std):\n' + '\n'.join(lines))
+
+
+def report_intervals(intervals, pdf=None) -> None:
+    '''Reports the bootstrap confidence intervals of metrics.
+
+    Args:
+        intervals (pd.DataFrame): The intervals, as returned by bootstrap_metrics.
+        pdf (PDF, optional): PDF object for generating a report. Default is None.
+    '''
+    header = (f'{intervals.attrs["confidence_level"]:.0%} confidence intervals '
+              f'from {intervals.attrs["n_resamples"]} bootstrap resamples:')
+    print(header)
+    print(intervals.to_string(index=False))
+    if pdf != None:
+        pdf.chapter_body(header)
+        pdf.add_table(intervals)
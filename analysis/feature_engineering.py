@@ -10,18 +10,23 @@
 
 from .config import VISUALIZATION_CONFIG
 from .report_generation import PDF
-from matplotlib import pyplot as plt
+from .rendering import PlotSpec, draw, scatter_points
+from .correlation import target_correlations, correlation_matrix
+from .profiling import instrument
+from .data_preprocessing import save_step
 import pandas as pd
 import numpy as np
-import math
 
 
-def visualize_features(data, feature_list, pdf=None) -> None:
+@instrument
+def visualize_features(data, feature_list, pdf=None, renderer=None) -> None:
     '''Visualize selected features from the dataset.
 
     Args:
         data (pd.DataFrame): The input DataFrame containing the data.
         feature_list (list): A list of feature names to visualize.
+        pdf (PDF, optional): An optional PDF object for report generation.
+        renderer (FigureRenderer, optional): An optional renderer drawing the figures in the background.
 
     Returns:
         None: This function does not return any value but visualizes the features.
@@ -37,105 +42,93 @@ def visualize_features(data, feature_list, pdf=None) -> None:
 
     # Plot histograms for selected features
     sub_data = data[feature_list]
-    sub_data.hist(bins=VISUALIZATION_CONFIG['hist_bins'], 
-                  figsize=(VISUALIZATION_CONFIG['plot_width_subplots'], VISUALIZATION_CONFIG['plot_height_subplots']),
-                  color=VISUALIZATION_CONFIG['hist_color'], 
-                  alpha=VISUALIZATION_CONFIG['hist_alpha'],
-                  edgecolor=VISUALIZATION_CONFIG['hist_edgecolor'],
-                  )
-    plt.suptitle('Histograms for Selected Features', fontsize=VISUALIZATION_CONFIG['title_font_size'])
-    plt.tight_layout()
-    plt.savefig('reports/figures/feature_histograms.png', dpi=VISUALIZATION_CONFIG['resolution'])
+    histograms = draw(PlotSpec('histograms', 'reports/figures/feature_histograms.png',
+                               figsize=(VISUALIZATION_CONFIG['plot_width_subplots'], VISUALIZATION_CONFIG['plot_height_subplots']),
+                               columns=feature_list,
+                               values=[sub_data[feature].to_numpy(dtype=float) for feature in feature_list],
+                               title='Histograms for Selected Features'), renderer)
     print('Histograms for selected features saved to reports/figures/feature_histograms.png')
 
     # Plot scatter plots for features vs. target variable
     target = data.columns[-1]
     features = data.columns[:-1]
-    n_cols = math.ceil(math.sqrt(len(features))) 
-    n_rows = math.ceil(len(features) / n_cols)
-    plt.figure(figsize=(VISUALIZATION_CONFIG['plot_width_subplots'], VISUALIZATION_CONFIG['plot_height_subplots']))
-    for i, feature in enumerate(features):
-        plt.subplot(n_rows, n_cols, i + 1)
-        plt.scatter(data[feature], data[target],                     
-                    alpha=VISUALIZATION_CONFIG['scatter_alpha'],
-                    color=VISUALIZATION_CONFIG['scatter_color'],
-                    s=VISUALIZATION_CONFIG['scatter_size'],
-                    marker=VISUALIZATION_CONFIG['scatter_marker'])
-        plt.xlabel(feature)
-        plt.ylabel(target)
-    plt.suptitle('Scatter Plots for Features vs. Target Variable', fontsize=VISUALIZATION_CONFIG['title_font_size'])
-    plt.tight_layout()
-    plt.savefig('reports/figures/feature_scatter_plots.png', dpi=VISUALIZATION_CONFIG['resolution'])
+    scatter_plots = draw(PlotSpec('scatter_grid', 'reports/figures/feature_scatter_plots.png',
+                                  figsize=(VISUALIZATION_CONFIG['plot_width_subplots'], VISUALIZATION_CONFIG['plot_height_subplots']),
+                                  features=features.tolist(),
+                                  target=target,
+                                  points=[scatter_points(data[feature], data[target]) for feature in features],
+                                  title='Scatter Plots for Features vs. Target Variable'), renderer)
     print('Scatter plots for features vs. target variable saved to reports/figures/feature_scatter_plots.png')
 
     if pdf != None:
         pdf.chapter_body('Visualize selected features.')
         pdf.chapter_body('Feature Histograms')
-        pdf.add_image('reports/figures/feature_histograms.png')
+        pdf.add_image(histograms)
         pdf.add_page()
         pdf.chapter_body('Feature Scatter Plots')
-        pdf.add_image('reports/figures/feature_scatter_plots.png')
+        pdf.add_image(scatter_plots)
 
 
 
 
-def select_features(data, method='correlation', threshold=0.4, pdf=None) -> pd.DataFrame:
+@instrument
+def select_features(data, method='correlation', threshold=0.4, pdf=None, renderer=None) -> pd.DataFrame:
     ''' Select features that have a correlation above a certain threshold with the target variable.
 
     Args:
         data (pd.DataFrame): The input DataFrame containing the data.
         method (str): The method to use for feature selection ('correlation' by default).
         threshold (float): The correlation threshold to determine if a feature is important.
+        pdf (PDF, optional): An optional PDF object for report generation.
+        renderer (FigureRenderer, optional): An optional renderer drawing the correlation matrix in the background.
 
     Returns:
         pd.DataFrame: A DataFrame with selected features above the correlation threshold.
 
     Description:
-        This function calculates the correlation matrix, visualizes it, and selects features 
-        based on their correlation with the target variable. It drops features with 
-        correlation below the threshold and saves the cleaned data to a CSV file.
+        This function calculates the correlation of every feature with the target variable and selects features 
+        based on it. It drops features with correlation below the threshold and can save the selected data to a CSV file (see data_preprocessing.save_step).
+        It also visualizes the correlation matrix. Wide datasets only show the features most correlated with 
+        the target, without annotations (see VISUALIZATION_CONFIG['correlation_matrix_max_columns'] and 
+        VISUALIZATION_CONFIG['correlation_matrix_annotate_max']).
     '''
 
     print('+------------------------------------------------------------------------------------------------------------+')
     print('                                         -Select Features-')
 
-    # Calculate the correlation matrix
-    corr_matrix = data.corr()
-    # Plot the correlation matrix
-    fig, ax = plt.subplots(figsize=(VISUALIZATION_CONFIG['correlation_matrix_width'], VISUALIZATION_CONFIG['correlation_matrix_height']))
-    # Visualize the correlation matrix
-    cax = ax.matshow(corr_matrix, cmap=VISUALIZATION_CONFIG['correlation_matrix_cmap'])
-    fig.colorbar(cax, shrink=VISUALIZATION_CONFIG['correlation_matrix_colorbar_shrink'])
-    for i in range(corr_matrix.shape[0]):
-        for j in range(corr_matrix.shape[1]):
-            ax.text(j, i, f'{corr_matrix.iloc[i, j]:.2f}', va='center', ha='center', color=VISUALIZATION_CONFIG['correlation_matrix_text_color'])
-    ax.set_xticks(range(len(data.columns)))
-    ax.set_yticks(range(len(data.columns)))
-    ax.set_xticklabels(data.columns)
-    ax.set_yticklabels(data.columns)
-    ax.xaxis.set_ticks_position(VISUALIZATION_CONFIG['correlation_matrix_ticks_position'])
-    plt.tight_layout()
-    plt.savefig('reports/figures/correlation_matrix.png', dpi=VISUALIZATION_CONFIG['resolution'])
+    # Calculate the correlations with the target variable only
+    target = data.columns[-1]
+    target_corr = target_correlations(data, target)
+
+    # Plot the correlation matrix of the features most correlated with the target
+    heatmap_columns = target_corr.index
+    if len(heatmap_columns) > VISUALIZATION_CONFIG['correlation_matrix_max_columns']:
+        ranked = target_corr.drop(target).abs().sort_values(ascending=False)
+        top = ranked.index[:VISUALIZATION_CONFIG['correlation_matrix_max_columns'] - 1]
+        # Ordered by correlation with the target, so that related features are next to each other
+        heatmap_columns = target_corr[top].sort_values(ascending=False).index.append(pd.Index([target]))
+    corr_matrix = correlation_matrix(data[heatmap_columns])
+    correlation_plot = draw(PlotSpec('correlation_matrix', 'reports/figures/correlation_matrix.png',
+                                     figsize=(VISUALIZATION_CONFIG['correlation_matrix_width'], VISUALIZATION_CONFIG['correlation_matrix_height']),
+                                     columns=corr_matrix.columns.tolist(),
+                                     matrix=corr_matrix.to_numpy(),
+                                     annotate=len(heatmap_columns) <= VISUALIZATION_CONFIG['correlation_matrix_annotate_max']), renderer)
 
     # Select features with correlation above the threshold
-    drop_features = []
-    target = corr_matrix.index[-1]
-    for feature in corr_matrix.index:
-        if abs(corr_matrix.loc[feature, target]) < threshold:
-            drop_features.append(feature)
+    drop_features = target_corr.index[target_corr.abs() < threshold].tolist()
     data = data.drop(drop_features, axis=1)
     print('Selected features based on correlation threshold.')
     print(f'Correlation threshold: {threshold}')
     print('Selected Features: ', data.columns.tolist())
 
-    # Save the cleaned data
-    data.to_csv('data/processed/data_select_features.csv', index=False)
+    # Save the selected data for inspection, if enabled
+    save_step(data, 'data_select_features.csv')
 
     if pdf != None:
         pdf.add_page()
         pdf.chapter_sub_title('Select Features')
         pdf.chapter_body('Correlation Matrix')
-        pdf.add_image('reports/figures/correlation_matrix.png')
+        pdf.add_image(correlation_plot)
         pdf.chapter_body('Select features based on correlation threshold.')
         pdf.chapter_body(f'Correlation threshold: {threshold}')
         pdf.chapter_body('Selected Features: '
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/10 11:20
+@Desc: This module scores new data with a model from the model registry.
+       A large input file is streamed in chunks through a pool of worker processes,
+       each of which loads the model once, and the predictions are written out chunk by chunk in input order.
+       If the input contains the target, every worker also accumulates the metrics of its chunks, which are merged exactly.
+'''
+
+from .config import INFERENCE_CONFIG
+from .model_registry import ModelRegistry
+from .data_loading import load_data
+from .evaluation import metric_accumulator
+from .profiling import instrument
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import pandas as pd
+import argparse
+import os
+
+# The model, preprocessing parameters and problem type of a worker process, loaded once by _init_worker
+_model = None
+_preprocessing = None
+_problem_type = None
+
+
+def prepare_features(data, preprocessing) -> pd.DataFrame:
+    """Prepares new data for a registered model with its fitted preprocessing parameters.
+
+    Args:
+        data (pd.DataFrame): The new data, containing at least the feature columns of the model.
+        preprocessing (dict): The 'preprocessing' parameters from the model metadata.
+
+    Returns:
+        pd.DataFrame: The feature columns in training order, with missing values filled with the training medians.
+    """
+    X = data[preprocessing['features']]
+    if preprocessing.get('fill_values'):
+        X = X.fillna(preprocessing['fill_values'])
+    return X
+
+
+def _init_worker(root, name, version):
+    """Loads the model once per worker process."""
+    global _model, _preprocessing, _problem_type
+    _model, meta = ModelRegistry(root).load(name, version)
+    _preprocessing = meta['preprocessing']
+    _problem_type = meta.get('problem_type')
+
+
+def _predict_chunk(features, y_true=None):
+    """Predicts a chunk, and accumulates its metrics if the true values are given."""
+    y_pred = _model.predict(prepare_features(features, _preprocessing))
+    if y_true is None:
+        return y_pred, None
+    # Rows without a true value are not evaluated
+    known = pd.notna(y_true)
+    metrics = metric_accumulator(_problem_type)
+    metrics.update(y_true[known], y_pred[known])
+    return y_pred, metrics
+
+
+@instrument
+def predict_file(name, input_path, output_path, version=None, chunksize=None, max_workers=None,
+                 registry_root=None, prediction_column='prediction') -> tuple:
+    """Scores a CSV file with a registered model and writes the predictions to a CSV file.
+
+    Args:
+        name (str): The name of the model in the registry.
+        input_path (str): The CSV file to score.
+        output_path (str): The CSV file to write, with the input columns and the prediction column.
+        version (int, optional): The model version. Defaults to the latest version.
+        chunksize (int, optional): Rows per chunk. Defaults to INFERENCE_CONFIG['chunk_size'].
+        max_workers (int, optional): Worker processes. Defaults to INFERENCE_CONFIG['max_workers'], or one per core.
+        registry_root (str, optional): The root directory of the registry. Defaults to MODEL_REGISTRY_CONFIG['root'].
+        prediction_column (str): The name of the prediction column.
+
+    Returns:
+        tuple: The number of rows scored, and the metrics of the predictions if the input contains 
+        the target of a regression or classification model (None otherwise).
+
+    Raises:
+        FileNotFoundError: If the model or version does not exist.
+    """
+    registry = ModelRegistry(registry_root)
+    meta = registry.metadata(name, version)
+    features = meta['preprocessing']['features']
+    target = meta['preprocessing'].get('target')
+    metrics = None
+    if meta.get('problem_type') in ('regression', 'classification'):
+        metrics = metric_accumulator(meta['problem_type'])
+    chunksize = chunksize or INFERENCE_CONFIG['chunk_size']
+    max_workers = max_workers or INFERENCE_CONFIG['max_workers'] or os.cpu_count()
+
+    print(f'Scoring {input_path} with {name} version {meta["version"]} in {max_workers} worker processes.')
+    n_rows = 0
+    evaluated = False
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                             initargs=(registry.root, name, meta['version'])) as pool, \
+         open(output_path, 'w', newline='') as output:
+
+        def write(chunk, future):
+            nonlocal n_rows, evaluated
+            y_pred, chunk_metrics = future.result()
+            if chunk_metrics is not None:
+                metrics.merge(chunk_metrics)
+                evaluated = True
+            chunk.assign(**{prediction_column: y_pred}).to_csv(output, index=False, header=n_rows == 0)
+            n_rows += chunk.shape[0]
+
+        # At most two chunks per worker are in flight, which bounds the memory use
+        pending = deque()
+        for chunk in load_data('csv', file_path=input_path, chunksize=chunksize, use_cache=False):
+            y_true = chunk[target].to_numpy() if metrics is not None and target in chunk.columns else None
+            pending.append((chunk, pool.submit(_predict_chunk, chunk[features], y_true)))
+            if len(pending) >= 2 * max_workers:
+                write(*pending.popleft())
+        while pending:
+            write(*pending.popleft())
+
+    print(f'Wrote {n_rows} predictions to {output_path}.')
+    if not evaluated:
+        return n_rows, None
+    result = metrics.result()
+    print(', '.join(f'{key}: {value:.4f}' for key, value in result.items()))
+    return n_rows, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score a CSV file with a model from the model registry.')
+    parser.add_argument('name', help='The name of the model in the registry.')
+    parser.add_argument('input', help='The CSV file to score.')
+    parser.add_argument('output', help='The CSV file to write the predictions to.')
+    parser.add_argument('--version', type=int, default=None, help='The model version (default: latest).')
+    parser.add_argument('--chunksize', type=int, default=None, help='Rows per chunk.')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes.')
+    parser.add_argument('--registry', default=None, help='The root directory of the model registry.')
+    args = parser.parse_args()
+
+    predict_file(args.name, args.input, args.output, version=args.version, chunksize=args.chunksize,
+                 max_workers=args.workers, registry_root=args.registry)
@@ -10,20 +10,97 @@
 
 
 import pandas as pd
-from matplotlib import pyplot as plt
-from .config import VISUALIZATION_CONFIG
-from .config import MODEL_CONFIG
+from .config import MODEL_CONFIG, MODEL_GRID_CONFIG, CROSS_VALIDATION_CONFIG, INCREMENTAL_CONFIG, TUNING_CONFIG, CLUSTERING_CONFIG
 from .report_generation import PDF
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression, LogisticRegression
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
-from sklearn.cluster import KMeans
-from sklearn.ensemble import IsolationForest
-from sklearn.decomposition import PCA
+from .evaluation import compute_metrics, metric_accumulator, clustering_metrics, LOWER_IS_BETTER
+from .profiling import instrument
+from .caching import data_fingerprint
+import numpy as np
+import itertools
+import importlib
+import tempfile
+import time
+import os
 
 
-def train_model(data, problem_type, method, pdf=None) -> tuple:
+# The estimators available per problem type and method, with their default hyperparameters.
+# Estimators are given by their import path and imported on first use, so that importing this module does not load scikit-learn
+MODELS = {
+    'classification': {
+        'logistic_regression': ('sklearn.linear_model.LogisticRegression', {}),
+        'decision_tree': ('sklearn.tree.DecisionTreeClassifier', {}),
+        'random_forest': ('sklearn.ensemble.RandomForestClassifier', {}),
+        'sgd': ('sklearn.linear_model.SGDClassifier', {'random_state': MODEL_CONFIG['random_state']}),
+    },
+    'regression': {
+        'linear_regression': ('sklearn.linear_model.LinearRegression', {}),
+        'decision_tree': ('sklearn.tree.DecisionTreeRegressor', {}),
+        'random_forest': ('sklearn.ensemble.RandomForestRegressor', {}),
+        'sgd': ('sklearn.linear_model.SGDRegressor', {'random_state': MODEL_CONFIG['random_state']}),
+    },
+    'clustering': {
+        'kmeans': ('sklearn.cluster.KMeans', {'n_clusters': MODEL_CONFIG['n_clusters']}),
+        'minibatch_kmeans': ('sklearn.cluster.MiniBatchKMeans', {'n_clusters': MODEL_CONFIG['n_clusters'], 'batch_size': CLUSTERING_CONFIG['batch_size'], 
+                                                                 'random_state': MODEL_CONFIG['random_state']}),
+    },
+    'anomaly_detection': {
+        'isolation_forest': ('sklearn.ensemble.IsolationForest', {}),
+    },
+    'dimensionality_reduction': {
+        'pca': ('sklearn.decomposition.PCA', {'n_components': MODEL_CONFIG['n_components']}),
+        'incremental_pca': ('sklearn.decomposition.IncrementalPCA', {'n_components': MODEL_CONFIG['n_components']}),
+    },
+}
+
+
+# The metric ranking the model grid and tuning and summarising cross-validation per problem type,
+# sorted ascending if it is in evaluation.LOWER_IS_BETTER
+GRID_METRICS = {
+    'regression': 'MSE',
+    'classification': 'Accuracy',
+}
+
+
+def estimator_modules() -> list:
+    '''The modules imported on first use by the functions of this module: those of the estimators in MODELS
+    and the scikit-learn and joblib modules used for splitting, scaling and scoring.
+
+    Pass them as the preload of pipeline.Pipeline.run, so that they are imported once before stages run concurrently.
+    '''
+    modules = {path.rsplit('.', 1)[0] for methods in MODELS.values() for path, _ in methods.values()}
+    return ['joblib', 'sklearn.base', 'sklearn.metrics', 'sklearn.model_selection', 'sklearn.preprocessing',
+            'sklearn.pipeline', *sorted(modules)]
+
+
+def build_model(problem_type, method, **params):
+    '''Initialize the estimator of a problem type and method.
+
+    Args:
+        problem_type (str): The type of machine learning problem (e.g., 'classification', 'regression').
+        method (str): The specific method/algorithm (e.g., 'logistic_regression', 'linear_regression').
+        **params: Hyperparameters overriding the defaults of the method.
+
+    Returns:
+        The unfitted scikit-learn estimator.
+
+    Raises:
+        ValueError: If the problem type or method is unsupported.
+        NotImplementedError: For reinforcement learning.
+    '''
+    if problem_type == 'reinforcement_learning':
+        raise NotImplementedError("Reinforcement learning is not implemented yet")
+    if problem_type not in MODELS:
+        raise ValueError(f"Unsupported problem type {problem_type}")
+    if method not in MODELS[problem_type]:
+        raise ValueError(f"Unsupported method {method} for {problem_type.replace('_', ' ')}")
+    path, defaults = MODELS[problem_type][method]
+    module, name = path.rsplit('.', 1)
+    estimator = getattr(importlib.import_module(module), name)
+    return estimator(**{**defaults, **params})
+
+
+@instrument
+def train_model(data, problem_type, method, pdf=None, registry=None, name=None) -> tuple:
     '''Train a machine learning model based on the specified problem type and method.
     
     Args:
@@ -31,9 +108,13 @@ def train_model(data, problem_type, method, pdf=None) -> tuple:
         problem_type (str): The type of machine learning problem (e.g., 'classification', 'regression').
         method (str): The specific method/algorithm to use for training (e.g., 'logistic_regression', 'linear_regression').
         pdf (PDF, optional): An optional PDF object for report generation.
+        registry (ModelRegistry, optional): A model registry that the fitted model is saved to, 
+            together with its preprocessing parameters.
+        name (str, optional): The name of the model in the registry. Defaults to '<problem_type>_<method>'.
     
     Returns:
-        tuple: A tuple containing the true values and the predicted values for the test set.
+        tuple: A tuple containing the true values and the predicted values for the test set 
+        (for clustering, the test features and their cluster labels, which evaluation.evaluate_model scores).
     
     Description:
         This function trains a machine learning model based on the specified problem type and method. 
@@ -45,6 +126,8 @@ def train_model(data, problem_type, method, pdf=None) -> tuple:
     print('+------------------------------------------------------------------------------------------------------------+')
     print('                                         -Train Model-')
     
+    from sklearn.model_selection import train_test_split
+
     # Split the data into features and target variable
     X = data[data.columns[:-1]]
     y = data[data.columns[-1]]
@@ -55,49 +138,7 @@ def train_model(data, problem_type, method, pdf=None) -> tuple:
                                                         random_state=MODEL_CONFIG['random_state'])
     
     # Initialize the model based on the problem type and method
-    if problem_type == 'classification':
-        if method == 'logistic_regression':
-            model = LogisticRegression()
-        elif method == 'decision_tree':
-            model = DecisionTreeClassifier()
-        elif method == 'random_forest':
-            model = RandomForestClassifier()
-        else:
-            raise ValueError(f"Unsupported method {method} for classification")
-        
-    elif problem_type == 'regression':
-        if method == 'linear_regression':
-            model = LinearRegression()
-        elif method == 'decision_tree':
-            model = DecisionTreeRegressor()
-        elif method == 'random_forest':
-            model = RandomForestRegressor()
-        else:
-            raise ValueError(f"Unsupported method {method} for regression")
-        
-    elif problem_type == 'clustering':
-        if method == 'kmeans':
-            model = KMeans(n_clusters=MODEL_CONFIG['n_clusters'])
-        else:
-            raise ValueError(f"Unsupported method {method} for clustering")
-        
-    elif problem_type == 'anomaly_detection':
-        if method == 'isolation_forest':
-            model = IsolationForest()
-        else:
-            raise ValueError(f"Unsupported method {method} for anomaly detection")
-        
-    elif problem_type == 'dimensionality_reduction':
-        if method == 'pca':
-            model = PCA(n_components=MODEL_CONFIG['n_components'])
-        else:
-            raise ValueError(f"Unsupported method {method} for dimensionality reduction")
-        
-    elif problem_type == 'reinforcement_learning':
-        raise NotImplementedError("Reinforcement learning is not implemented yet")
-    
-    else:
-        raise ValueError(f"Unsupported problem type {problem_type}")
+    model = build_model(problem_type, method)
 
     # Train the model
     model.fit(X_train, y_train)
@@ -112,6 +153,16 @@ def train_model(data, problem_type, method, pdf=None) -> tuple:
     print('Model:', model)
     print('Training completed successfully.')
 
+    # Save the model with the parameters needed to prepare new data for it
+    if registry != None:
+        name = name or f'{problem_type}_{method}'
+        preprocessing = {'features': list(X.columns), 
+                         'target': y.name, 
+                         'fill_values': X_train.median(numeric_only=True).to_dict()}
+        version = registry.save(name, model, preprocessing=preprocessing, 
+                                metadata={'problem_type': problem_type, 'method': method, 'training_samples': X_train.shape[0]})
+        print(f'Model saved to the registry as {name} version {version}.')
+
     # Generate PDF report
     if pdf != None:
         pdf.chapter_sub_title(f'Train Model')
@@ -120,5 +171,720 @@ def train_model(data, problem_type, method, pdf=None) -> tuple:
         pdf.chapter_body(f'Problem Type: {problem_type}')
         pdf.chapter_body(f'Method: {method}')
         pdf.chapter_body(f'Model: {model}')
+        if registry != None:
+            pdf.chapter_body(f'Registered as: {name} version {version}')
+
+    # Clusters are evaluated on the features they were assigned from
+    if problem_type == 'clustering':
+        return X_test, y_pred
+    return y_test, y_pred
+
+
+@instrument
+def train_model_grid(data, problem_type, candidates=None, n_jobs=None, pdf=None) -> pd.DataFrame:
+    '''Train several methods and hyperparameter sets in parallel and rank them on the same test set.
+
+    Args:
+        data (pd.DataFrame): The dataset containing features and target variable.
+        problem_type (str): Either 'classification' or 'regression'.
+        candidates (list, optional): The candidates as (method, hyperparameters) tuples. 
+            Defaults to MODEL_GRID_CONFIG[problem_type].
+        n_jobs (int, optional): The number of worker processes. Defaults to MODEL_CONFIG['n_jobs'], capped while pipeline stages run at once.
+        pdf (PDF, optional): An optional PDF object for report generation.
+
+    Returns:
+        pd.DataFrame: The leaderboard, with the method, hyperparameters, test metrics, 
+        fit time and predict time of every candidate, best candidate first.
+
+    Raises:
+        ValueError: If the problem type is not supported by the model grid.
+
+    Description:
+        The data is split once, as in train_model. The training and testing matrices are dumped once 
+        to a temporary folder and memory-mapped read-only, so the workers share them 
+        instead of each receiving a pickled copy.
+    '''
+    
+    print('+------------------------------------------------------------------------------------------------------------+')
+    print('                                         -Train Model Grid-')
+
+    if problem_type not in GRID_METRICS:
+        raise ValueError(f"The model grid does not support the problem type {problem_type}")
+    candidates = candidates or MODEL_GRID_CONFIG[problem_type]
+    n_jobs = _n_jobs(n_jobs)
+    for method, params in candidates:
+        build_model(problem_type, method, **params)
+    from sklearn.model_selection import train_test_split
+    from joblib import Parallel, delayed
+
+    # Split the data into features and target variable
+    X = _feature_matrix(data[data.columns[:-1]])
+    y = data[data.columns[-1]].to_numpy()
+
+    # Split the data into training and testing sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, 
+                                                        test_size=MODEL_CONFIG['test_size'],
+                                                        random_state=MODEL_CONFIG['random_state'])
+
+    with tempfile.TemporaryDirectory() as folder:
+        arrays = [_memmap(folder, name, array) for name, array in 
+                  (('X_train', X_train), ('y_train', y_train), ('X_test', X_test), ('y_test', y_test))]
+        results = Parallel(n_jobs=n_jobs)(delayed(_fit_candidate)(problem_type, method, params, *arrays) 
+                                          for method, params in candidates)
+
+    metric = GRID_METRICS[problem_type]
+    leaderboard = pd.DataFrame(results).sort_values(metric, ascending=metric in LOWER_IS_BETTER, kind='stable')
+    leaderboard = leaderboard.reset_index(drop=True)
+    leaderboard.index = leaderboard.index + 1
+
+    print('Training data size:', X_train.shape[0], 'samples.')
+    print('Testing data size:', X_test.shape[0], 'samples.')
+    print('Problem Type:', problem_type)
+    print('Leaderboard:')
+    print(leaderboard.to_string())
+
+    # Generate PDF report
+    if pdf != None:
+        pdf.chapter_sub_title('Model Grid')
+        pdf.chapter_body(f'{len(candidates)} candidates trained on {X_train.shape[0]} samples '
+                         f'and tested on {X_test.shape[0]} samples, ranked by {metric}.')
+        pdf.add_table(leaderboard.reset_index(names='Rank'))
+
+    return leaderboard
+
+
+def _feature_matrix(features) -> np.ndarray:
+    """Convert feature columns to a floating-point matrix without upcasting compact dtypes.
+
+    The matrix is float32 if that holds the values of all columns (e.g. float32 and uint8 columns), and float64 otherwise.
+    """
+    if all(isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.number) for dtype in features.dtypes):
+        dtype = np.result_type(np.float32, *features.dtypes)
+        if np.issubdtype(dtype, np.floating):
+            return features.to_numpy(dtype=dtype)
+    return features.to_numpy(dtype=np.float64)
+
+
+def _n_jobs(n_jobs=None) -> int:
+    """Resolve the number of worker processes: n_jobs if given, else MODEL_CONFIG['n_jobs'],
+    capped by the n_jobs of an enclosing joblib.parallel_config (set by the pipeline while stages run at once)."""
+    if n_jobs:
+        return n_jobs
+    from joblib import effective_n_jobs
+    from joblib.parallel import get_active_backend
+    _, limit = get_active_backend()
+    if limit is None:
+        return MODEL_CONFIG['n_jobs']
+    return min(effective_n_jobs(MODEL_CONFIG['n_jobs']), effective_n_jobs(limit))
+
+
+def _memmap(folder, name, array):
+    """Dump an array to a folder and memory-map it read-only. Object arrays cannot be mapped and are returned as is."""
+    if array.dtype == object:
+        return array
+    from joblib import dump, load
+    path = os.path.join(folder, f'{name}.joblib')
+    dump(array, path)
+    return load(path, mmap_mode='r')
+
+
+def _fit_candidate(problem_type, method, params, X_train, y_train, X_test, y_test) -> dict:
+    """Fit and score one candidate of the model grid, in a worker process."""
+    model = build_model(problem_type, method, **params)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = model.predict(X_test)
+    predict_time = time.perf_counter() - start
+
+    return {'Method': method, 
+            'Params': ', '.join(f'{key}={value}' for key, value in params.items()) or 'default',
+            **compute_metrics(y_test, y_pred, problem_type), 
+            'Fit Time (s)': fit_time, 
+            'Predict Time (s)': predict_time}
+
+
+def make_splitter(strategy, problem_type, n_splits=None, n_repeats=None, shuffle=None):
+    '''Initialize the cross-validation splitter of a strategy.
+
+    Args:
+        strategy (str): 'kfold', 'stratified', 'repeated' or 'timeseries'.
+        problem_type (str): The type of machine learning problem. Repeated splits are stratified for classification.
+        n_splits (int, optional): The number of folds. Defaults to CROSS_VALIDATION_CONFIG['n_splits'].
+        n_repeats (int, optional): The repetitions of the 'repeated' strategy. Defaults to CROSS_VALIDATION_CONFIG['n_repeats'].
+        shuffle (bool, optional): Whether to shuffle before splitting. Defaults to CROSS_VALIDATION_CONFIG['shuffle'].
+
+    Returns:
+        The scikit-learn splitter.
+
+    Raises:
+        ValueError: If the strategy is unsupported.
+    '''
+    n_splits = n_splits or CROSS_VALIDATION_CONFIG['n_splits']
+    n_repeats = n_repeats or CROSS_VALIDATION_CONFIG['n_repeats']
+    shuffle = CROSS_VALIDATION_CONFIG['shuffle'] if shuffle is None else shuffle
+    random_state = MODEL_CONFIG['random_state'] if shuffle else None
+    from sklearn.model_selection import KFold, StratifiedKFold, RepeatedKFold, RepeatedStratifiedKFold, TimeSeriesSplit
+
+    if strategy == 'kfold':
+        return KFold(n_splits=n_splits, shuffle=shuffle, random_state=random_state)
+    elif strategy == 'stratified':
+        return StratifiedKFold(n_splits=n_splits, shuffle=shuffle, random_state=random_state)
+    elif strategy == 'repeated':
+        splitter = RepeatedStratifiedKFold if problem_type == 'classification' else RepeatedKFold
+        return splitter(n_splits=n_splits, n_repeats=n_repeats, random_state=MODEL_CONFIG['random_state'])
+    elif strategy == 'timeseries':
+        return TimeSeriesSplit(n_splits=n_splits)
+    else:
+        raise ValueError(f"Unsupported cross-validation strategy {strategy}")
+
+
+@instrument
+def cross_validate_model(data, problem_type, method, strategy=None, n_splits=None, n_repeats=None, 
+                         cv_jobs=None, pdf=None, **params) -> tuple:
+    '''Cross-validate a machine learning model, running the folds in parallel.
+
+    Args:
+        data (pd.DataFrame): The dataset containing features and target variable.
+        problem_type (str): Either 'classification' or 'regression'.
+        method (str): The specific method/algorithm to use for training.
+        strategy (str, optional): 'kfold', 'stratified', 'repeated' or 'timeseries'. 
+            Defaults to CROSS_VALIDATION_CONFIG['strategy'].
+        n_splits (int, optional): The number of folds. Defaults to CROSS_VALIDATION_CONFIG['n_splits'].
+        n_repeats (int, optional): The repetitions of the 'repeated' strategy. Defaults to CROSS_VALIDATION_CONFIG['n_repeats'].
+        cv_jobs (int, optional): The number of worker processes the folds run on. 
+            Defaults to MODEL_CONFIG['n_jobs'], capped while pipeline stages run at once.
+        pdf (PDF, optional): An optional PDF object for report generation.
+        **params: Hyperparameters of the method, including its own n_jobs (e.g. of a random forest).
+
+    Returns:
+        tuple: The true values, the out-of-fold predictions and a DataFrame with the metrics, fit time and 
+        predict time of every fold (which evaluation.evaluate_model reports as mean ± std).
+
+    Raises:
+        ValueError: If the problem type is not supported by cross-validation.
+
+    Description:
+        The fold indices are computed once. The feature matrix and target are memory-mapped once and shared by 
+        the workers, which only receive the indices of their fold. Repeated splits average the out-of-fold 
+        predictions over the repetitions (majority vote for classification). Time-series splits never 
+        predict the first block of rows, which is left out of the returned values.
+    '''
+    
+    print('+------------------------------------------------------------------------------------------------------------+')
+    print('                                         -Cross-Validate Model-')
+
+    if problem_type not in GRID_METRICS:
+        raise ValueError(f"Cross-validation does not support the problem type {problem_type}")
+    strategy = strategy or CROSS_VALIDATION_CONFIG['strategy']
+    cv_jobs = _n_jobs(cv_jobs)
+    model = build_model(problem_type, method, **params)
+
+    # Split the data into features and target variable
+    X = _feature_matrix(data[data.columns[:-1]])
+    y = data[data.columns[-1]]
+    y_values = y.to_numpy()
+
+    from joblib import Parallel, delayed
+
+    # Compute the fold indices once
+    splitter = make_splitter(strategy, problem_type, n_splits, n_repeats)
+    folds = list(splitter.split(X, y))
+    n_repeats = getattr(splitter, 'n_repeats', 1)
+    folds_per_repeat = len(folds) // n_repeats
+
+    with tempfile.TemporaryDirectory() as folder:
+        X_shared, y_shared = _memmap(folder, 'X', X), _memmap(folder, 'y', y_values)
+        results = Parallel(n_jobs=cv_jobs)(delayed(_fit_fold)(problem_type, method, params, X_shared, y_shared, train_index, test_index) 
+                                          for train_index, test_index in folds)
+
+    # Aggregate the out-of-fold predictions of every repetition
+    predictions = np.empty((n_repeats, len(y)), dtype=np.float64 if problem_type == 'regression' else y_values.dtype)
+    predicted = np.zeros(len(y), dtype=bool)
+    fold_scores = []
+    pooled = metric_accumulator(problem_type)
+    for i, ((train_index, test_index), (y_pred, metrics, times)) in enumerate(zip(folds, results)):
+        predictions[i // folds_per_repeat, test_index] = y_pred
+        predicted[test_index] = True
+        pooled.merge(metrics)
+        fold_scores.append({'Repeat': i // folds_per_repeat + 1, 'Fold': i % folds_per_repeat + 1, **metrics.result(), **times})
+    predictions = predictions[:, predicted]
+    if n_repeats == 1:
+        y_oof = predictions[0]
+    elif problem_type == 'regression':
+        y_oof = predictions.mean(axis=0)
+    else:
+        y_oof = pd.DataFrame(predictions).mode(axis=0).iloc[0].to_numpy()
+    y_true = y[predicted]
+    fold_scores = pd.DataFrame(fold_scores)
+
+    metric = GRID_METRICS[problem_type]
+    print('Strategy:', strategy)
+    print('Folds:', len(folds))
+    print('Problem Type:', problem_type)
+    print('Method:', method)
+    print('Model:', model)
+    print(fold_scores.to_string(index=False))
+    print(f'{metric}: {fold_scores[metric].mean():.2f} ± {fold_scores[metric].std():.2f}')
+    print(f'Pooled out-of-fold {metric}: {pooled.result()[metric]:.2f}')
+
+    # Generate PDF report
+    if pdf != None:
+        pdf.chapter_sub_title('Cross-Validation')
+        pdf.chapter_body(f'Strategy: {strategy} ({len(folds)} folds over {len(y)} samples)')
+        pdf.chapter_body(f'Method: {method}')
+        pdf.chapter_body(f'Model: {model}')
+        pdf.add_table(fold_scores)
+
+    return y_true, y_oof, fold_scores
+
+
+def _fit_fold(problem_type, method, params, X, y, train_index, test_index) -> tuple:
+    """Fit and score the model on one fold, in a worker process."""
+    model = build_model(problem_type, method, **params)
+
+    start = time.perf_counter()
+    model.fit(X[train_index], y[train_index])
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = model.predict(X[test_index])
+    predict_time = time.perf_counter() - start
+
+    metrics = metric_accumulator(problem_type)
+    metrics.update(y[test_index], y_pred)
+    return y_pred, metrics, {'Fit Time (s)': fit_time, 'Predict Time (s)': predict_time}
+
+
+@instrument
+def train_incremental(chunks, problem_type, method, classes=None, validation=None, epochs=None, 
+                      checkpoint=None, resume=True, pdf=None, registry=None, name=None, **params) -> tuple:
+    '''Train a partial_fit-capable model chunk by chunk from a streaming source, for data larger than memory.
+
+    Args:
+        chunks (iterable or callable): The training data as DataFrame chunks with the target as the last column, 
+            e.g. data_loading.load_data('csv', chunksize=...). Pass a callable returning a new iterator for several epochs.
+        problem_type (str): The type of machine learning problem.
+        method (str): A method whose estimator supports partial_fit, e.g. 'sgd', 'minibatch_kmeans' or 'incremental_pca'.
+        classes (array-like, optional): All class labels, required for classification since a chunk may not contain every class.
+        validation (iterable or callable, optional): A held-out validation stream of DataFrame chunks, evaluated after every epoch. 
+            Without it, INCREMENTAL_CONFIG['validation_fraction'] of the rows of every chunk are held out and evaluated as they arrive.
+        epochs (int, optional): The number of passes over the data. Defaults to INCREMENTAL_CONFIG['epochs'].
+        checkpoint (str, optional): The checkpoint file, written every INCREMENTAL_CONFIG['checkpoint_every'] chunks. 
+            Defaults to '<problem_type>_<method>.joblib' in INCREMENTAL_CONFIG['checkpoint_dir']. Pass False to disable checkpoints.
+        resume (bool): Whether to resume from an existing checkpoint, skipping the chunks it has already been trained on. 
+            A checkpoint of a different run (another method, hyperparameters, classes or data) is not resumed.
+        pdf (PDF, optional): An optional PDF object for report generation.
+        registry (ModelRegistry, optional): A model registry that the trained model is saved to.
+        name (str, optional): The name of the model in the registry. Defaults to '<problem_type>_<method>'.
+        **params: Hyperparameters of the method.
+
+    Returns:
+        tuple: The fitted pipeline (a StandardScaler followed by the estimator) and a DataFrame 
+        with the validation metrics at every checkpoint and at the end of every epoch.
+
+    Raises:
+        ValueError: If the estimator does not support partial_fit, or classification is requested without classes.
+
+    Description:
+        Features are standardised with a StandardScaler that is itself fitted incrementally. 
+        Missing feature values are replaced by the running mean, and rows with a missing target are skipped. 
+        The rows held out from every chunk are the same in every epoch, so the model is never trained on them. 
+        The checkpoint is removed once training has completed.
+    '''
+
+    print('+------------------------------------------------------------------------------------------------------------+')
+    print('                                         -Train Incremental Model-')
+
+    estimator = build_model(problem_type, method, **params)
+    if not hasattr(estimator, 'partial_fit'):
+        raise ValueError(f"Method {method} does not support incremental training")
+    if problem_type == 'classification' and classes is None:
+        raise ValueError("Incremental classification requires all class labels (classes)")
+    epochs = epochs or INCREMENTAL_CONFIG['epochs']
+    if epochs > 1 and not callable(chunks):
+        raise ValueError("Training for several epochs requires a callable returning a new chunk iterator")
+    if checkpoint is None:
+        checkpoint = os.path.join(INCREMENTAL_CONFIG['checkpoint_dir'], f'{problem_type}_{method}.joblib')
+
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.pipeline import Pipeline
+    from joblib import load
+
+    # The first chunk identifies the data, so that a checkpoint of another dataset is not resumed
+    stream = iter(chunks() if callable(chunks) else chunks)
+    first = next(stream, None)
+    stream = itertools.chain([first], stream) if first is not None else iter(())
+    run = {'problem_type': problem_type, 'method': method, 'params': params, 
+           'classes': None if classes is None else np.asarray(classes).tolist(), 
+           'validation_fraction': INCREMENTAL_CONFIG['validation_fraction'] if validation is None else 0, 
+           'data': data_fingerprint(first) if first is not None else None}
+
+    # Restore the state of an interrupted run
+    state = {'run': run, 'scaler': StandardScaler(), 'estimator': estimator, 'epoch': 0, 'chunk': 0, 'rows': 0, 'history': []}
+    if checkpoint and resume and os.path.exists(checkpoint):
+        saved = load(checkpoint)
+        if saved.get('run') == run:
+            state = saved
+            print(f'Resuming from the checkpoint after epoch {state["epoch"] + 1}, chunk {state["chunk"]}.')
+        else:
+            print(f'Ignoring the checkpoint {checkpoint}, which belongs to a different run.')
+    scaler, estimator = state['scaler'], state['estimator']
+    fit_params = {'classes': classes} if problem_type == 'classification' else {}
+    hold_out = INCREMENTAL_CONFIG['validation_fraction'] if validation is None else 0
+    start = time.perf_counter()
+
+    def record(epoch, sums):
+        state['history'].append({'Epoch': epoch + 1, 'Chunks': state['chunk'], 'Rows Trained': state['rows'], 
+                                 **_validation_metrics(problem_type, sums), 'Time (s)': time.perf_counter() - start})
+        print(', '.join(f'{key}: {value:.4g}' if isinstance(value, float) else f'{key}: {value}' 
+                        for key, value in state['history'][-1].items()))
+
+    first_epoch = state['epoch']
+    for epoch in range(first_epoch, epochs):
+        sums = {}
+        for index, chunk in enumerate(stream if epoch == first_epoch else chunks()):
+            if index < state['chunk']:
+                continue
+            X, y = _chunk_arrays(chunk)
+            state['features'], state['target'] = list(X.columns), chunk.columns[-1]
+            # Seeded by the chunk only, so that every epoch holds out the same rows
+            held_out = np.random.default_rng([MODEL_CONFIG['random_state'], index]).random(len(y)) < hold_out
+            if (~held_out).any():
+                X_train = _scale(scaler, X[~held_out], fit=True)
+                estimator.partial_fit(X_train, y[~held_out], **fit_params)
+                state['rows'] += int((~held_out).sum())
+            if held_out.any() and state['rows']:
+                _validation_update(problem_type, estimator, _scale(scaler, X[held_out]), y[held_out], sums)
+            state['chunk'] = index + 1
+
+            if state['chunk'] % INCREMENTAL_CONFIG['checkpoint_every'] == 0:
+                if sums:
+                    record(epoch, sums)
+                    sums = {}
+                if checkpoint:
+                    _save_checkpoint(checkpoint, state)
+
+        # Evaluate the separate validation stream at the end of every epoch
+        if validation is not None:
+            for chunk in validation() if callable(validation) else validation:
+                X, y = _chunk_arrays(chunk)
+                _validation_update(problem_type, estimator, _scale(scaler, X), y, sums)
+        if sums or not state['history']:
+            record(epoch, sums)
+        state['epoch'], state['chunk'] = epoch + 1, 0
+        if checkpoint:
+            _save_checkpoint(checkpoint, state)
+
+    model = Pipeline([('scaler', scaler), ('model', estimator)])
+    history = pd.DataFrame(state['history'])
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    print('Problem Type:', problem_type)
+    print('Method:', method)
+    print('Model:', estimator)
+    print('Rows trained:', state['rows'])
+    print('Training completed successfully.')
+
+    if registry != None:
+        name = name or f'{problem_type}_{method}'
+        preprocessing = {'features': state['features'], 
+                         'target': state['target'], 
+                         'fill_values': dict(zip(state['features'], scaler.mean_.tolist()))}
+        version = registry.save(name, model, preprocessing=preprocessing, 
+                                metadata={'problem_type': problem_type, 'method': method, 'training_samples': state['rows']})
+        print(f'Model saved to the registry as {name} version {version}.')
+
+    # Generate PDF report
+    if pdf != None:
+        pdf.chapter_sub_title('Incremental Training')
+        pdf.chapter_body(f'Problem Type: {problem_type}')
+        pdf.chapter_body(f'Method: {method}')
+        pdf.chapter_body(f'Model: {estimator}')
+        pdf.chapter_body(f'Rows trained: {state["rows"]} over {epochs} epoch(s)')
+        pdf.add_table(history)
+
+    return model, history
+
+
+def _chunk_arrays(chunk) -> tuple:
+    """Split a chunk into features and target, skipping the rows with a missing target."""
+    chunk = chunk[chunk[chunk.columns[-1]].notna()]
+    return chunk[chunk.columns[:-1]], chunk[chunk.columns[-1]].to_numpy()
+
+
+def _scale(scaler, X, fit=False) -> np.ndarray:
+    """Standardise features (updating the scaler first if fit is True), replacing missing values by the mean."""
+    if fit:
+        scaler.partial_fit(X)
+    return np.nan_to_num(scaler.transform(X), nan=0.0)
+
+
+def _validation_update(problem_type, estimator, X, y, sums) -> None:
+    """Accumulate the validation error of a batch of held-out rows."""
+    sums['n'] = sums.get('n', 0) + len(X)
+    if problem_type in ('regression', 'classification'):
+        sums.setdefault('metrics', metric_accumulator(problem_type)).update(y, estimator.predict(X))
+    elif problem_type == 'clustering':
+        sums['inertia'] = sums.get('inertia', 0.0) - float(estimator.score(X))
+    elif problem_type == 'dimensionality_reduction':
+        residual = X - estimator.inverse_transform(estimator.transform(X))
+        sums['sse'] = sums.get('sse', 0.0) + float((residual ** 2).sum())
+
+
+def _validation_metrics(problem_type, sums) -> dict:
+    """The validation metrics of the accumulated held-out rows."""
+    n = sums.get('n', 0)
+    if n == 0:
+        return {'Validation Rows': 0}
+    if problem_type in ('regression', 'classification'):
+        return {'Validation Rows': n, **sums['metrics'].result()}
+    elif problem_type == 'clustering':
+        return {'Validation Rows': n, 'Inertia per Row': sums['inertia'] / n}
+    return {'Validation Rows': n, 'Reconstruction MSE': sums['sse'] / n}
+
+
+def _save_checkpoint(path, state) -> None:
+    """Atomically write the training state to a checkpoint file."""
+    from joblib import dump
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    dump(state, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+@instrument
+def tune_model(data, problem_type, methods=None, resource=None, budget=None, n_candidates=None, n_jobs=None, pdf=None) -> tuple:
+    '''Tune hyperparameters with successive halving under a wall-clock budget.
+
+    Args:
+        data (pd.DataFrame): The dataset containing features and target variable.
+        problem_type (str): Either 'classification' or 'regression'.
+        methods (list, optional): The methods to tune. Defaults to all methods of MODEL_CONFIG['search_space'][problem_type].
+        resource (str, optional): 'n_samples' or 'n_estimators'. Defaults to TUNING_CONFIG['resource'].
+        budget (float, optional): The wall-clock budget in seconds. Defaults to TUNING_CONFIG['budget_seconds'].
+        n_candidates (int, optional): The candidates of the first rung. Defaults to the larger of factor ** (rungs - 1) 
+            and max_resource // min_resource, so that the last rung is reached with at least one candidate.
+        n_jobs (int, optional): The number of worker processes. Defaults to MODEL_CONFIG['n_jobs'], capped while pipeline stages run at once.
+        pdf (PDF, optional): An optional PDF object for report generation.
+
+    Returns:
+        tuple: The best method, its best hyperparameters, and a DataFrame with every evaluation 
+        (rung, resource, method, hyperparameters, validation metrics and fit time).
+
+    Raises:
+        ValueError: If the problem type or resource is not supported.
+
+    Description:
+        Candidates are sampled from the search space and all evaluated in the first rung with a small resource 
+        (a prefix of the shuffled training rows, or few trees). Every following rung keeps the best 1 / factor 
+        of the candidates and multiplies their resource by factor, up to all training rows (or max_estimators). 
+        Candidates are scored on a held-out validation split. The candidates of a rung are evaluated in parallel 
+        on shared memory-mapped data, and a rung is only started if the previous rung's duration still fits in the budget.
+    '''
+
+    print('+------------------------------------------------------------------------------------------------------------+')
+    print('                                         -Tune Model-')
+
+    if problem_type not in GRID_METRICS:
+        raise ValueError(f"Tuning does not support the problem type {problem_type}")
+    resource = resource or TUNING_CONFIG['resource']
+    if resource not in ('n_samples', 'n_estimators'):
+        raise ValueError(f"Unsupported tuning resource {resource}")
+    budget = budget or TUNING_CONFIG['budget_seconds']
+    n_jobs = _n_jobs(n_jobs)
+    factor = TUNING_CONFIG['factor']
+    space = MODEL_CONFIG['search_space'][problem_type]
+    methods = methods or list(space)
+    start = time.perf_counter()
+    from sklearn.model_selection import ParameterGrid, ParameterSampler, train_test_split
+    from joblib import Parallel, delayed
+
+    # Split the data into features and target variable, holding out a validation split
+    X = _feature_matrix(data[data.columns[:-1]])
+    y = data[data.columns[-1]].to_numpy()
+    X_train, X_val, y_train, y_val = train_test_split(X, y, 
+                                                      test_size=MODEL_CONFIG['test_size'],
+                                                      random_state=MODEL_CONFIG['random_state'])
+
+    # The resource of every rung
+    if resource == 'n_samples':
+        min_resource, max_resource = min(TUNING_CONFIG['min_samples'], len(X_train)), len(X_train)
+    else:
+        min_resource, max_resource = TUNING_CONFIG['min_estimators'], TUNING_CONFIG['max_estimators']
+    n_rungs = int(np.floor(np.log(max_resource / min_resource) / np.log(factor))) + 1
+    resources = [min(max_resource, min_resource * factor ** rung) for rung in range(n_rungs - 1)] + [max_resource]
+
+    # Sample the candidates from the search space, spread evenly over the methods
+    n_candidates = n_candidates or max(factor ** (n_rungs - 1), max_resource // min_resource)
+    candidates = []
+    remaining = n_candidates
+    # Methods with small search spaces come first, so that their unused share goes to the larger ones
+    methods = sorted(methods, key=lambda method: len(ParameterGrid(space.get(method, {}))))
+    for i, method in enumerate(methods):
+        build_model(problem_type, method)
+        grid = space.get(method, {})
+        n_method = min(-(-remaining // (len(methods) - i)), len(ParameterGrid(grid)))
+        remaining -= n_method
+        if n_method > 0:
+            candidates.extend((method, params) for params in 
+                              ParameterSampler(grid, n_iter=n_method, random_state=MODEL_CONFIG['random_state']))
+    metric = GRID_METRICS[problem_type]
+    ascending = metric in LOWER_IS_BETTER
+
+    evaluations = []
+    rung_time = 0.0
+    with tempfile.TemporaryDirectory() as folder:
+        arrays = [_memmap(folder, name, array) for name, array in 
+                  (('X_train', X_train), ('y_train', y_train), ('X_val', X_val), ('y_val', y_val))]
+        with Parallel(n_jobs=n_jobs) as parallel:
+            for rung, amount in enumerate(resources):
+                elapsed = time.perf_counter() - start
+                if rung > 0 and elapsed + rung_time > budget:
+                    print(f'Stopped before rung {rung + 1}: the budget of {budget} seconds would be exceeded.')
+                    break
+                rung_start = time.perf_counter()
+                results = parallel(delayed(_fit_resource)(problem_type, method, params, resource, amount, *arrays) 
+                                   for method, params in candidates)
+                rung_time = time.perf_counter() - rung_start
+                rung_scores = [{'Rung': rung + 1, 'Resource': amount, 'Method': method, 
+                                'Params': ', '.join(f'{key}={value}' for key, value in params.items()) or 'default', 
+                                **scores} 
+                               for (method, params), scores in zip(candidates, results)]
+                evaluations.extend(rung_scores)
+                print(f'Rung {rung + 1}: {len(candidates)} candidates with {resource}={amount} in {rung_time:.2f} seconds.')
+
+                # Keep the best 1 / factor of the candidates
+                order = sorted(range(len(candidates)), key=lambda i: rung_scores[i][metric], reverse=not ascending)
+                best_method, best_params = candidates[order[0]]
+                best_score = rung_scores[order[0]][metric]
+                candidates = [candidates[i] for i in order[:max(1, len(candidates) // factor)]]
+                if len(order) == 1:
+                    break
+
+    history = pd.DataFrame(evaluations)
+    elapsed = time.perf_counter() - start
+    best = ', '.join(f'{key}={value}' for key, value in best_params.items()) or 'default'
+
+    print('Problem Type:', problem_type)
+    print(f'Best configuration: {best_method} ({best})')
+    print(f'Best validation {metric}: {best_score:.4f}')
+    print(f'Evaluations: {len(history)} in {history["Rung"].max()} rungs')
+    print(f'Time spent: {elapsed:.2f} seconds (budget: {budget} seconds)')
+
+    # Generate PDF report
+    if pdf != None:
+        pdf.chapter_sub_title('Hyperparameter Tuning')
+        pdf.chapter_body(f'Successive halving over {resource} with factor {factor}: '
+                         f'{len(history)} evaluations in {history["Rung"].max()} rungs.')
+        pdf.chapter_body(f'Best configuration: {best_method} ({best})')
+        pdf.chapter_body(f'Best validation {metric}: {best_score:.4f}')
+        pdf.chapter_body(f'Time spent: {elapsed:.2f} seconds (budget: {budget} seconds)')
+        last_rung = history[history['Rung'] == history['Rung'].max()]
+        pdf.add_table(last_rung.sort_values(metric, ascending=ascending).head(10))
+
+    return best_method, best_params, history
+
+
+def _fit_resource(problem_type, method, params, resource, amount, X_train, y_train, X_val, y_val) -> dict:
+    """Fit one tuning candidate with a resource budget and score it on the validation split, in a worker process."""
+    model = build_model(problem_type, method, **params)
+    if resource == 'n_samples':
+        X_train, y_train = X_train[:amount], y_train[:amount]
+    elif 'n_estimators' in model.get_params():
+        model.set_params(n_estimators=amount)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    return {**compute_metrics(y_val, model.predict(X_val), problem_type), 'Fit Time (s)': fit_time}
+
+
+@instrument
+def cluster_sweep(data, k_range=None, method=None, features=None, n_jobs=None, pdf=None) -> tuple:
+    '''Cluster the data for a range of cluster counts in parallel and select the best count.
+
+    Args:
+        data (pd.DataFrame): The dataset to cluster.
+        k_range (list, optional): The numbers of clusters to try. Defaults to CLUSTERING_CONFIG['k_range'].
+        method (str, optional): 'minibatch_kmeans' or 'kmeans'. Defaults to CLUSTERING_CONFIG['method'].
+        features (list, optional): The columns to cluster on. Defaults to all columns but the last (the target), 
+            as in train_model.
+        n_jobs (int, optional): The number of worker processes. Defaults to MODEL_CONFIG['n_jobs'], capped while pipeline stages run at once.
+        pdf (PDF, optional): An optional PDF object for report generation.
+
+    Returns:
+        tuple: The selected number of clusters, the fitted model (a Pipeline of the scaler and the clustering, 
+        whose predict assigns new rows to clusters), and a DataFrame with the inertia, Silhouette, 
+        Calinski-Harabasz and Davies-Bouldin index and fit time of every number of clusters.
+
+    Description:
+        The features are standardized once (CLUSTERING_CONFIG['scale']) and memory-mapped, and every number 
+        of clusters is fitted in a worker process. Mini-batch k-means keeps the cost of a fit linear in the rows. 
+        The metrics are bounded as well: the silhouette is computed on a sample of rows (see 
+        evaluation.clustering_metrics), and the number of clusters is selected by CLUSTERING_CONFIG['selection_metric'].
+    '''
+
+    print('+------------------------------------------------------------------------------------------------------------+')
+    print('                                         -Cluster Sweep-')
+
+    k_range = k_range or CLUSTERING_CONFIG['k_range']
+    method = method or CLUSTERING_CONFIG['method']
+    features = features or list(data.columns[:-1])
+    n_jobs = _n_jobs(n_jobs)
+    build_model('clustering', method)
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.pipeline import Pipeline
+    from joblib import Parallel, delayed
+
+    # Standardize the features once for all workers
+    X = _feature_matrix(data[features])
+    scaler = StandardScaler() if CLUSTERING_CONFIG['scale'] else None
+    if scaler != None:
+        X = scaler.fit_transform(X)
+
+    with tempfile.TemporaryDirectory() as folder:
+        X_shared = _memmap(folder, 'X', X)
+        results = Parallel(n_jobs=n_jobs)(delayed(_fit_clusters)(method, k, X_shared) for k in k_range)
+
+    models = [model for model, _ in results]
+    sweep = pd.DataFrame([scores for _, scores in results])
+    metric = CLUSTERING_CONFIG['selection_metric']
+    ranked = sweep[metric].dropna()
+    best = (ranked.idxmin() if metric in LOWER_IS_BETTER else ranked.idxmax()) if len(ranked) else 0
+    best_k = int(sweep.loc[best, 'Clusters'])
+    model = Pipeline([('scaler', scaler), ('clustering', models[best])]) if scaler != None else models[best]
+
+    print('Samples:', X.shape[0])
+    print('Features:', features)
+    print('Method:', method)
+    print(sweep.to_string(index=False))
+    print(f'Selected {best_k} clusters by {metric}.')
+
+    # Generate PDF report
+    if pdf != None:
+        pdf.chapter_sub_title('Clustering')
+        pdf.chapter_body(f'{method} fitted for {len(k_range)} numbers of clusters on {X.shape[0]} samples '
+                         f'and {len(features)} features.')
+        pdf.add_table(sweep)
+        pdf.chapter_body(f'Selected {best_k} clusters by {metric}.')
+
+    return best_k, model, sweep
+
+
+def _fit_clusters(method, k, X) -> tuple:
+    """Fit and score one number of clusters of the sweep, in a worker process."""
+    model = build_model('clustering', method, n_clusters=k)
+
+    start = time.perf_counter()
+    labels = model.fit_predict(X)
+    fit_time = time.perf_counter() - start
 
-    return y_test, y_pred
\ No newline at end of file
+    return model, {'Clusters': k, 
+                   'Inertia': model.inertia_, 
+                   **clustering_metrics(X, labels), 
+                   'Fit Time (s)': fit_time}
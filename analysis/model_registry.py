@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/10 10:05
+@Desc: This module provides a local, versioned registry of trained models.
+       Every saved model gets a new version directory holding the fitted estimator and a meta.json file
+       with its preprocessing parameters (feature columns, target, fill values) and training metadata,
+       so that new data can be scored without retraining.
+'''
+
+from .config import MODEL_REGISTRY_CONFIG
+import shutil
+import time
+import json
+import os
+
+
+class ModelRegistry:
+    """A directory of named models, each with numbered versions (<root>/<name>/v<version>/).
+
+    A version is written to a temporary directory and renamed into place once complete,
+    so readers never see a partially saved model.
+    """
+
+    def __init__(self, root=None):
+        """Initializes the registry.
+
+        Args:
+            root (str, optional): The root directory of the registry. Defaults to MODEL_REGISTRY_CONFIG['root'].
+        """
+        self.root = root or MODEL_REGISTRY_CONFIG['root']
+
+    def versions(self, name) -> list:
+        """Returns the saved versions of a model, in ascending order."""
+        model_dir = os.path.join(self.root, name)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(int(entry[1:]) for entry in os.listdir(model_dir)
+                      if entry.startswith('v') and entry[1:].isdigit())
+
+    def latest_version(self, name):
+        """Returns the latest version of a model, or None if it has never been saved."""
+        versions = self.versions(name)
+        return versions[-1] if versions else None
+
+    def save(self, name, model, preprocessing=None, metadata=None) -> int:
+        """Saves a fitted model as a new version.
+
+        Args:
+            name (str): The name of the model.
+            model: The fitted estimator.
+            preprocessing (dict, optional): The fitted preprocessing parameters, e.g. 'features', 'target' and 'fill_values'.
+            metadata (dict, optional): Additional JSON-serializable information, e.g. the problem type and method.
+
+        Returns:
+            int: The version number of the saved model.
+        """
+        import sklearn
+        import joblib
+        model_dir = os.path.join(self.root, name)
+        os.makedirs(model_dir, exist_ok=True)
+        temp_dir = os.path.join(model_dir, f'.tmp-{os.getpid()}-{time.time_ns()}')
+        os.makedirs(temp_dir)
+        try:
+            joblib.dump(model, os.path.join(temp_dir, 'model.joblib'))
+            while True:
+                version = (self.latest_version(name) or 0) + 1
+                meta = {
+                    'name': name,
+                    'version': version,
+                    'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'estimator': repr(model),
+                    'sklearn_version': sklearn.__version__,
+                    'preprocessing': preprocessing or {},
+                    **(metadata or {}),
+                }
+                with open(os.path.join(temp_dir, 'meta.json'), 'w') as file:
+                    json.dump(meta, file, indent=2, default=str)
+                try:
+                    # Renaming onto an existing version fails, in which case another process saved it first
+                    os.rename(temp_dir, os.path.join(model_dir, f'v{version}'))
+                    return version
+                except OSError:
+                    if not os.path.isdir(os.path.join(model_dir, f'v{version}')):
+                        raise
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def metadata(self, name, version=None) -> dict:
+        """Reads the metadata of a saved model without loading the estimator.
+
+        Args:
+            name (str): The name of the model.
+            version (int, optional): The version to read. Defaults to the latest version.
+
+        Returns:
+            dict: The metadata, including the 'version' and the 'preprocessing' parameters.
+
+        Raises:
+            FileNotFoundError: If the model or version does not exist.
+        """
+        version = version or self.latest_version(name)
+        meta_path = os.path.join(self.root, name, f'v{version}', 'meta.json')
+        if version is None or not os.path.isfile(meta_path):
+            raise FileNotFoundError(f'Model {name} (version {version}) is not in the registry at {self.root}.')
+        with open(meta_path) as file:
+            return json.load(file)
+
+    def load(self, name, version=None) -> tuple:
+        """Loads a saved model.
+
+        Args:
+            name (str): The name of the model.
+            version (int, optional): The version to load. Defaults to the latest version.
+
+        Returns:
+            tuple: The fitted estimator and its metadata (including the 'preprocessing' parameters).
+
+        Raises:
+            FileNotFoundError: If the model or version does not exist.
+        """
+        import joblib
+        meta = self.metadata(name, version)
+        model = joblib.load(os.path.join(self.root, name, f'v{meta["version"]}', 'model.joblib'))
+        return model, meta
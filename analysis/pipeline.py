@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/12 09:30
+@Desc: This module runs the analysis as a pipeline of stages with named inputs and outputs.
+       The stages form a directed acyclic graph, and every stage is started on a thread pool as soon as
+       its inputs are available, so independent branches (e.g. exploration and model training) run concurrently.
+       Every stage writes its report section to its own recorder, and the sections are added to the PDF
+       in the order the stages were defined, so the report does not depend on which stage finished first.
+'''
+
+from .config import PIPELINE_CONFIG
+from .report_generation import ReportRecorder
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+import pandas as pd
+import importlib
+import threading
+import time
+import sys
+import io
+
+
+class Stage:
+    """A stage of a pipeline: a function with named inputs and outputs.
+
+    The function is called as func(*inputs, pdf=recorder, **params) (or with the inputs as keyword arguments),
+    and its return value is stored under the output names.
+    """
+
+    def __init__(self, name, func, /, inputs=(), outputs=(), chapter=None, **params):
+        """Initializes a stage.
+
+        Args:
+            name (str): The unique name of the stage.
+            func (callable): The function of the stage, which accepts a pdf keyword argument.
+            inputs (tuple or dict): The names of the values passed positionally, or a dict mapping
+                keyword arguments to the names of the values passed as them.
+            outputs (tuple): The names the return value is stored under. With several names, the return value
+                is unpacked, and None discards a value. Defaults to no outputs.
+            chapter (str, optional): The chapter of the report the section of the stage belongs to.
+            **params: Further keyword arguments of the function (which may include a 'name').
+        """
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.outputs = tuple(outputs)
+        self.chapter = chapter
+        self.params = params
+
+    def input_names(self) -> list:
+        """Returns the names of the values the stage depends on."""
+        return list(self.inputs.values()) if isinstance(self.inputs, dict) else list(self.inputs)
+
+    def output_names(self) -> list:
+        """Returns the names of the values the stage produces."""
+        return [output for output in self.outputs if output is not None]
+
+
+class Pipeline:
+    """A directed acyclic graph of stages, run concurrently with report sections assembled in a fixed order."""
+
+    def __init__(self, stages=None):
+        """Initializes a pipeline.
+
+        Args:
+            stages (list, optional): The stages, in report order.
+        """
+        self.stages = []
+        self.recorders = {}
+        self.timings = pd.DataFrame()
+        for stage in stages or []:
+            self.add_stage(stage)
+
+    def add_stage(self, stage):
+        """Adds a stage after the stages already defined.
+
+        Raises:
+            ValueError: If a stage of the same name exists, or another stage produces one of its outputs.
+        """
+        if any(existing.name == stage.name for existing in self.stages):
+            raise ValueError(f"Duplicate stage {stage.name}")
+        produced = {output for existing in self.stages for output in existing.output_names()}
+        if produced & set(stage.output_names()):
+            raise ValueError(f"Stage {stage.name} produces values that are already produced: {produced & set(stage.output_names())}")
+        self.stages.append(stage)
+        return self
+
+    def add(self, name, func, /, inputs=(), outputs=(), chapter=None, **params):
+        """Defines a stage and adds it, see Stage for the arguments.
+
+        Returns:
+            Pipeline: The pipeline itself, so that definitions can be chained.
+        """
+        return self.add_stage(Stage(name, func, inputs, outputs, chapter, **params))
+
+    def validate(self, initial=()):
+        """Checks that every input is produced and that the stages have no cycle.
+
+        Args:
+            initial (iterable): The names of the values given to run.
+
+        Raises:
+            ValueError: If an input is not produced by any stage, or the stages depend on each other in a cycle.
+        """
+        available = set(initial)
+        producers = {output: stage for stage in self.stages for output in stage.output_names()}
+        for stage in self.stages:
+            missing = [name for name in stage.input_names() if name not in producers and name not in available]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on values that are not produced: {missing}")
+
+        # Resolve the stages in dependency order; those left over form a cycle
+        unresolved = list(self.stages)
+        while unresolved:
+            ready = [stage for stage in unresolved if all(name in available for name in stage.input_names())]
+            if not ready:
+                raise ValueError(f"The stages {[stage.name for stage in unresolved]} depend on each other in a cycle")
+            for stage in ready:
+                available.update(stage.output_names())
+                unresolved.remove(stage)
+
+    def run(self, initial=None, max_workers=None, preload=()) -> dict:
+        """Runs the stages, each as soon as its inputs are available.
+
+        The stages run on a thread pool, as they share the FigureRenderer, the StageCache and the values in memory.
+        When several stages run at once, the joblib workers within each stage are limited to
+        PIPELINE_CONFIG['stage_jobs'] (by default, the cores divided among the stages), and the output of every
+        stage is buffered and printed in one piece when the stage finishes, so that the output of concurrent
+        stages does not interleave.
+
+        Args:
+            initial (dict, optional): The values given to the pipeline, by name (e.g. the loaded data).
+            max_workers (int, optional): The number of stages run at once. Defaults to PIPELINE_CONFIG['max_workers'].
+            preload (iterable, optional): The names of modules the stages import on first use (e.g. scikit-learn), 
+                which are imported before the stages start. Two threads importing the same package at once may 
+                see it partially initialized, and fail with an ImportError.
+
+        Returns:
+            dict: All values, the initial ones and those produced by the stages.
+
+        Raises:
+            ValueError: If the stages are invalid (see validate).
+            RuntimeError: If a stage fails. The remaining stages are cancelled.
+        """
+        values = dict(initial or {})
+        self.validate(values)
+        max_workers = max_workers or PIPELINE_CONFIG['max_workers']
+        for module in preload:
+            importlib.import_module(module)
+        stage_jobs = None
+        if max_workers > 1:
+            from joblib import cpu_count
+            stage_jobs = PIPELINE_CONFIG['stage_jobs'] or max(cpu_count() // max_workers, 1)
+
+        print('+------------------------------------------------------------------------------------------------------------+')
+        print('                                         -Run Pipeline-')
+        print(f'{len(self.stages)} stages on up to {max_workers} threads'
+              + (f', each limited to {stage_jobs} joblib worker(s).' if stage_jobs else '.'))
+
+        self.recorders = {}
+        timings = []
+        waiting = list(self.stages)
+        running = {}
+        start, start_time = time.perf_counter(), time.time()
+        # The output of concurrent stages is buffered per stage thread
+        output = _StageOutput(sys.stdout) if stage_jobs else None
+        if output is not None:
+            sys.stdout = output
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                while waiting or running:
+                    # Start every stage whose inputs are available, in definition order
+                    for stage in [stage for stage in waiting if all(name in values for name in stage.input_names())]:
+                        waiting.remove(stage)
+                        if isinstance(stage.inputs, dict):
+                            args, kwargs = (), {key: values[name] for key, name in stage.inputs.items()}
+                        else:
+                            args, kwargs = tuple(values[name] for name in stage.inputs), {}
+                        running[pool.submit(_run_stage, stage.func, args, {**kwargs, **stage.params}, stage_jobs, output)] = stage
+                    if not running:
+                        raise RuntimeError(f"The stages {[stage.name for stage in waiting]} are missing inputs")
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage = running.pop(future)
+                        try:
+                            result, recorder, stage_start, duration, printed = future.result()
+                        except Exception as error:
+                            for other in running:
+                                other.cancel()
+                            raise RuntimeError(f"Stage {stage.name} failed") from error
+                        self.recorders[stage.name] = recorder
+                        print(printed, end='')
+                        timings.append({'Stage': stage.name, 'Start (s)': stage_start - start_time, 'Duration (s)': duration})
+                        if len(stage.outputs) == 1:
+                            result = (result,)
+                        elif stage.outputs and len(result) != len(stage.outputs):
+                            raise RuntimeError(f"Stage {stage.name} returned {len(result)} values for the outputs {stage.outputs}")
+                        for name, value in zip(stage.outputs, result if stage.outputs else ()):
+                            if name is not None:
+                                values[name] = value
+        finally:
+            if output is not None:
+                sys.stdout = output.stream
+
+        elapsed = time.perf_counter() - start
+        self.timings = pd.DataFrame(timings).sort_values('Start (s)', kind='stable').reset_index(drop=True)
+        print('+------------------------------------------------------------------------------------------------------------+')
+        print('                                         -Pipeline Timings-')
+        print(self.timings.to_string(index=False))
+        print(f'Stage time: {self.timings["Duration (s)"].sum():.2f} seconds, wall-clock time: {elapsed:.2f} seconds.')
+        return values
+
+    def report(self, pdf):
+        """Adds the report sections of the stages to a PDF in definition order.
+
+        A new page with the chapter title is started whenever the chapter changes.
+
+        Args:
+            pdf (PDF): The PDF object (or a ReportRecorder) to add the sections to.
+        """
+        chapter = None
+        for stage in self.stages:
+            if stage.chapter is not None and stage.chapter != chapter:
+                chapter = stage.chapter
+                pdf.add_page()
+                pdf.chapter_title(chapter)
+            if stage.name in self.recorders:
+                self.recorders[stage.name].replay(pdf)
+
+
+class _StageOutput:
+    """Stands in for sys.stdout while stages run concurrently. Every stage thread writes to its own buffer,
+    and all other threads to the original stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    @contextmanager
+    def capture(self):
+        """Buffers the output of the current thread."""
+        self.local.buffer = buffer = io.StringIO()
+        try:
+            yield buffer
+        except BaseException:
+            # The output of a failed stage is printed right away, as it leads up to the error
+            self.stream.write(buffer.getvalue())
+            raise
+        finally:
+            self.local.buffer = None
+
+
+def _run_stage(func, args, params, stage_jobs=None, output=None) -> tuple:
+    """Runs a stage with its own report recorder in a pool thread, with its joblib workers limited to stage_jobs
+    and its output buffered in output (if given)."""
+    recorder = ReportRecorder()
+    start, start_time = time.perf_counter(), time.time()
+    if stage_jobs is None:
+        result = func(*args, pdf=recorder, **params)
+        return result, recorder, start_time, time.perf_counter() - start, ''
+    from joblib import parallel_config
+    with output.capture() as buffer, parallel_config(n_jobs=stage_jobs):
+        result = func(*args, pdf=recorder, **params)
+    return result, recorder, start_time, time.perf_counter() - start, buffer.getvalue()
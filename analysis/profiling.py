@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/14 10:20
+@Desc: This module instruments the analysis functions.
+       Every call of an instrumented function records its wall-clock and CPU time, peak memory,
+       the rows and columns of its input and output, and the bytes written, which are logged and collected
+       into a run record. The run record is saved as JSON and can be added to the PDF report as a timing appendix.
+       One function can also be profiled with cProfile.
+'''
+
+from .config import PROFILING_CONFIG
+from functools import wraps
+import numpy as np
+import pandas as pd
+import threading
+import itertools
+import tracemalloc
+import platform
+import cProfile
+import logging
+import pstats
+import time
+import json
+import sys
+import io
+import os
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the RSS is not recorded
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class RunProfile:
+    """The records of the instrumented calls of one run, collected from all threads."""
+
+    def __init__(self):
+        """Initializes an empty run profile."""
+        self.started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.start = time.perf_counter()
+        self.records = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        """Adds the record of a call."""
+        with self.lock:
+            self.records.append(record)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the records as a DataFrame, one row per call in the order the calls finished."""
+        with self.lock:
+            return pd.DataFrame(self.records)
+
+    def save(self, path=None) -> str:
+        """Saves the run record as JSON.
+
+        Args:
+            path (str, optional): The file path. Defaults to run_<start time>.json in PROFILING_CONFIG['run_record_dir'].
+
+        Returns:
+            str: The path of the saved run record.
+        """
+        if path is None:
+            path = os.path.join(PROFILING_CONFIG['run_record_dir'], f'run_{self.started_at.replace(" ", "_").replace(":", "")}.json')
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock:
+            record = {'started_at': self.started_at,
+                      'wall_time': time.perf_counter() - self.start,
+                      'python': sys.version.split()[0],
+                      'platform': platform.platform(),
+                      'peak_rss_mb': _peak_rss_mb(),
+                      'calls': self.records}
+        with open(path, 'w') as file:
+            json.dump(record, file, indent=2, default=str)
+        logger.info('Run record saved to %s', path)
+        return path
+
+    def report(self, pdf) -> None:
+        """Adds a timing appendix to the PDF report, with one row per instrumented call.
+
+        Args:
+            pdf (PDF): The PDF object to add the appendix to.
+        """
+        records = self.to_frame()
+        if records.empty:
+            return
+        columns = ['Function', 'Wall Time (s)', 'CPU Time (s)', 'Peak Memory (MB)', 'Rows In', 'Rows Out', 'Bytes Written']
+        pdf.add_page()
+        pdf.chapter_title('Appendix: Stage Timings')
+        pdf.chapter_body(f'{len(records)} instrumented calls, {records["Wall Time (s)"].sum():.2f} seconds in total '
+                         f'({time.perf_counter() - self.start:.2f} seconds of wall-clock time since the start of the run).')
+        table = records[columns].copy()
+        # Counts are shown as integers, and missing values (e.g. the rows of non-tabular results) as '-'
+        for column in ('Rows In', 'Rows Out', 'Bytes Written'):
+            table[column] = table[column].map(lambda value: '-' if pd.isna(value) else f'{int(value):,}')
+        pdf.add_table(table.fillna('-'))
+
+
+# The profile of the current run, which the instrumented functions add to
+_current = RunProfile()
+
+
+def current_run() -> RunProfile:
+    """Returns the profile of the current run."""
+    return _current
+
+
+def start_run() -> RunProfile:
+    """Starts a new run profile, discarding the records of the previous run.
+
+    Memory is traced with tracemalloc if PROFILING_CONFIG['trace_memory'] is set.
+
+    Returns:
+        RunProfile: The new run profile.
+    """
+    global _current
+    _current = RunProfile()
+    if PROFILING_CONFIG['trace_memory'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _current
+
+
+def instrument(func):
+    """Decorates an analysis function to record every call in the current run profile.
+
+    The record holds the wall-clock time, the CPU time of the calling thread, the peak memory above the memory
+    in use when the call started (traced Python allocations with PROFILING_CONFIG['trace_memory'], otherwise
+    the RSS of the process, see _MemoryWatch), the rows and columns of the first argument and of the result,
+    and the bytes written by the process (from /proc/self/io where available). With concurrent stages,
+    the peak memory and the bytes written include those of the stages running at the same time.
+    The function named by PROFILING_CONFIG['cprofile_function'] is also run under cProfile.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROFILING_CONFIG['enabled']:
+            return func(*args, **kwargs)
+        written = _bytes_written()
+        profiler = cProfile.Profile() if PROFILING_CONFIG['cprofile_function'] == func.__name__ else None
+        watch = _memory_watch.begin()
+        start_time, start_cpu = time.perf_counter(), time.thread_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            peak_memory, memory_source = _memory_watch.end(watch)
+        wall_time, cpu_time = time.perf_counter() - start_time, time.thread_time() - start_cpu
+
+        rows_in, columns_in = _shape(args[0] if args else None)
+        rows_out, columns_out = _shape(result[0] if isinstance(result, tuple) and result else result)
+        record = {'Function': f'{func.__module__.rsplit(".", 1)[-1]}.{func.__name__}',
+                  'Wall Time (s)': wall_time,
+                  'CPU Time (s)': cpu_time,
+                  'Peak Memory (MB)': None if peak_memory is None else peak_memory / 2**20,
+                  'Memory Source': memory_source,
+                  'Rows In': rows_in,
+                  'Columns In': columns_in,
+                  'Rows Out': rows_out,
+                  'Columns Out': columns_out,
+                  'Bytes Written': _bytes_written() - written if written is not None else None}
+        current_run().add(record)
+        logger.info('%s: %.3f s wall, %.3f s CPU, %.1f MB peak (%s), rows %s -> %s, %s bytes written',
+                    record['Function'], wall_time, cpu_time, record['Peak Memory (MB)'] or 0, record['Memory Source'],
+                    rows_in, rows_out, record['Bytes Written'])
+        if profiler is not None:
+            _save_profile(profiler, func.__name__)
+        return result
+    return wrapper
+
+
+class _MemoryWatch:
+    """Measures the peak memory of the instrumented calls in progress, which may be nested or run in several threads.
+
+    The peak traced by tracemalloc is global, so resetting it for one call would lose the peak of every call
+    around it or running beside it. Instead, whenever a call starts or ends, the peak since the previous start
+    or end is added to every call in progress (all of which were running throughout that interval) before the
+    peak is reset. Without tracemalloc, the current RSS is sampled every PROFILING_CONFIG['rss_sample_interval']
+    seconds while calls are in progress, since the peak RSS of the process (ru_maxrss) never decreases and would
+    only show the largest call so far. Where the current RSS cannot be read, the growth of ru_maxrss is used,
+    which is 0 for calls that do not raise the peak of the process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.tokens = itertools.count()
+        self.stop = None
+
+    def _sample(self):
+        """Returns the memory in use and folds the peak since the last sample into the calls in progress."""
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        else:
+            current = peak = _current_rss()
+        if peak is not None:
+            for call in self.calls.values():
+                call['peak'] = max(call['peak'], peak)
+        return current
+
+    def _run_sampler(self, stop):
+        while not stop.wait(PROFILING_CONFIG['rss_sample_interval']):
+            with self.lock:
+                self._sample()
+
+    def begin(self) -> int:
+        """Starts measuring a call and returns its token."""
+        with self.lock:
+            current = self._sample()
+            token = next(self.tokens)
+            self.calls[token] = {'start': current, 'peak': current or 0,
+                                 'source': 'tracemalloc' if tracemalloc.is_tracing() else _rss_source()}
+            if self.stop is None and self.calls[token]['source'] == 'rss':
+                self.stop = threading.Event()
+                threading.Thread(target=self._run_sampler, args=(self.stop,), daemon=True).start()
+        return token
+
+    def end(self, token) -> tuple:
+        """Stops measuring a call.
+
+        Returns:
+            tuple: The peak memory in bytes above the memory in use when the call started (None if it is not
+            available), and its source: 'tracemalloc', 'rss' or 'maxrss'.
+        """
+        with self.lock:
+            self._sample()
+            call = self.calls.pop(token)
+            if not self.calls and self.stop is not None:
+                self.stop.set()
+                self.stop = None
+        if call['start'] is None:
+            return None, call['source']
+        return max(call['peak'] - call['start'], 0), call['source']
+
+
+_memory_watch = _MemoryWatch()
+
+
+def _shape(value) -> tuple:
+    """Returns the rows and columns of a DataFrame, Series or array, or (None, None)."""
+    if isinstance(value, (pd.DataFrame, np.ndarray)) and value.ndim == 2:
+        return value.shape
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return len(value), 1
+    return None, None
+
+
+def _bytes_written():
+    """Returns the bytes written by the process so far, or None if /proc/self/io is not available."""
+    try:
+        with open('/proc/self/io') as file:
+            counters = dict(line.split(': ') for line in file.read().splitlines())
+    except OSError:
+        return None
+    # wchar counts the bytes passed to write calls, whether or not they have reached the disk yet
+    return int(counters['wchar'])
+
+
+def _current_rss():
+    """Returns the current resident set size of the process in bytes from /proc/self/statm,
+    else the peak resident set size, or None if neither is available."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        peak = _peak_rss_mb()
+        return None if peak is None else int(peak * 2**20)
+
+
+def _rss_source() -> str:
+    """Returns 'rss' if the current RSS can be read, otherwise 'maxrss'."""
+    return 'rss' if os.path.exists('/proc/self/statm') else 'maxrss'
+
+
+def _peak_rss_mb():
+    """Returns the peak resident set size of the process in MB, or None if it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+# The number of calls profiled so far per function, which numbers the cProfile files
+_profiled_calls = {}
+_profiled_calls_lock = threading.Lock()
+
+
+def _save_profile(profiler, name):
+    """Saves the cProfile statistics of a call to <name>_<call number>.prof, so that repeated calls of the
+    function keep their own statistics, and logs the functions with the highest cumulative time."""
+    with _profiled_calls_lock:
+        _profiled_calls[name] = index = _profiled_calls.get(name, 0) + 1
+    os.makedirs(PROFILING_CONFIG['cprofile_dir'], exist_ok=True)
+    path = os.path.join(PROFILING_CONFIG['cprofile_dir'], f'{name}_{index}.prof')
+    profiler.dump_stats(path)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILING_CONFIG['cprofile_top'])
+    logger.info('cProfile statistics of %s saved to %s:\n%s', name, path, stream.getvalue())
+    print(f'cProfile statistics of {name} saved to {path} (open with python -m pstats {path}).')
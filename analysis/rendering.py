@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/09/25 09:40
+@Desc: This module renders figures from plot specifications with the object-oriented Agg API of matplotlib.
+       Figures can be rendered in a pool of worker processes while the pipeline keeps running.
+       No global pyplot state is used and every figure is released as soon as it has been saved.
+       Scatter and line plots of many rows are aggregated (2D histograms, line decimation) before they are sent
+       to the renderer, so that the rendering cost depends on the number of bins rather than the number of rows.
+'''
+
+from .config import VISUALIZATION_CONFIG
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import math
+import io
+
+
+class PlotSpec:
+    """A specification of a figure: the kind of plot, where to save it and the data and options to draw it.
+
+    Specifications only hold plain data (arrays, lists, strings), so they can be sent to worker processes.
+    """
+
+    def __init__(self, kind, path=None, figsize=None, dpi=None, **params):
+        """Initializes a plot specification.
+
+        Args:
+            kind (str): The kind of plot, one of the keys of PLOTTERS.
+            path (str, optional): The file path of the PNG image. If None, the image is returned as bytes.
+            figsize (tuple, optional): The size of the figure in inches. Defaults to the configured plot size.
+            dpi (int, optional): The resolution of the image. Defaults to VISUALIZATION_CONFIG['resolution'].
+            **params: The data and options passed to the plotter.
+        """
+        if kind not in PLOTTERS:
+            raise ValueError(f'Unsupported plot kind {kind}')
+        self.kind = kind
+        self.path = path
+        self.figsize = figsize or (VISUALIZATION_CONFIG['plot_width'], VISUALIZATION_CONFIG['plot_height'])
+        self.dpi = dpi or VISUALIZATION_CONFIG['resolution']
+        self.params = params
+
+
+def render(spec):
+    """Renders a plot specification.
+
+    The image is saved as an opaque RGB PNG, which the PDF report can embed without
+    splitting an alpha channel.
+
+    Args:
+        spec (PlotSpec): The plot specification.
+
+    Returns:
+        str or bytes: The path of the saved image, or the PNG image as bytes if the specification has no path.
+    """
+    # matplotlib and PIL are only imported once a figure is rendered, so that runs without figures do not load them
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from PIL import Image
+    figure = Figure(figsize=spec.figsize, dpi=spec.dpi, facecolor=VISUALIZATION_CONFIG['background_color'])
+    canvas = FigureCanvasAgg(figure)
+    try:
+        PLOTTERS[spec.kind](figure, **spec.params)
+        canvas.draw()
+        image = Image.frombuffer('RGBA', canvas.get_width_height(), canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1).convert('RGB')
+    finally:
+        # Release the figure right away instead of waiting for garbage collection
+        figure.clear()
+        del canvas, figure
+
+    if spec.path is None:
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+    image.save(spec.path, format='PNG')
+    return spec.path
+
+
+class FigureRenderer:
+    """A pool of worker processes rendering plot specifications in the background."""
+
+    def __init__(self, max_workers=None):
+        """Initializes the renderer and starts its worker pool.
+
+        Args:
+            max_workers (int, optional): The number of worker processes. Defaults to VISUALIZATION_CONFIG['render_workers'],
+                or the number of CPUs if that is None.
+        """
+        self.executor = ProcessPoolExecutor(max_workers=max_workers or VISUALIZATION_CONFIG['render_workers'])
+
+    def submit(self, spec):
+        """Schedules a plot specification for rendering.
+
+        Args:
+            spec (PlotSpec): The plot specification.
+
+        Returns:
+            concurrent.futures.Future: A future resolving to the result of render(spec).
+        """
+        return self.executor.submit(render, spec)
+
+    def close(self, wait=True):
+        """Shuts the worker pool down.
+
+        Args:
+            wait (bool): Whether to wait for the pending figures to be rendered.
+        """
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def draw(spec, renderer=None):
+    """Renders a plot specification, in the background if a renderer is given.
+
+    Args:
+        spec (PlotSpec): The plot specification.
+        renderer (FigureRenderer, optional): The renderer to submit the specification to.
+
+    Returns:
+        str, bytes or concurrent.futures.Future: The result of render(spec), or a future resolving to it.
+    """
+    if renderer is None:
+        return render(spec)
+    return renderer.submit(spec)
+
+
+def scatter_points(x, y):
+    """Prepares the data of a scatter plot, aggregating it into a 2D histogram above the aggregation threshold.
+
+    Args:
+        x (array-like): The x values.
+        y (array-like): The y values.
+
+    Returns:
+        dict: Either {'x', 'y'} with the points, or {'counts', 'xedges', 'yedges'} with a 2D histogram of 
+        VISUALIZATION_CONFIG['density_bins'] bins per axis if there are more than 
+        VISUALIZATION_CONFIG['aggregation_threshold'] points.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if x.size <= VISUALIZATION_CONFIG['aggregation_threshold']:
+        return {'x': x, 'y': y}
+    finite = np.isfinite(x) & np.isfinite(y)
+    counts, xedges, yedges = np.histogram2d(x[finite], y[finite], bins=VISUALIZATION_CONFIG['density_bins'])
+    return {'counts': counts, 'xedges': xedges, 'yedges': yedges}
+
+
+def line_points(y):
+    """Prepares the data of a line plot by index, decimating it above the aggregation threshold.
+
+    Args:
+        y (array-like): The values, plotted against their index.
+
+    Returns:
+        dict: {'x', 'y'} with the index and values of the points to draw. Above VISUALIZATION_CONFIG['aggregation_threshold'] 
+        points, only VISUALIZATION_CONFIG['line_max_points'] points are kept, selected with the method 
+        VISUALIZATION_CONFIG['line_decimation'] ('lttb' or 'minmax').
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.arange(y.size)
+    if y.size <= VISUALIZATION_CONFIG['aggregation_threshold']:
+        return {'x': x, 'y': y}
+    if VISUALIZATION_CONFIG['line_decimation'] == 'minmax':
+        index = decimate_minmax(y, VISUALIZATION_CONFIG['line_max_points'])
+    else:
+        index = decimate_lttb(x, y, VISUALIZATION_CONFIG['line_max_points'])
+    return {'x': x[index], 'y': y[index]}
+
+
+def decimate_minmax(y, max_points):
+    """Selects the minimum and maximum of equally sized buckets, which preserves the envelope of a line.
+    The first and last points are always kept, so the decimated line spans the same range.
+
+    Args:
+        y (np.ndarray): The values.
+        max_points (int): The maximum number of points to keep.
+
+    Returns:
+        np.ndarray: The sorted indices of the points to keep.
+    """
+    n_buckets = max((max_points - 2) // 2, 1)
+    bucket_size = math.ceil(y.size / n_buckets)
+    if y.size <= max_points or bucket_size <= 1:
+        return np.arange(y.size)
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:y.size] = y
+    buckets = padded.reshape(n_buckets, bucket_size)
+    # Every bucket holds at least one value unless the input ends before it
+    valid = ~np.isnan(buckets).all(axis=1)
+    offsets = np.arange(n_buckets)[valid] * bucket_size
+    minimum = np.nanargmin(buckets[valid], axis=1) + offsets
+    maximum = np.nanargmax(buckets[valid], axis=1) + offsets
+    return np.unique(np.concatenate([[0, y.size - 1], minimum, maximum]))
+
+
+def decimate_lttb(x, y, max_points):
+    """Selects points with the Largest-Triangle-Three-Buckets algorithm, which preserves the visual shape of a line.
+
+    Args:
+        x (np.ndarray): The x values, in increasing order.
+        y (np.ndarray): The y values.
+        max_points (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: The sorted indices of the points to keep.
+    """
+    n = y.size
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    # The first and last points are always kept, the others are split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        average_x, average_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - average_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (average_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _plot_points(ax, points):
+    """Draws scatter points, or the 2D histogram prepared by scatter_points."""
+    if 'counts' in points:
+        from matplotlib.colors import LogNorm
+        counts = np.ma.masked_equal(points['counts'].T, 0)
+        return ax.imshow(counts, origin='lower', aspect='auto', interpolation='nearest',
+                         extent=(points['xedges'][0], points['xedges'][-1], points['yedges'][0], points['yedges'][-1]),
+                         cmap=VISUALIZATION_CONFIG['density_cmap'],
+                         norm=LogNorm() if counts.count() else None)
+    ax.scatter(points['x'], points['y'],
+               alpha=VISUALIZATION_CONFIG['scatter_alpha'],
+               color=VISUALIZATION_CONFIG['scatter_color'],
+               s=VISUALIZATION_CONFIG['scatter_size'],
+               marker=VISUALIZATION_CONFIG['scatter_marker'])
+    return None
+
+
+def _plot_boxplot(figure, columns, values):
+    ax = figure.add_subplot()
+    ax.boxplot([np.asarray(column)[~np.isnan(column)] for column in values],
+               boxprops=VISUALIZATION_CONFIG['boxprops'],
+               whiskerprops=VISUALIZATION_CONFIG['whiskerprops'],
+               capprops=VISUALIZATION_CONFIG['capprops'],
+               medianprops=VISUALIZATION_CONFIG['medianprops'],
+               flierprops=VISUALIZATION_CONFIG['flierprops'])
+    ax.set_xticks(range(1, len(columns) + 1))
+    ax.set_xticklabels(columns)
+    ax.tick_params(labelsize=VISUALIZATION_CONFIG['font_size'])
+    ax.grid(True)
+
+
+def _plot_histograms(figure, columns, values, title):
+    n_cols = math.ceil(math.sqrt(len(columns)))
+    n_rows = math.ceil(len(columns) / n_cols)
+    for i, (column, column_values) in enumerate(zip(columns, values)):
+        ax = figure.add_subplot(n_rows, n_cols, i + 1)
+        ax.hist(np.asarray(column_values)[~np.isnan(column_values)],
+                bins=VISUALIZATION_CONFIG['hist_bins'],
+                color=VISUALIZATION_CONFIG['hist_color'],
+                alpha=VISUALIZATION_CONFIG['hist_alpha'],
+                edgecolor=VISUALIZATION_CONFIG['hist_edgecolor'])
+        ax.set_title(column)
+        ax.grid(True)
+    figure.suptitle(title, fontsize=VISUALIZATION_CONFIG['title_font_size'])
+    figure.tight_layout()
+
+
+def _plot_scatter_grid(figure, features, target, points, title):
+    n_cols = math.ceil(math.sqrt(len(features)))
+    n_rows = math.ceil(len(features) / n_cols)
+    for i, (feature, feature_points) in enumerate(zip(features, points)):
+        ax = figure.add_subplot(n_rows, n_cols, i + 1)
+        _plot_points(ax, feature_points)
+        ax.set_xlabel(feature)
+        ax.set_ylabel(target)
+    figure.suptitle(title, fontsize=VISUALIZATION_CONFIG['title_font_size'])
+    figure.tight_layout()
+
+
+def _plot_correlation_matrix(figure, columns, matrix, annotate=True):
+    ax = figure.add_subplot()
+    cax = ax.matshow(matrix, cmap=VISUALIZATION_CONFIG['correlation_matrix_cmap'])
+    figure.colorbar(cax, shrink=VISUALIZATION_CONFIG['correlation_matrix_colorbar_shrink'])
+    if annotate:
+        for i in range(matrix.shape[0]):
+            for j in range(matrix.shape[1]):
+                ax.text(j, i, f'{matrix[i, j]:.2f}', va='center', ha='center', color=VISUALIZATION_CONFIG['correlation_matrix_text_color'])
+    ax.set_xticks(range(len(columns)))
+    ax.set_yticks(range(len(columns)))
+    ax.set_xticklabels(columns)
+    ax.set_yticklabels(columns)
+    ax.xaxis.set_ticks_position(VISUALIZATION_CONFIG['correlation_matrix_ticks_position'])
+    figure.tight_layout()
+
+
+def _plot_regression_scatter(figure, points, min_val, max_val):
+    ax = figure.add_subplot()
+    image = _plot_points(ax, points)
+    if image is not None:
+        figure.colorbar(image, ax=ax, label='Count')
+    ax.plot([min_val, max_val], [min_val, max_val],
+            color=VISUALIZATION_CONFIG['scatter_line_color'],
+            linestyle=VISUALIZATION_CONFIG['scatter_line_style'],
+            linewidth=VISUALIZATION_CONFIG['scatter_line_width'])
+    ax.set_xlabel('Actual')
+    ax.set_ylabel('Predicted')
+    ax.grid(True)
+    ax.set_title('Scatter plot for actual vs. predicted values')
+
+
+def _plot_regression_line(figure, actual, predicted):
+    ax = figure.add_subplot()
+    ax.plot(actual['x'], actual['y'],
+            color=VISUALIZATION_CONFIG['line_color1'],
+            label='Actual',
+            alpha=VISUALIZATION_CONFIG['line_alpha'],
+            linewidth=VISUALIZATION_CONFIG['line_width'],
+            marker=VISUALIZATION_CONFIG['line_marker'],
+            markersize=VISUALIZATION_CONFIG['line_marker_size'],
+            markerfacecolor=VISUALIZATION_CONFIG['line_marker_color1'],
+            linestyle=VISUALIZATION_CONFIG['line_style1'])
+    ax.plot(predicted['x'], predicted['y'],
+            color=VISUALIZATION_CONFIG['line_color2'],
+            label='Predicted',
+            alpha=VISUALIZATION_CONFIG['line_alpha'],
+            linewidth=VISUALIZATION_CONFIG['line_width'],
+            marker=VISUALIZATION_CONFIG['line_marker'],
+            markersize=VISUALIZATION_CONFIG['line_marker_size'],
+            markerfacecolor=VISUALIZATION_CONFIG['line_marker_color2'],
+            linestyle=VISUALIZATION_CONFIG['line_style2'])
+    ax.set_title('Line plot for actual vs. predicted values')
+    ax.legend()
+    ax.grid(True)
+    ax.set_xlabel('Index')
+    ax.set_ylabel('Value')
+
+
+# The plotters for each kind of plot, called as plotter(figure, **spec.params)
+PLOTTERS = {
+    'boxplot': _plot_boxplot,
+    'histograms': _plot_histograms,
+    'scatter_grid': _plot_scatter_grid,
+    'correlation_matrix': _plot_correlation_matrix,
+    'regression_scatter': _plot_regression_scatter,
+    'regression_line': _plot_regression_line,
+}
@@ -8,6 +8,7 @@
 
 from fpdf import FPDF
 from PIL import Image
+from concurrent.futures import Future
 
 class PDF(FPDF):
     """A specialized FPDF class for generating PDF reports with custom headers, footers,
@@ -97,6 +98,29 @@ class PDF(FPDF):
         self.chapter_title(title)
         self.chapter_body(body)
 
+    def add_table(self, table, float_format='{:.4f}'):
+        """Adds a DataFrame to the PDF as a table, sizing the columns to their contents.
+        
+        Args:
+            table (pd.DataFrame): The table to add. The index is not included.
+            float_format (str): The format of floating point values.
+        """
+        header = [str(column) for column in table.columns]
+        rows = [[float_format.format(value) if isinstance(value, float) else str(value) for value in row] 
+                for row in table.itertuples(index=False)]
+        self.set_font('Times', 'B', 8)
+        widths = [max(self.get_string_width(text) for text in column) + 4 for column in zip(header, *rows)]
+        scale = min(1, (self.w - self.l_margin - self.r_margin) / sum(widths))
+        widths = [width * scale for width in widths]
+        for text, width in zip(header, widths):
+            self.cell(width, 6, text, 1, 0, 'C')
+        self.ln()
+        self.set_font('Times', '', 8)
+        for row in rows:
+            for text, width in zip(row, widths):
+                self.cell(width, 6, text, 1, 0, 'C')
+            self.ln()
+
     def get_image_size(self, image_path):
         """Retrieves the size of an image to scale it appropriately for the PDF layout.
         
@@ -113,8 +137,11 @@ class PDF(FPDF):
         """Adds an image to the PDF, scaling and centering it on the page.
         
         Args:
-            image_path (str): The file path to the image to be added.
+            image_path (str or Future): The file path to the image to be added, 
+                or a future resolving to it (e.g. a figure that is still being rendered).
         """
+        if isinstance(image_path, Future):
+            image_path = image_path.result()
         img_width, img_height = self.get_image_size(image_path)
         img_width, img_height = img_width / 15, img_height / 15
         x = (self.w - img_width) / 2
@@ -128,4 +155,54 @@ class PDF(FPDF):
         Args:
             file_path (str): The path where the PDF report will be saved.
         """
-        self.output(file_path)
\ No newline at end of file
+        self.output(file_path)
+
+
+class ReportRecorder:
+    """Records the content calls made on a PDF so that they can be replayed onto a PDF later.
+
+    A recorder can be passed wherever a PDF object is expected, e.g. to capture the report section 
+    of an analysis stage and add it to the final report afterwards.
+    """
+
+    # The PDF methods that are recorded
+    RECORDED_METHODS = ('cover_page', 'add_heading', 'chapter_title', 'chapter_sub_title', 
+                        'chapter_body', 'add_chapter', 'add_page', 'add_image', 'add_table')
+
+    def __init__(self):
+        """Initializes an empty recorder."""
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name in ReportRecorder.RECORDED_METHODS:
+            return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def resolve(self):
+        """Waits for the figures that are still being rendered and records their paths instead of the futures.
+
+        Returns:
+            ReportRecorder: The recorder itself, which no longer holds futures and can be pickled.
+        """
+        self.calls = [(name, tuple(arg.result() if isinstance(arg, Future) else arg for arg in args), 
+                       {key: value.result() if isinstance(value, Future) else value for key, value in kwargs.items()})
+                      for name, args, kwargs in self.calls]
+        return self
+
+    def image_paths(self):
+        """Returns the paths of the images added to the recorded report section.
+
+        Returns:
+            list: The image paths, in the order they were added.
+        """
+        self.resolve()
+        return [args[0] if args else kwargs['image_path'] for name, args, kwargs in self.calls if name == 'add_image']
+
+    def replay(self, pdf):
+        """Replays the recorded calls onto a PDF (or another recorder).
+
+        Args:
+            pdf (PDF): The PDF object to add the recorded content to.
+        """
+        for name, args, kwargs in self.calls:
+            getattr(pdf, name)(*args, **kwargs)
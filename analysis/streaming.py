@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/09/22 14:05
+@Desc: This module provides mergeable sketches and accumulators for computing statistics over chunked or larger-than-memory data.
+       Every sketch can be updated chunk by chunk and merged with sketches built on other chunks or in other processes.
+'''
+
+import pandas as pd
+import numpy as np
+
+
+class QuantileSketch:
+    """A mergeable approximate quantile sketch (KLL).
+
+    Values are kept in levels of compactors, where an item on level h stands for 2**h input values.
+    A full level is sorted and every other item is promoted to the next level, so the memory use
+    stays O(k log(n / k)) while the rank error is roughly O(1 / k). As long as no compaction
+    has happened the sketch is exact and quantiles are interpolated like pandas does.
+    """
+
+    def __init__(self, k=200, seed=None):
+        """Initializes an empty sketch.
+
+        Args:
+            k (int): The size of the top compactor, which controls the accuracy of the sketch.
+            seed (int, optional): The seed of the random offsets used when compacting.
+        """
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        """Adds values to the sketch. Missing values are ignored.
+
+        Args:
+            values (array-like): The values to add.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.n += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """Merges another sketch into this sketch.
+
+        Args:
+            other (QuantileSketch): The sketch to merge.
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q):
+        """Estimates one or several quantiles.
+
+        Args:
+            q (float or array-like): The quantiles to estimate, between 0 and 1.
+
+        Returns:
+            float or np.ndarray: The estimated quantiles (NaN if the sketch is empty).
+        """
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        if len(self.levels) == 1:
+            # Nothing has been compacted yet, so the quantiles are exact
+            return np.quantile(self.levels[0], q)
+        items, weights = self._weighted_items()
+        cumulative = np.cumsum(weights)
+        index = np.searchsorted(cumulative, np.asarray(q) * cumulative[-1], side='left')
+        return items[np.minimum(index, items.size - 1)]
+
+    def rank(self, value, inclusive=True):
+        """Estimates the number of values less than (or equal to) a value.
+
+        Args:
+            value (float or array-like): The values to rank.
+            inclusive (bool): Whether values equal to the value are counted.
+
+        Returns:
+            float or np.ndarray: The estimated number of values.
+        """
+        items, weights = self._weighted_items()
+        cumulative = np.concatenate([[0], np.cumsum(weights)])
+        index = np.searchsorted(items, value, side='right' if inclusive else 'left')
+        return cumulative[index]
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2 ** h, dtype=float) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def _capacity(self, level):
+        # Lower levels get geometrically smaller compactors
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays on this level so that no weight is lost
+                leftover, items = (items[-1:], items[:-1]) if items.size % 2 else (items[:0], items)
+                offset = self._rng.integers(2)
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset::2]])
+                self.levels[level] = leftover
+            level += 1
+
+
+class DistinctSketch:
+    """A mergeable approximate distinct counter (k minimum values).
+
+    The k smallest 64-bit hashes of the values are kept. The count is exact while fewer than k
+    distinct values have been seen, and has a relative error of roughly 1 / sqrt(k) afterwards.
+    """
+
+    def __init__(self, k=1024):
+        """Initializes an empty sketch.
+
+        Args:
+            k (int): The number of hashes to keep, which controls the accuracy of the sketch.
+        """
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update(self, values):
+        """Adds values to the sketch. Missing values are ignored.
+
+        Args:
+            values (array-like): The values to add.
+        """
+        values = pd.Series(values).dropna().to_numpy()
+        if values.size == 0:
+            return
+        self._keep(np.concatenate([self.hashes, pd.util.hash_array(values)]))
+
+    def merge(self, other):
+        """Merges another sketch into this sketch.
+
+        Args:
+            other (DistinctSketch): The sketch to merge.
+        """
+        self._keep(np.concatenate([self.hashes, other.hashes]))
+
+    def count(self) -> float:
+        """Estimates the number of distinct values.
+
+        Returns:
+            float: The estimated number of distinct values.
+        """
+        if self.hashes.size < self.k:
+            return float(self.hashes.size)
+        return (self.k - 1) / (float(self.hashes[-1]) / 2 ** 64)
+
+    def _keep(self, hashes):
+        self.hashes = np.unique(hashes)[:self.k]
+
+
+class StatisticsAccumulator:
+    """A mergeable one-pass accumulator of summary statistics for a DataFrame.
+
+    For every column it gathers the count of values and missing values. For numeric columns it also
+    gathers the mean and variance (Welford / Chan), the minimum and maximum and approximate quantiles.
+    A uniform random sample of rows is kept with a reservoir of random keys, so that merged
+    accumulators still hold a uniform sample of all rows.
+    """
+
+    def __init__(self, sample_size=5, sketch_size=1000, seed=None):
+        """Initializes an empty accumulator.
+
+        Args:
+            sample_size (int): The number of rows kept in the random sample.
+            sketch_size (int): The accuracy of the quantile sketches. Quantiles are exact up to this many values per column.
+            seed (int, optional): The seed of the random sample and the sketches.
+        """
+        self.sample_size = sample_size
+        self.sketch_size = sketch_size
+        self.n_rows = 0
+        self.memory_usage = 0
+        self.dtypes = None
+        self.null_counts = None
+        self.numeric_columns = None
+        self.count = self.mean = self.m2 = self.min = self.max = None
+        self.sketches = None
+        self.sample = None
+        self.sample_keys = np.empty(0)
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        """Adds a chunk of rows to the accumulator.
+
+        Args:
+            chunk (pd.DataFrame): The chunk to add. All chunks must have the same columns.
+        """
+        if self.dtypes is None:
+            self._initialize(chunk)
+        self.n_rows += chunk.shape[0]
+        self.memory_usage += int(chunk.memory_usage(index=True).sum())
+        self.null_counts = self.null_counts + chunk.isnull().sum()
+
+        # Per-chunk moments of all numeric columns at once, then merged into the running moments
+        values = chunk[self.numeric_columns].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        mean = np.where(valid, values, 0).sum(axis=0) / np.maximum(count, 1)
+        m2 = np.where(valid, (values - mean) ** 2, 0).sum(axis=0)
+        minimum = np.where(valid, values, np.inf).min(axis=0, initial=np.inf)
+        maximum = np.where(valid, values, -np.inf).max(axis=0, initial=-np.inf)
+        self._merge_moments(count, mean, m2, minimum, maximum)
+        for i, sketch in enumerate(self.sketches):
+            sketch.update(values[:, i])
+
+        # Keep the rows with the smallest random keys
+        keys = self._rng.random(chunk.shape[0])
+        if keys.size > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            chunk, keys = chunk.iloc[np.sort(keep)], keys[np.sort(keep)]
+        self._merge_sample(chunk, keys)
+
+    def merge(self, other):
+        """Merges an accumulator built on other chunks (e.g. in another process) into this accumulator.
+
+        Args:
+            other (StatisticsAccumulator): The accumulator to merge.
+        """
+        if other.dtypes is None:
+            return
+        if self.dtypes is None:
+            self._initialize(other.sample)
+        self.n_rows += other.n_rows
+        self.memory_usage += other.memory_usage
+        self.null_counts = self.null_counts + other.null_counts
+        self._merge_moments(other.count, other.mean, other.m2, other.min, other.max)
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        self._merge_sample(other.sample, other.sample_keys)
+
+    @property
+    def n_columns(self) -> int:
+        return 0 if self.dtypes is None else len(self.dtypes)
+
+    @property
+    def size(self) -> int:
+        return self.n_rows * self.n_columns
+
+    def total_missing(self) -> int:
+        """Returns the total number of missing values."""
+        return 0 if self.null_counts is None else int(self.null_counts.sum())
+
+    def info(self) -> pd.DataFrame:
+        """Returns the non-null count and dtype of every column, like DataFrame.info().
+
+        Returns:
+            pd.DataFrame: One row per column with 'Non-Null Count' and 'Dtype'.
+        """
+        return pd.DataFrame({'Non-Null Count': self.n_rows - self.null_counts, 'Dtype': self.dtypes.astype(str)})
+
+    def describe(self) -> pd.DataFrame:
+        """Returns descriptive statistics of the numeric columns, like DataFrame.describe().
+
+        Returns:
+            pd.DataFrame: The count, mean, std, min, quartiles and max of every numeric column.
+        """
+        quantiles = np.array([sketch.quantile([0.25, 0.5, 0.75]) for sketch in self.sketches]).reshape(-1, 3)
+        empty = self.count == 0
+        std = np.sqrt(self.m2 / np.maximum(self.count - 1, 1))
+        return pd.DataFrame({
+            'count': self.count.astype(float),
+            'mean': np.where(empty, np.nan, self.mean),
+            'std': np.where(self.count > 1, std, np.nan),
+            'min': np.where(empty, np.nan, self.min),
+            '25%': quantiles[:, 0],
+            '50%': quantiles[:, 1],
+            '75%': quantiles[:, 2],
+            'max': np.where(empty, np.nan, self.max),
+        }, index=self.numeric_columns).T
+
+    def _initialize(self, chunk):
+        self.dtypes = chunk.dtypes
+        self.null_counts = pd.Series(0, index=chunk.columns)
+        self.numeric_columns = chunk.select_dtypes('number').columns
+        n = len(self.numeric_columns)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.mean, self.m2 = np.zeros(n), np.zeros(n)
+        self.min, self.max = np.full(n, np.inf), np.full(n, -np.inf)
+        self.sketches = [QuantileSketch(k=self.sketch_size, seed=self._rng.integers(2 ** 32)) for _ in range(n)]
+        self.sample = chunk.iloc[:0]
+
+    def _merge_moments(self, count, mean, m2, minimum, maximum):
+        total = self.count + count
+        delta = mean - self.mean
+        weight = np.divide(count, total, out=np.zeros(len(total)), where=total > 0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * weight
+        self.count = total
+        self.min = np.minimum(self.min, minimum)
+        self.max = np.maximum(self.max, maximum)
+
+    def _merge_sample(self, rows, keys):
+        sample = pd.concat([self.sample, rows]) if self.sample.shape[0] else rows
+        keys = np.concatenate([self.sample_keys, keys])
+        order = np.argsort(keys)[:self.sample_size]
+        self.sample, self.sample_keys = sample.iloc[order], keys[order]
+
+
+class CorrelationAccumulator:
+    """A mergeable accumulator of the sufficient statistics of a correlation matrix.
+
+    It keeps the row count, the column means and the co-moment matrix of the numeric columns, 
+    merged chunk by chunk with Chan's formula. Rows with missing values are skipped, 
+    so the result is the correlation over complete rows.
+    """
+
+    def __init__(self, dtype=np.float64):
+        """Initializes an empty accumulator.
+
+        Args:
+            dtype (np.dtype): The floating point type of the computation, e.g. np.float32 to halve the memory use.
+        """
+        self.dtype = np.dtype(dtype)
+        self.columns = None
+        self.n = 0
+        self.mean = None
+        self.comoment = None
+
+    def update(self, chunk):
+        """Adds a chunk of rows to the accumulator.
+
+        Args:
+            chunk (pd.DataFrame): The chunk to add. All chunks must have the same numeric columns.
+        """
+        numeric = chunk.select_dtypes('number')
+        if self.columns is None:
+            self._initialize(numeric.columns)
+        values = numeric.to_numpy(dtype=self.dtype)
+        values = values[~np.isnan(values).any(axis=1)]
+        if values.shape[0] == 0:
+            return
+        mean = values.mean(axis=0)
+        centered = values - mean
+        self._merge(values.shape[0], mean, centered.T @ centered)
+
+    def merge(self, other):
+        """Merges an accumulator built on other chunks (e.g. in another process) into this accumulator.
+
+        Args:
+            other (CorrelationAccumulator): The accumulator to merge.
+        """
+        if other.columns is None:
+            return
+        if self.columns is None:
+            self._initialize(other.columns)
+        if other.n:
+            self._merge(other.n, other.mean, other.comoment)
+
+    def correlation(self) -> pd.DataFrame:
+        """Returns the Pearson correlation matrix.
+
+        Returns:
+            pd.DataFrame: The correlation matrix of the numeric columns.
+        """
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix = np.clip(self.comoment / np.outer(scale, scale), -1, 1)
+        return pd.DataFrame(matrix, index=self.columns, columns=self.columns)
+
+    def _initialize(self, columns):
+        self.columns = pd.Index(columns)
+        self.mean = np.zeros(len(columns), dtype=self.dtype)
+        self.comoment = np.zeros((len(columns), len(columns)), dtype=self.dtype)
+
+    def _merge(self, n, mean, comoment):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.comoment = self.comoment + comoment + np.outer(delta, delta) * (self.n * n / total)
+        self.n = total
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/15 11:05
+@Desc: This script benchmarks the public functions of the analysis package and the full main pipeline
+       on synthetic datasets (see benchmarks.synthetic), and appends the timings to a JSON Lines history.
+       Every timing is compared with the latest earlier timing of the same benchmark on the same dataset,
+       and slowdowns above a threshold are flagged as regressions.
+
+       python -m benchmarks.run --rows 10000 100000 1000000
+'''
+
+from .synthetic import write_housing_csv
+from contextlib import redirect_stdout
+import pandas as pd
+import numpy as np
+import subprocess
+import tempfile
+import platform
+import argparse
+import shutil
+import time
+import json
+import sys
+import io
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'history.jsonl')
+
+# A benchmark is flagged as a regression if it is this much slower than its baseline...
+REGRESSION_THRESHOLD = 0.2
+# ...and at least this many seconds slower, so that noise in very short timings is not flagged
+NOISE_FLOOR = 0.05
+
+# Datasets larger than this are only used by the streaming benchmarks
+MAX_IN_MEMORY_ROWS = 10000000
+
+# The folders the analysis functions write to, relative to the working directory
+WORKSPACE_FOLDERS = ('data/raw', 'data/processed', 'logs', 'reports/figures', 'reports/pdf_reports')
+
+# The dataset fields that identify comparable timings
+DATASET_FIELDS = ('rows', 'extra_columns', 'missing_rate', 'duplicate_rate', 'outlier_rate', 'seed')
+
+
+def _benchmarks():
+    """Returns the benchmarks as name -> (function of the context, the largest dataset it runs on).
+
+    The context holds the path of the CSV file ('path'), the loaded data ('raw'), the preprocessed data with
+    the selected features ('data'), and the test values and predictions of a model ('y_test', 'y_pred', 'y_base').
+    Streaming benchmarks read the CSV file chunk by chunk and run on datasets of any size.
+    """
+    # Imported here, so that generating datasets does not import the analysis package
+    from analysis import (data_loading, data_exploration, data_preprocessing, feature_engineering,
+                          correlation, model_building, evaluation)
+
+    def chunks(context):
+        return data_loading.load_data('csv', file_path=context['path'], chunksize=1000000, use_cache=False)
+
+    return {
+        'data_loading.load_data': (lambda context: sum(chunk.shape[0] for chunk in chunks(context)), None),
+        'data_exploration.summary_statistics (streamed)': (lambda context: data_exploration.summary_statistics(chunks(context)), None),
+        'model_building.train_incremental (streamed)': (lambda context: model_building.train_incremental(
+            chunks(context), 'regression', 'sgd', checkpoint=False), None),
+        'data_exploration.summary_statistics': (lambda context: data_exploration.summary_statistics(context['raw']), MAX_IN_MEMORY_ROWS),
+        'data_preprocessing.remove_duplicates': (lambda context: data_preprocessing.remove_duplicates(context['raw']), MAX_IN_MEMORY_ROWS),
+        'data_preprocessing.handle_missing_values': (lambda context: data_preprocessing.handle_missing_values(
+            context['raw'], method='front'), MAX_IN_MEMORY_ROWS),
+        'data_preprocessing.handle_outliers': (lambda context: data_preprocessing.handle_outliers(
+            context['raw'].dropna(), method='iqr', negative_values=True), MAX_IN_MEMORY_ROWS),
+        'feature_engineering.visualize_features': (lambda context: feature_engineering.visualize_features(
+            context['data'], list(context['data'].columns)), MAX_IN_MEMORY_ROWS),
+        'feature_engineering.select_features': (lambda context: feature_engineering.select_features(
+            context['raw'].dropna(), method='correlation', threshold=0.4), MAX_IN_MEMORY_ROWS),
+        'correlation.correlation_matrix': (lambda context: correlation.correlation_matrix(context['raw']), MAX_IN_MEMORY_ROWS),
+        'model_building.train_model (linear_regression)': (lambda context: model_building.train_model(
+            context['data'], 'regression', 'linear_regression'), MAX_IN_MEMORY_ROWS),
+        'model_building.train_model (decision_tree)': (lambda context: model_building.train_model(
+            context['data'], 'regression', 'decision_tree'), 1000000),
+        'model_building.cross_validate_model': (lambda context: model_building.cross_validate_model(
+            context['data'], 'regression', 'linear_regression'), MAX_IN_MEMORY_ROWS),
+        'model_building.train_model_grid': (lambda context: model_building.train_model_grid(context['data'], 'regression'), 100000),
+        'model_building.tune_model': (lambda context: model_building.tune_model(context['data'], 'regression'), 100000),
+        'model_building.cluster_sweep': (lambda context: model_building.cluster_sweep(context['data']), 1000000),
+        'evaluation.evaluate_model': (lambda context: evaluation.evaluate_model(
+            context['y_test'], context['y_pred'], 'regression'), MAX_IN_MEMORY_ROWS),
+        'evaluation.compare_models': (lambda context: evaluation.compare_models(
+            context['y_test'], context['y_pred'], context['y_base'], 'regression'), MAX_IN_MEMORY_ROWS),
+    }
+
+
+def time_call(func, repeat=1) -> list:
+    """Times a function, silencing what it prints.
+
+    Returns:
+        list: The wall-clock time of every repetition in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def run_main(path, workspace) -> None:
+    """Runs main.py on a dataset in a fresh working directory, so that no cache of an earlier run is used."""
+    run_dir = tempfile.mkdtemp(dir=workspace)
+    try:
+        for folder in WORKSPACE_FOLDERS:
+            os.makedirs(os.path.join(run_dir, folder))
+        os.symlink(os.path.abspath(path), os.path.join(run_dir, 'data', 'raw', 'housing_data_raw.csv'))
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'main.py')], cwd=run_dir, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def prepare_context(path, rows) -> dict:
+    """Loads a dataset and prepares the inputs of the benchmarks, without timing it."""
+    from analysis import data_loading, data_preprocessing, feature_engineering, model_building
+
+    context = {'path': path}
+    if rows > MAX_IN_MEMORY_ROWS:
+        return context
+    with redirect_stdout(io.StringIO()):
+        raw = data_loading.load_data('csv', file_path=path, use_cache=False)
+        data = data_preprocessing.remove_duplicates(raw)
+        data = data_preprocessing.handle_missing_values(data, method='front')
+        data = data_preprocessing.handle_outliers(data, method='iqr', negative_values=True)
+        data = feature_engineering.select_features(data, method='correlation', threshold=0.4)
+        y_test, y_pred = model_building.train_model(data, 'regression', 'linear_regression')
+        _, y_base = model_building.train_model(data[[data.columns[0], data.columns[-1]]], 'regression', 'linear_regression')
+    context.update(raw=raw, data=data, y_test=y_test, y_pred=y_pred, y_base=y_base)
+    return context
+
+
+def load_history(path=HISTORY_PATH) -> list:
+    """Reads the benchmark history, one JSON record per line."""
+    if not os.path.isfile(path):
+        return []
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def find_baseline(history, record):
+    """Returns the latest successful earlier record of the same benchmark on the same dataset and machine, or None."""
+    key = (record['benchmark'], record['machine'], *(record[field] for field in DATASET_FIELDS))
+    for previous in reversed(history):
+        if previous.get('status') == 'ok' and \
+           (previous['benchmark'], previous.get('machine'), *(previous.get(field) for field in DATASET_FIELDS)) == key:
+            return previous
+    return None
+
+
+def run_benchmarks(rows_list, extra_columns=0, missing_rate=0.01, duplicate_rate=0.01, outlier_rate=0.005, seed=42,
+                   repeat=3, include=None, include_main=True, data_dir=None, history_path=HISTORY_PATH,
+                   threshold=REGRESSION_THRESHOLD) -> pd.DataFrame:
+    """Runs the benchmarks on synthetic datasets of several sizes and appends the timings to the history.
+
+    Args:
+        rows_list (list): The numbers of rows of the datasets, e.g. [10**4, 10**5, 10**6].
+        extra_columns, missing_rate, duplicate_rate, outlier_rate: The options of the synthetic datasets.
+        seed (int): The seed of the synthetic datasets.
+        repeat (int): The repetitions of every benchmark. The fastest repetition is compared with the baseline.
+        include (list, optional): Substrings of the benchmark names to run. Defaults to all benchmarks.
+        include_main (bool): Whether to benchmark the full main pipeline.
+        data_dir (str, optional): The directory the datasets are written to and reused from. Defaults to a temporary directory.
+        history_path (str): The JSON Lines history the timings are appended to.
+        threshold (float): The relative slowdown above which a benchmark is flagged as a regression.
+
+    Returns:
+        pd.DataFrame: The records of this run, with their baseline and relative change.
+    """
+    history = load_history(history_path)
+    run_id = time.strftime('%Y%m%d-%H%M%S')
+    environment = {'run': run_id,
+                   'commit': _git_commit(),
+                   'machine': f'{platform.node()} ({platform.machine()}, {os.cpu_count()} CPUs)',
+                   'python': sys.version.split()[0]}
+    dataset = {'extra_columns': extra_columns, 'missing_rate': missing_rate, 'duplicate_rate': duplicate_rate,
+               'outlier_rate': outlier_rate, 'seed': seed}
+    benchmarks = {name: benchmark for name, benchmark in _benchmarks().items()
+                  if include is None or any(pattern in name for pattern in include)}
+
+    records = []
+    workspace = tempfile.mkdtemp(prefix='benchmarks-')
+    cwd = os.getcwd()
+    try:
+        # The benchmarks write their figures and reports into the workspace
+        os.chdir(workspace)
+        for folder in WORKSPACE_FOLDERS:
+            os.makedirs(folder, exist_ok=True)
+        for rows in rows_list:
+            name = f'housing_{rows}_{extra_columns}_{missing_rate}_{duplicate_rate}_{outlier_rate}_{seed}.csv'
+            path = os.path.join(os.path.join(cwd, data_dir) if data_dir else workspace, name)
+            if not os.path.isfile(path):
+                print(f'Generating {rows} rows to {path}...')
+                write_housing_csv(path, rows, random_state=seed, extra_columns=extra_columns, missing_rate=missing_rate,
+                                  duplicate_rate=duplicate_rate, outlier_rate=outlier_rate)
+            context = prepare_context(path, rows)
+
+            cases = list(benchmarks.items())
+            if include_main:
+                cases.append(('main', (lambda context: run_main(context['path'], workspace), MAX_IN_MEMORY_ROWS)))
+            for benchmark, (func, max_rows) in cases:
+                record = {**environment, 'benchmark': benchmark, 'rows': rows, **dataset, 'repeat': repeat}
+                if max_rows is not None and rows > max_rows:
+                    record['status'] = 'skipped'
+                else:
+                    try:
+                        times = time_call(lambda: func(context), repeat)
+                        record.update(status='ok', min_seconds=min(times), median_seconds=float(np.median(times)))
+                    except Exception as error:
+                        record.update(status='failed', error=f'{type(error).__name__}: {error}')
+                _compare(record, find_baseline(history, record), threshold)
+                records.append(record)
+                print(_format(record))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    if os.path.dirname(history_path):
+        os.makedirs(os.path.dirname(history_path), exist_ok=True)
+    with open(history_path, 'a') as file:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+    return pd.DataFrame(records)
+
+
+def _compare(record, baseline, threshold) -> None:
+    """Adds the baseline timing, the relative change and the regression flag to a record."""
+    record['regression'] = False
+    if record['status'] != 'ok' or baseline is None:
+        return
+    record['baseline_run'] = baseline['run']
+    record['baseline_seconds'] = baseline['min_seconds']
+    record['change'] = record['min_seconds'] / baseline['min_seconds'] - 1
+    record['regression'] = record['change'] > threshold and record['min_seconds'] - baseline['min_seconds'] > NOISE_FLOOR
+
+
+def _format(record) -> str:
+    """Formats a record as a line of the console report."""
+    line = f'{record["benchmark"]:<50} {record["rows"]:>11,} rows  '
+    if record['status'] != 'ok':
+        return line + record['status'] + (f' ({record["error"]})' if 'error' in record else '')
+    line += f'{record["min_seconds"]:9.3f} s'
+    if 'change' in record:
+        line += f'  {record["change"]:+7.1%} vs. {record["baseline_seconds"]:.3f} s'
+    return line + ('  REGRESSION' if record['regression'] else '')
+
+
+def _git_commit():
+    """Returns the current git commit of the repository, or None outside of a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analysis functions on synthetic datasets.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help='The numbers of rows of the datasets (up to 10^8).')
+    parser.add_argument('--extra-columns', type=int, default=0, help='Additional feature columns.')
+    parser.add_argument('--missing-rate', type=float, default=0.01, help='The fraction of missing feature values.')
+    parser.add_argument('--duplicate-rate', type=float, default=0.01, help='The fraction of duplicate rows.')
+    parser.add_argument('--outlier-rate', type=float, default=0.005, help='The fraction of outlying feature values.')
+    parser.add_argument('--seed', type=int, default=42, help='The seed of the datasets.')
+    parser.add_argument('--repeat', type=int, default=3, help='The repetitions of every benchmark.')
+    parser.add_argument('--include', nargs='+', default=None, help='Substrings of the benchmark names to run.')
+    parser.add_argument('--no-main', action='store_true', help='Do not benchmark the full main pipeline.')
+    parser.add_argument('--data-dir', default=None, help='Keep the generated datasets in this directory and reuse them.')
+    parser.add_argument('--history', default=HISTORY_PATH, help='The JSON Lines history of the timings.')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='The relative slowdown flagged as a regression.')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.rows, extra_columns=args.extra_columns, missing_rate=args.missing_rate,
+                             duplicate_rate=args.duplicate_rate, outlier_rate=args.outlier_rate, seed=args.seed,
+                             repeat=args.repeat, include=args.include, include_main=not args.no_main,
+                             data_dir=args.data_dir, history_path=args.history, threshold=args.threshold)
+    regressions = results[results['regression']]
+    if len(regressions):
+        print(f'{len(regressions)} regressions above {args.threshold:.0%}:')
+        print(regressions[['benchmark', 'rows', 'baseline_seconds', 'min_seconds', 'change']].to_string(index=False))
+        sys.exit(1)
+    print('No regressions.')
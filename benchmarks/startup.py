@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/16 10:40
+@Desc: This script measures the startup time of the analysis package against a budget.
+       Every case is run in fresh interpreters and timed from the start of the process, less the startup
+       of a bare interpreter. A case also fails if it loads a module it should not need at that point
+       (e.g. scikit-learn when only importing analysis.model_building), which is what keeps it within budget.
+
+       python -m benchmarks.startup
+'''
+
+from .run import REPO_ROOT, WORKSPACE_FOLDERS
+import subprocess
+import tempfile
+import argparse
+import shutil
+import time
+import sys
+import os
+
+# The heavy third-party packages that are only imported when they are used
+HEAVY_MODULES = ('pandas', 'numpy', 'sklearn', 'scipy', 'matplotlib', 'PIL', 'joblib', 'fpdf')
+
+# The cases as name -> (code run in a fresh interpreter, budget in seconds, modules that must not be loaded)
+CASES = {
+    'import analysis': ('import analysis', 0.05, HEAVY_MODULES),
+    'import analysis.rendering': ('import analysis.rendering', 0.5, ('matplotlib', 'PIL')),
+    'import analysis.model_registry': ('import analysis.model_registry', 0.05, ('sklearn', 'joblib')),
+    'import analysis.model_building': ('import analysis.model_building', 1.0, ('sklearn', 'scipy', 'matplotlib', 'joblib')),
+    'main.py --help': ("import runpy, sys\n"
+                       "sys.argv = ['main.py', '--help']\n"
+                       "try:\n"
+                       f"    runpy.run_path({os.path.join(REPO_ROOT, 'main.py')!r}, run_name='__main__')\n"
+                       "except SystemExit:\n"
+                       "    pass", 0.2, HEAVY_MODULES),
+}
+
+# Printed by every case after its code has run, so that the loaded modules can be checked
+_LOADED_MODULES = "\nimport sys\nprint('LOADED', ' '.join(sorted({name.split('.')[0] for name in sys.modules})))"
+
+
+def time_startup(code, workspace, repeat=5) -> tuple:
+    """Runs code in fresh interpreters.
+
+    Args:
+        code (str): The Python code to run.
+        workspace (str): The working directory.
+        repeat (int): The number of runs.
+
+    Returns:
+        tuple: The shortest wall-clock time in seconds and the top-level modules loaded by the code.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', code + _LOADED_MODULES], cwd=workspace, env=env, check=True,
+                                capture_output=True, text=True).stdout
+        times.append(time.perf_counter() - start)
+    loaded = output.rsplit('LOADED', 1)[-1].split()
+    return min(times), set(loaded)
+
+
+def check_startup(cases=None, repeat=5, scale=1.0) -> list:
+    """Measures the startup cases and checks them against their budgets.
+
+    Args:
+        cases (dict, optional): The cases, see CASES. Defaults to CASES.
+        repeat (int): The runs of every case, of which the shortest is used.
+        scale (float): A factor applied to all budgets, e.g. for slower machines.
+
+    Returns:
+        list: A dict per case with the time, the budget, the forbidden modules that were loaded,
+            and the last line of the error output if the case failed.
+    """
+    cases = cases or CASES
+    # main.py sets up a log file relative to the working directory, which must not end up in the repository
+    workspace = tempfile.mkdtemp()
+    try:
+        for folder in WORKSPACE_FOLDERS:
+            os.makedirs(os.path.join(workspace, folder))
+        interpreter, _ = time_startup('pass', workspace, repeat)
+        results = []
+        for name, (code, budget, forbidden) in cases.items():
+            try:
+                elapsed, loaded = time_startup(code, workspace, repeat)
+            except subprocess.CalledProcessError as error:
+                results.append({'case': name, 'seconds': None, 'budget': budget * scale, 'unexpected': [],
+                                'error': (error.stderr.strip().splitlines() or ['failed'])[-1], 'ok': False})
+                continue
+            seconds = max(elapsed - interpreter, 0.0)
+            unexpected = sorted(loaded & set(forbidden))
+            results.append({'case': name, 'seconds': seconds, 'budget': budget * scale, 'unexpected': unexpected,
+                            'error': None, 'ok': seconds <= budget * scale and not unexpected})
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the startup time of the analysis package against its budget.')
+    parser.add_argument('--repeat', type=int, default=5, help='The runs of every case.')
+    parser.add_argument('--scale', type=float, default=1.0, help='A factor applied to all budgets.')
+    args = parser.parse_args()
+
+    results = check_startup(repeat=args.repeat, scale=args.scale)
+    for result in results:
+        if result['error']:
+            print(f"{result['case']:<34} failed: {result['error']}")
+            continue
+        line = f"{result['case']:<34} {result['seconds']:7.3f} s  (budget {result['budget']:.3f} s)"
+        if result['unexpected']:
+            line += f"  loads {', '.join(result['unexpected'])}"
+        print(line + ('' if result['ok'] else '  OVER BUDGET'))
+    failed = [result for result in results if not result['ok']]
+    if failed:
+        print(f'{len(failed)} of {len(results)} startup cases failed or over budget.')
+        sys.exit(1)
+    print('All startup cases within budget.')
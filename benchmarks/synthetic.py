@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/15 09:50
+@Desc: This script generates synthetic datasets with the schema of housing_data_raw.csv for benchmarking.
+       Rows are resampled from the real data with a small jitter, so the marginal distributions and the correlations
+       with the target (which drive feature selection and the models) stay close to those of the real data.
+       The width and the rates of missing values, duplicate rows and outliers are configurable, and large datasets
+       are written chunk by chunk, so generating 10^8 rows needs no more memory than a single chunk.
+'''
+
+import pandas as pd
+import numpy as np
+import argparse
+import os
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'raw', 'housing_data_raw.csv')
+TARGET = 'MEDV'
+
+# Columns with at most this many distinct values (e.g. CHAS, RAD, ZN) are resampled without jitter
+MAX_DISCRETE_VALUES = 30
+
+# The standard deviation of the jitter of continuous columns, relative to the standard deviation of the column
+JITTER = 0.05
+
+CHUNK_SIZE = 1000000
+
+
+def load_template(path=TEMPLATE_PATH) -> pd.DataFrame:
+    """Loads the real rows that synthetic rows are resampled from, without missing values and duplicates."""
+    return pd.read_csv(path).dropna().drop_duplicates().reset_index(drop=True)
+
+
+def generate_housing(n_rows, extra_columns=0, missing_rate=0.0, duplicate_rate=0.0, outlier_rate=0.0,
+                     random_state=None, template=None) -> pd.DataFrame:
+    """Generates a synthetic dataset with the Boston Housing schema.
+
+    Args:
+        n_rows (int): The number of rows.
+        extra_columns (int): Additional non-negative feature columns (F1, F2, ...), each a noisy mix of three real features,
+            inserted before the target.
+        missing_rate (float): The fraction of feature values replaced by missing values.
+        duplicate_rate (float): The fraction of rows replaced by copies of other rows.
+        outlier_rate (float): The fraction of feature values replaced by outliers, half of them far above
+            the range of the column and half of them negative.
+        random_state (int or np.random.Generator, optional): The seed of the dataset.
+        template (pd.DataFrame, optional): The real rows to resample. Defaults to load_template().
+
+    Returns:
+        pd.DataFrame: The synthetic dataset, with the target as the last column.
+
+    Raises:
+        ValueError: If a rate is not between 0 and 1.
+    """
+    for name, rate in (('missing_rate', missing_rate), ('duplicate_rate', duplicate_rate), ('outlier_rate', outlier_rate)):
+        if not 0 <= rate <= 1:
+            raise ValueError(f'{name} must be between 0 and 1, got {rate}.')
+    rng = np.random.default_rng(random_state)
+    template = load_template() if template is None else template
+    features = [column for column in template.columns if column != TARGET]
+
+    # Resample real rows and jitter the continuous columns, keeping them within the real range
+    data = template.iloc[rng.integers(0, len(template), n_rows)].reset_index(drop=True)
+    for column in template.columns:
+        values = template[column]
+        if values.nunique() > MAX_DISCRETE_VALUES:
+            jittered = data[column].to_numpy(dtype=np.float64) + rng.normal(0, JITTER * values.std(), n_rows)
+            data[column] = np.clip(jittered, values.min(), values.max()).round(4)
+
+    # Additional features correlated with the real ones
+    if extra_columns:
+        standardized = ((data[features] - template[features].mean()) / template[features].std()).to_numpy()
+        for i in range(extra_columns):
+            mix = standardized[:, rng.choice(len(features), 3, replace=False)] @ rng.normal(size=3)
+            # Shifted to be non-negative like the real features, so that only injected outliers are negative
+            data.insert(data.shape[1] - 1, f'F{i + 1}', np.clip(10 + mix + rng.normal(0, 0.5, n_rows), 0, None).round(4))
+        features = [column for column in data.columns if column != TARGET]
+
+    feature_values = data[features].to_numpy(dtype=np.float64)
+    if outlier_rate:
+        mask = rng.random(feature_values.shape) < outlier_rate
+        span = np.nanmax(feature_values, axis=0) - np.nanmin(feature_values, axis=0)
+        high = np.nanmax(feature_values, axis=0) + rng.uniform(3, 10, feature_values.shape) * span
+        low = -rng.uniform(1, 10, feature_values.shape) * span
+        feature_values[mask] = np.where(rng.random(feature_values.shape) < 0.5, high, low)[mask]
+    if missing_rate:
+        feature_values[rng.random(feature_values.shape) < missing_rate] = np.nan
+    data[features] = feature_values
+
+    # Duplicates are copied after the other changes, so they are exact copies
+    if duplicate_rate:
+        duplicates = np.flatnonzero(rng.random(n_rows) < duplicate_rate)
+        data.iloc[duplicates] = data.iloc[rng.integers(0, n_rows, len(duplicates))].to_numpy()
+    return data
+
+
+def write_housing_csv(path, n_rows, chunk_size=CHUNK_SIZE, random_state=None, **params) -> str:
+    """Writes a synthetic dataset to a CSV file chunk by chunk.
+
+    Args:
+        path (str): The CSV file to write.
+        n_rows (int): The number of rows.
+        chunk_size (int): The rows generated and written at once.
+        random_state (int, optional): The seed of the dataset. Every chunk gets an independent stream from it.
+        **params: The options of generate_housing (extra_columns, missing_rate, duplicate_rate, outlier_rate).
+
+    Returns:
+        str: The path of the CSV file.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    template = load_template()
+    n_chunks = max(1, -(-n_rows // chunk_size))
+    seeds = np.random.SeedSequence(random_state).spawn(n_chunks)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', newline='') as file:
+        for i, seed in enumerate(seeds):
+            rows = min(chunk_size, n_rows - i * chunk_size)
+            chunk = generate_housing(rows, random_state=np.random.default_rng(seed), template=template, **params)
+            chunk.to_csv(file, index=False, header=i == 0, float_format='%.6g')
+    # The file only appears once complete, so an interrupted run is not mistaken for a finished dataset
+    os.replace(temp_path, path)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic dataset with the Boston Housing schema.')
+    parser.add_argument('output', help='The CSV file to write.')
+    parser.add_argument('--rows', type=int, default=10000, help='The number of rows.')
+    parser.add_argument('--extra-columns', type=int, default=0, help='Additional feature columns.')
+    parser.add_argument('--missing-rate', type=float, default=0.0, help='The fraction of missing feature values.')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='The fraction of duplicate rows.')
+    parser.add_argument('--outlier-rate', type=float, default=0.0, help='The fraction of outlying feature values.')
+    parser.add_argument('--seed', type=int, default=42, help='The seed of the dataset.')
+    args = parser.parse_args()
+
+    write_housing_csv(args.output, args.rows, random_state=args.seed, extra_columns=args.extra_columns,
+                      missing_rate=args.missing_rate, duplicate_rate=args.duplicate_rate, outlier_rate=args.outlier_rate)
+    print(f'Wrote {args.rows} rows to {args.output}.')
@@ -6,8 +6,6 @@
 @Desc: This script is designed to scrape video information from Bilibili using Selenium.
 '''
 
-import re
-import time
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
@@ -16,6 +14,9 @@ from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.edge.service import Service as EdgeService
 from webdriver_manager.microsoft import EdgeChromiumDriverManager
+from .parsing import CARD_SCRIPT, parse_card_script_result
+from .store import CrawlStore
+from .sinks import CSVSink
 
 class Bilibili:
     def __init__(self):
@@ -29,7 +30,64 @@ class Bilibili:
     def close(self):
         self.driver.quit()
 
-    def get_video_info(self, keyword) -> pd.DataFrame:
+    def extract_cards(self):
+        """Extracts all video cards and the number of result pages of the current page in one script call."""
+        return parse_card_script_result(self.driver.execute_script(CARD_SCRIPT))
+
+    def wait_for_cards(self, previous=None, timeout=10):
+        """Waits until the current page has rendered video cards different from the previous page.
+
+        Returns:
+            tuple: The video cards of the page and the number of result pages,
+            or an empty list and 1 page if no new cards appear within the timeout.
+        """
+        def cards_ready(driver):
+            cards, number = self.extract_cards()
+            return (cards, number) if cards and cards != previous else False
+
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(cards_ready)
+        except TimeoutException:
+            return [], 1
+
+    @staticmethod
+    def append_cards(video_info, cards):
+        for card in cards:
+            for column, values in video_info.items():
+                values.append(card[column])
+
+    def collect(self, video_info, keyword, page, cards, store, incremental, sink) -> bool:
+        """Records the cards of a page and returns whether the crawl should continue."""
+        new_cards = store.record_page(keyword, page, int(self.number), cards) if store is not None else cards
+        if sink is not None:
+            sink.write(new_cards if incremental else cards)
+        else:
+            self.append_cards(video_info, new_cards if incremental else cards)
+        if store is None:
+            return True
+        # Results are ordered newest first, so an incremental crawl stops at the first video seen before
+        return not incremental or (bool(cards) and len(new_cards) == len(cards))
+
+    def get_video_info(self, keyword, store=None, incremental=False, sink=None):
+        """Scrapes the video information of all search result pages of a keyword.
+
+        Args:
+            keyword (str): The keyword to search for.
+            store (CrawlStore, optional): A crawl store that every page is recorded to as soon as it is scraped.
+            incremental (bool): Whether to stop at the first page containing a video already in the store,
+                and only return the new videos. Requires a store.
+            sink (Sink, optional): An output sink that the videos of every page are written to as soon as the page
+                is scraped. The videos are then not kept in memory.
+
+        Returns:
+            pd.DataFrame: The Title, Author and Dates of the videos, or the number of videos written if a sink is given.
+
+        Raises:
+            ValueError: If an incremental crawl is requested without a store.
+        """
+        if incremental and store is None:
+            raise ValueError('An incremental crawl requires a crawl store.')
+
         # Initialize lists to store video information
         titles = []
         authors = []
@@ -43,57 +101,29 @@ class Bilibili:
         self.button = self.driver.find_element(By.XPATH, "/html/body/div[2]/div[2]/div[1]/div[1]/div/div/form/div[2]")
         self.button.click()
 
-        # Switch to the search results page
+        # Switch to the search results page once it has been opened
+        WebDriverWait(self.driver, 10).until(lambda driver: len(driver.window_handles) > 1)
         window_handles = self.driver.window_handles
         self.driver.switch_to.window(window_handles[1])
-        time.sleep(1)
 
-        # Get the number of pages
-        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        try:
-            WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, "/html/body/div[3]/div/div[2]/div[2]/div/div/div/div[4]/div/div/button[9]")))
-            self.button = self.driver.find_element(By.XPATH, "/html/body/div[3]/div/div[2]/div[2]/div/div/div/div[4]/div/div/button[9]")
-            self.button_text = self.button.text
-            self.number = re.findall(r'\d+', self.button_text)[0]
-        except Exception:
-            # Default to 1 page if page number is not found
-            self.number = 1
-
-        # Get video information from the first page
-        try:
-            WebDriverWait(self.driver, 10).until(EC.visibility_of_element_located((By.CLASS_NAME, "bili-video-card__info--tit")))
-            video_cards = self.driver.find_elements(By.CLASS_NAME, "bili-video-card")
-        except TimeoutException:
-            # Set video_cards to an empty list if there's a timeout
-            video_cards = []
-
-        for card in video_cards:
-            titles.append(card.find_element(By.CLASS_NAME, "bili-video-card__info--tit").text if card.find_elements(By.CLASS_NAME, "bili-video-card__info--tit") else None)
-            authors.append(card.find_element(By.CLASS_NAME, "bili-video-card__info--author").text if card.find_elements(By.CLASS_NAME, "bili-video-card__info--author") else None)
-            dates.append(card.find_element(By.CLASS_NAME, "bili-video-card__info--date").text if card.find_elements(By.CLASS_NAME, "bili-video-card__info--date") else None)
+        # Get video information and the number of pages from the first page
+        cards, self.number = self.wait_for_cards()
+        proceed = self.collect(video_info, keyword, 1, cards, store, incremental, sink)
 
         # Navigate to subsequent pages
-        self.button = self.driver.find_element(By.XPATH, "/html/body/div[3]/div/div[2]/div[2]/div/div/div/div[4]/div/div/button[10]")
-        self.button.click()
+        if proceed and int(self.number) > 1:
+            self.button = self.driver.find_element(By.XPATH, "/html/body/div[3]/div/div[2]/div[2]/div/div/div/div[4]/div/div/button[10]")
+            self.button.click()
 
         # Continue scraping until the last page
         i = 2
-        while i <= int(self.number):
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-
-            try:
-                WebDriverWait(self.driver, 10).until(EC.visibility_of_element_located((By.CLASS_NAME, "bili-video-card__info--tit")))
-                video_cards = self.driver.find_elements(By.CLASS_NAME, "bili-video-card")
-            except TimeoutException:
-                # Set video_cards to an empty list if there's a timeout
-                video_cards = []
-
-            for card in video_cards:
-                titles.append(card.find_element(By.CLASS_NAME, "bili-video-card__info--tit").text if card.find_elements(By.CLASS_NAME, "bili-video-card__info--tit") else None)
-                authors.append(card.find_element(By.CLASS_NAME, "bili-video-card__info--author").text if card.find_elements(By.CLASS_NAME, "bili-video-card__info--author") else None)
-                dates.append(card.find_element(By.CLASS_NAME, "bili-video-card__info--date").text if card.find_elements(By.CLASS_NAME, "bili-video-card__info--date") else None)
+        while proceed and i <= int(self.number):
+            # Wait until the cards of the previous page have been replaced
+            cards, _ = self.wait_for_cards(previous=cards)
+            proceed = self.collect(video_info, keyword, i, cards, store, incremental, sink)
 
+            if not proceed or i == int(self.number):
+                break
             if i < 6 or i >= int(self.number) - 4:
                 self.button = self.driver.find_element(By.XPATH, "/html/body/div[3]/div/div[2]/div[2]/div/div/div[2]/div/div/button[10]")
                 self.button.click()
@@ -102,6 +132,8 @@ class Bilibili:
                 self.button.click()
             i += 1
 
+        if sink is not None:
+            return sink.n_records
         data = pd.DataFrame(video_info)
         return data
 
@@ -109,8 +141,7 @@ class Bilibili:
 if __name__ == '__main__':
     bilibili = Bilibili()
     bilibili.get()
-    data = bilibili.get_video_info(keyword='python')
-    
-    # Save as a CSV file
-    data.to_csv('data/raw/bilibili_videos.csv', index=False)
+    # Save as a CSV file, page by page
+    with CrawlStore() as store, CSVSink('data/raw/bilibili_videos.csv', append=False) as sink:
+        bilibili.get_video_info(keyword='python', store=store, sink=sink)
     bilibili.close()
\ No newline at end of file
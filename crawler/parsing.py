@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/08 10:30
+@Desc: This script extracts the video cards and the number of result pages from Bilibili search result pages,
+       either offline from the page source or from the rendered page with a single script call.
+'''
+
+from html.parser import HTMLParser
+import json
+import re
+
+# The classes of the card fields, mapped to the column names of the crawled data
+CARD_CLASS = 'bili-video-card'
+FIELD_CLASSES = {
+    'bili-video-card__info--tit': 'Title',
+    'bili-video-card__info--author': 'Author',
+    'bili-video-card__info--date': 'Dates',
+}
+PAGE_BUTTON_CLASS = 'vui_pagenation--btn-num'
+
+# Elements without an end tag
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class _SearchPageParser(HTMLParser):
+    """Collects the fields of the video cards and the numbers of the pagination buttons of a search page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.cards = []
+        self.page_numbers = []
+        self._depth = 0
+        self._card = None
+        self._card_depth = None
+        self._field = None
+        self._field_depth = None
+        self._text = []
+        self._button_depth = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        self._depth += 1
+        classes = (dict(attrs).get('class') or '').split()
+        if self._card is None and CARD_CLASS in classes:
+            self._card = {column: None for column in FIELD_CLASSES.values()}
+            self._card_depth = self._depth
+        elif self._card is not None and self._field is None:
+            for css_class in classes:
+                if css_class in FIELD_CLASSES:
+                    self._field, self._field_depth, self._text = FIELD_CLASSES[css_class], self._depth, []
+                    break
+        if PAGE_BUTTON_CLASS in classes:
+            self._button_depth, self._text = self._depth, []
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags (e.g. <div/>) never contain text
+        if tag not in VOID_ELEMENTS:
+            self._depth += 1
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        if self._field is not None and self._depth == self._field_depth:
+            self._card[self._field] = ' '.join(''.join(self._text).split())
+            self._field = None
+        if self._card is not None and self._depth == self._card_depth:
+            self.cards.append(self._card)
+            self._card = None
+        if self._button_depth is not None and self._depth == self._button_depth:
+            numbers = re.findall(r'\d+', ''.join(self._text))
+            if numbers:
+                self.page_numbers.append(int(numbers[0]))
+            self._button_depth = None
+        self._depth -= 1
+
+    def handle_data(self, data):
+        if self._field is not None or self._button_depth is not None:
+            self._text.append(data)
+
+
+def parse_search_page(html):
+    """Parses a Bilibili search result page.
+
+    Args:
+        html (str): The HTML source of the page.
+
+    Returns:
+        tuple: A list of video cards, each a dict with 'Title', 'Author' and 'Dates' (None if the field is missing),
+        and the number of result pages (1 if the page has no pagination).
+    """
+    parser = _SearchPageParser()
+    parser.feed(html)
+    parser.close()
+    return parser.cards, max(parser.page_numbers, default=1)
+
+
+# Extracts the fields of all video cards and the number of result pages of the rendered page in one WebDriver round trip.
+# The page is scrolled to the bottom first, so that the lazily rendered pagination is present.
+CARD_SCRIPT = '''
+window.scrollTo(0, document.body.scrollHeight);
+const fields = %s;
+const cards = Array.from(document.querySelectorAll('.%s')).map(card => {
+    const info = {};
+    for (const [cls, column] of Object.entries(fields)) {
+        const element = card.querySelector('.' + cls);
+        info[column] = element ? element.innerText : null;
+    }
+    return info;
+});
+const pages = Array.from(document.querySelectorAll('.%s'))
+    .map(button => parseInt((button.innerText.match(/\\d+/) || [''])[0], 10))
+    .filter(number => !isNaN(number));
+return JSON.stringify({cards: cards, pages: pages.length ? Math.max(...pages) : 1});
+''' % (json.dumps(FIELD_CLASSES), CARD_CLASS, PAGE_BUTTON_CLASS)
+
+
+def parse_card_script_result(result):
+    """Parses the JSON returned by CARD_SCRIPT into the same form as parse_search_page.
+
+    Args:
+        result (str): The JSON string returned by driver.execute_script(CARD_SCRIPT).
+
+    Returns:
+        tuple: A list of video cards and the number of result pages.
+    """
+    page = json.loads(result)
+    cards = [{column: None if value is None else ' '.join(value.split()) for column, value in card.items()}
+             for card in page['cards']]
+    return cards, page['pages']
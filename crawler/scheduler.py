@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/08 11:02
+@Desc: This script crawls Bilibili search results for several keywords concurrently.
+       Every (keyword, page) pair is an independent task, spread across a bounded pool of fetchers.
+'''
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+import pandas as pd
+from .parsing import parse_search_page
+from .store import CrawlStore, STORE_PATH
+from .sinks import open_sink
+
+SEARCH_URL = 'https://search.bilibili.com/all'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+
+def search_page_url(keyword, page, search_url=SEARCH_URL) -> str:
+    """Builds the URL of a page of the search results for a keyword."""
+    return f'{search_url}?{urlencode({"keyword": keyword, "page": page})}'
+
+
+class HTTPFetcher:
+    """Fetches search result pages over plain HTTP. A single instance can be shared between threads."""
+
+    def __init__(self, search_url=SEARCH_URL, timeout=10, retries=3, backoff=1.0):
+        self.search_url = search_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    def fetch(self, keyword, page) -> str:
+        request = Request(search_page_url(keyword, page, self.search_url), headers={'User-Agent': USER_AGENT})
+        for attempt in range(self.retries):
+            try:
+                with urlopen(request, timeout=self.timeout) as response:
+                    charset = response.headers.get_content_charset() or 'utf-8'
+                    return response.read().decode(charset, errors='replace')
+            except OSError:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def close(self):
+        pass
+
+
+class BrowserFetcher:
+    """Fetches search result pages with a headless Edge session, for pages that are rendered by scripts.
+
+    A session is not thread-safe, so the scheduler creates one fetcher per worker thread.
+    """
+
+    def __init__(self, search_url=SEARCH_URL, timeout=10):
+        # Imported here so that HTTP crawling does not require Selenium
+        from selenium import webdriver
+        from selenium.webdriver.edge.options import Options as EdgeOptions
+        from selenium.webdriver.edge.service import Service as EdgeService
+        from webdriver_manager.microsoft import EdgeChromiumDriverManager
+
+        options = EdgeOptions()
+        options.add_argument('--headless=new')
+        self.search_url = search_url
+        self.timeout = timeout
+        self.driver = webdriver.Edge(service=EdgeService(EdgeChromiumDriverManager().install()), options=options)
+
+    def fetch(self, keyword, page) -> str:
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.common.by import By
+        from selenium.common.exceptions import TimeoutException
+
+        self.driver.get(search_page_url(keyword, page, self.search_url))
+        try:
+            WebDriverWait(self.driver, self.timeout).until(EC.presence_of_element_located((By.CLASS_NAME, 'bili-video-card__info--tit')))
+        except TimeoutException:
+            # A page without results is parsed as an empty page
+            pass
+        return self.driver.page_source
+
+    def close(self):
+        self.driver.quit()
+
+
+FETCHERS = {'http': HTTPFetcher, 'browser': BrowserFetcher}
+
+
+def crawl(keywords, max_pages=None, max_workers=4, fetcher='http', search_url=SEARCH_URL, store=None, incremental=False, sink=None):
+    """Crawls the search results of several keywords concurrently.
+
+    The first page of every keyword is fetched first to read its number of result pages,
+    and the remaining pages are then fetched as they are discovered.
+
+    With a crawl store, every page is recorded as soon as it is fetched. A normal crawl then resumes from the store,
+    skipping the pages that have already been visited. An incremental crawl revisits the pages of each keyword in order
+    and stops at the first page containing a video that has been seen before, since results are ordered newest first.
+
+    Args:
+        keywords (list): The keywords to search for.
+        max_pages (int, optional): The maximum number of pages to crawl per keyword. Defaults to all pages.
+        max_workers (int): The maximum number of pages fetched at the same time.
+        fetcher (str or callable): 'http', 'browser', or a factory called with search_url that returns
+            an object with fetch(keyword, page) -> html and close(). One fetcher is created per worker thread.
+        search_url (str): The search endpoint, which can point at a local stand-in server.
+        store (CrawlStore, optional): The crawl store to resume from and record to.
+        incremental (bool): Whether to only crawl the videos that are not in the store yet. Requires a store.
+        sink (Sink, optional): An output sink that the records of every page are written to as soon as the page
+            is crawled, in completion order. The records are then not kept in memory.
+
+    Returns:
+        pd.DataFrame: The video information with the columns Keyword, Page, Title, Author and Dates,
+        ordered by keyword, page and position on the page. A resumed crawl returns every stored video of the keywords,
+        an incremental crawl only the new videos. With a sink, the number of records written to the sink instead.
+
+    Raises:
+        ValueError: If an incremental crawl is requested without a store.
+    """
+    if incremental and store is None:
+        raise ValueError('An incremental crawl requires a crawl store.')
+    factory = FETCHERS[fetcher] if isinstance(fetcher, str) else fetcher
+    local = threading.local()
+    fetchers = []
+    lock = threading.Lock()
+
+    def fetch_page(keyword, page):
+        if not hasattr(local, 'fetcher'):
+            local.fetcher = factory(search_url=search_url)
+            with lock:
+                fetchers.append(local.fetcher)
+        return parse_search_page(local.fetcher.fetch(keyword, page))
+
+    keywords = list(dict.fromkeys(keywords))
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = {}
+
+            def schedule(keyword, pages):
+                for page in pages:
+                    pending[pool.submit(fetch_page, keyword, page)] = (keyword, page)
+
+            def remaining_pages(keyword, n_pages):
+                last_page = n_pages if max_pages is None else min(n_pages, max_pages)
+                visited = store.visited_pages(keyword) if store is not None else set()
+                return [page for page in range(2, last_page + 1) if page not in visited]
+
+            for keyword in keywords:
+                if store is not None and not incremental and 1 in store.visited_pages(keyword):
+                    print(f'Resuming the crawl of "{keyword}".')
+                    schedule(keyword, remaining_pages(keyword, store.page_count(keyword)))
+                else:
+                    schedule(keyword, [1])
+
+            while pending:
+                for future in as_completed(list(pending)):
+                    keyword, page = pending.pop(future)
+                    cards, n_pages = future.result()
+                    new_cards = store.record_page(keyword, page, n_pages, cards) if store is not None else cards
+                    page_cards = new_cards if incremental else cards
+                    if sink is not None:
+                        sink.write({'Keyword': keyword, 'Page': page, **card} for card in page_cards)
+                    else:
+                        results[keyword, page] = page_cards
+                    print(f'Crawled page {page} of "{keyword}" ({len(cards)} videos, {len(new_cards)} new).')
+                    if incremental:
+                        last_page = n_pages if max_pages is None else min(n_pages, max_pages)
+                        if len(new_cards) < len(cards) or not cards:
+                            print(f'Reached the videos already seen for "{keyword}".')
+                        elif page < last_page:
+                            schedule(keyword, [page + 1])
+                    elif page == 1:
+                        schedule(keyword, remaining_pages(keyword, n_pages))
+    finally:
+        for page_fetcher in fetchers:
+            page_fetcher.close()
+
+    if sink is not None:
+        return sink.n_records
+    if store is not None and not incremental:
+        return store.videos(keywords)
+    rows = [{'Keyword': keyword, 'Page': page, **card}
+            for keyword in keywords
+            for page in sorted(page for key, page in results if key == keyword)
+            for card in results[keyword, page]]
+    return pd.DataFrame(rows, columns=['Keyword', 'Page', 'Title', 'Author', 'Dates'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl Bilibili search results for several keywords.')
+    parser.add_argument('keywords', nargs='+', help='The keywords to search for.')
+    parser.add_argument('--max-pages', type=int, default=None, help='The maximum number of pages per keyword.')
+    parser.add_argument('--workers', type=int, default=4, help='The maximum number of concurrent fetchers.')
+    parser.add_argument('--fetcher', choices=sorted(FETCHERS), default='http', help='How pages are fetched.')
+    parser.add_argument('--search-url', default=SEARCH_URL, help='The search endpoint.')
+    parser.add_argument('--output', default='data/raw/bilibili_videos.csv',
+                        help='The .csv, .jsonl or .parquet output that records are appended to as pages complete '
+                             '(.parquet requires the optional pyarrow package).')
+    parser.add_argument('--store', default=STORE_PATH, help='The crawl store to resume from and record to.')
+    parser.add_argument('--no-store', action='store_true', help='Crawl without a crawl store.')
+    parser.add_argument('--incremental', action='store_true', help='Only crawl the videos not seen before.')
+    parser.add_argument('--restart', action='store_true', help='Revisit every page instead of resuming.')
+    args = parser.parse_args()
+
+    store = None if args.no_store else CrawlStore(args.store)
+    # A resumed or incremental crawl appends to the records already written
+    sink = open_sink(args.output, append=store is not None and not args.restart)
+    try:
+        if args.restart and store is not None:
+            store.reset()
+        n_records = crawl(args.keywords, max_pages=args.max_pages, max_workers=args.workers, fetcher=args.fetcher,
+                          search_url=args.search_url, store=store, incremental=args.incremental, sink=sink)
+        print(f'Wrote {n_records} records to {args.output}.')
+    finally:
+        sink.close()
+        if store is not None:
+            store.close()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/09 15:40
+@Desc: This script provides append-only sinks that crawled records are written to as each page completes,
+       so that memory stays bounded and the output can be read while the crawl is still running.
+'''
+
+import csv
+import json
+import os
+
+
+class Sink:
+    """The base class of the output sinks.
+
+    Args:
+        path (str): The output path.
+        append (bool): Whether to append to existing output instead of replacing it.
+    """
+
+    def __init__(self, path, append=True):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.append = append
+        self.n_records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, records):
+        """Writes a batch of records (dicts with the same keys) and flushes them to disk."""
+        records = list(records)
+        if records:
+            self._write(records)
+            self.n_records += len(records)
+
+    def _write(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CSVSink(Sink):
+    """Appends records to a CSV file, writing the header if the file is new or empty."""
+
+    def __init__(self, path, append=True):
+        super().__init__(path, append)
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = None
+
+    def _write(self, records):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(records[0]))
+            if self.file.tell() == 0:
+                self.writer.writeheader()
+        self.writer.writerows(records)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JSONLSink(Sink):
+    """Appends records to a JSON Lines file, one JSON object per line."""
+
+    def __init__(self, path, append=True):
+        super().__init__(path, append)
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def _write(self, records):
+        self.file.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink(Sink):
+    """Writes records to a directory of Parquet files, one file per row group.
+
+    Records are buffered until a row group is full. Every row group is written to its own file and moved into place
+    atomically, so pd.read_parquet(path) can read the completed row groups at any time during the crawl.
+
+    Args:
+        path (str): The output directory.
+        append (bool): Whether to keep the row groups already in the directory.
+        row_group_size (int): The number of records per row group.
+    """
+
+    def __init__(self, path, append=True, row_group_size=10000):
+        # Imported here so that the other sinks do not require pyarrow
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as error:
+            raise ImportError('ParquetSink requires pyarrow. Install it with "pip install pyarrow".') from error
+        self.pa = pyarrow
+        super().__init__(path, append)
+        os.makedirs(path, exist_ok=True)
+        if not append:
+            for name in os.listdir(path):
+                if name.endswith('.parquet'):
+                    os.remove(os.path.join(path, name))
+        self.row_group_size = row_group_size
+        self.buffer = []
+        self.n_groups = len([name for name in os.listdir(path) if name.endswith('.parquet')])
+
+    def _write(self, records):
+        self.buffer.extend(records)
+        while len(self.buffer) >= self.row_group_size:
+            self.flush(self.buffer[:self.row_group_size])
+            self.buffer = self.buffer[self.row_group_size:]
+
+    def flush(self, records=None):
+        """Writes the buffered records (or the given records) as a row group."""
+        if records is None:
+            records, self.buffer = self.buffer, []
+        if not records:
+            return
+        table = self.pa.Table.from_pylist(records)
+        file_path = os.path.join(self.path, f'part-{self.n_groups:05d}.parquet')
+        temp_path = file_path + '.tmp'
+        self.pa.parquet.write_table(table, temp_path)
+        os.replace(temp_path, file_path)
+        self.n_groups += 1
+
+    def close(self):
+        self.flush()
+
+
+SINKS = {'.csv': CSVSink, '.jsonl': JSONLSink, '.parquet': ParquetSink}
+
+
+def open_sink(path, append=True) -> Sink:
+    """Opens the sink matching the extension of a path (.csv, .jsonl or .parquet).
+
+    Raises:
+        ValueError: If the extension is not supported.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SINKS:
+        raise ValueError(f'Unsupported output format "{extension}". Please provide a .csv, .jsonl or .parquet path.')
+    return SINKS[extension](path, append=append)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+'''
+@Author: TZ
+@Date: 2024/10/09 09:15
+@Desc: This script persists the state of Bilibili crawls in SQLite: the keyword/page pairs already visited
+       and the videos already seen, so that crawls can resume after a crash and refresh crawls can stop early.
+'''
+
+import hashlib
+import os
+import sqlite3
+import time
+import pandas as pd
+
+STORE_PATH = 'data/raw/crawl_state.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+    keyword TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    n_pages INTEGER NOT NULL,
+    n_videos INTEGER NOT NULL,
+    crawled_at REAL NOT NULL,
+    PRIMARY KEY (keyword, page)
+);
+CREATE TABLE IF NOT EXISTS videos (
+    keyword TEXT NOT NULL,
+    video_key TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT,
+    author TEXT,
+    dates TEXT,
+    first_seen REAL NOT NULL,
+    PRIMARY KEY (keyword, video_key)
+);
+'''
+
+
+def video_key(card) -> str:
+    """Identifies a video by its title, author and date."""
+    fields = '\x1f'.join('' if card[column] is None else card[column] for column in ('Title', 'Author', 'Dates'))
+    return hashlib.sha1(fields.encode('utf-8')).hexdigest()
+
+
+class CrawlStore:
+    """The persistent state of Bilibili crawls.
+
+    Every crawled page is committed together with its videos, so a crawl that stops halfway keeps everything
+    crawled so far. Videos are deduplicated per keyword.
+
+    Args:
+        path (str): The path of the SQLite database. Defaults to STORE_PATH.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def visited_pages(self, keyword) -> set:
+        """Returns the pages of a keyword that have already been crawled."""
+        rows = self.connection.execute('SELECT page FROM pages WHERE keyword = ?', (keyword,))
+        return {page for page, in rows}
+
+    def page_count(self, keyword):
+        """Returns the number of result pages last seen for a keyword, or None if it was never crawled."""
+        row = self.connection.execute('SELECT n_pages FROM pages WHERE keyword = ? ORDER BY crawled_at DESC LIMIT 1',
+                                      (keyword,)).fetchone()
+        return None if row is None else row[0]
+
+    def record_page(self, keyword, page, n_pages, cards) -> list:
+        """Records a crawled page and its videos in one transaction.
+
+        Args:
+            keyword (str): The keyword searched for.
+            page (int): The page number.
+            n_pages (int): The number of result pages reported by the page.
+            cards (list): The video cards of the page, each a dict with 'Title', 'Author' and 'Dates'.
+
+        Returns:
+            list: The cards of videos that had not been seen for this keyword before.
+        """
+        now = time.time()
+        keys = [video_key(card) for card in cards]
+        with self.connection:
+            seen = set()
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f'SELECT video_key FROM videos WHERE keyword = ? AND video_key IN ({",".join("?" * len(batch))})',
+                    (keyword, *batch))
+                seen.update(key for key, in rows)
+
+            new_cards = []
+            for position, (key, card) in enumerate(zip(keys, cards)):
+                if key in seen:
+                    continue
+                seen.add(key)
+                new_cards.append(card)
+                self.connection.execute('INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                        (keyword, key, page, position, card['Title'], card['Author'], card['Dates'], now))
+            self.connection.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                                    (keyword, page, n_pages, len(cards), now))
+        return new_cards
+
+    def videos(self, keywords=None) -> pd.DataFrame:
+        """Returns the stored videos, ordered by keyword, page and position on the page.
+
+        Args:
+            keywords (list, optional): The keywords to return, in this order. Defaults to all keywords.
+
+        Returns:
+            pd.DataFrame: The videos with the columns Keyword, Page, Title, Author and Dates.
+        """
+        query = 'SELECT keyword, page, title, author, dates FROM videos'
+        if keywords is None:
+            rows = self.connection.execute(query + ' ORDER BY keyword, page, position').fetchall()
+        else:
+            rows = [row for keyword in keywords
+                    for row in self.connection.execute(query + ' WHERE keyword = ? ORDER BY page, position', (keyword,))]
+        return pd.DataFrame(rows, columns=['Keyword', 'Page', 'Title', 'Author', 'Dates'])
+
+    def reset(self, keyword=None):
+        """Forgets the visited pages (but not the seen videos) of a keyword, or of all keywords, to start a new crawl."""
+        with self.connection:
+            if keyword is None:
+                self.connection.execute('DELETE FROM pages')
+            else:
+                self.connection.execute('DELETE FROM pages WHERE keyword = ?', (keyword,))
@@ -8,13 +8,8 @@
 
 
 from analysis import config
-from analysis import data_loading
-from analysis import data_exploration
-from analysis import data_preprocessing
-from analysis import feature_engineering
-from analysis import model_building
-from analysis import evaluation
-from analysis import report_generation
+from functools import partial
+import argparse
 import logging
 import time
 
@@ -26,43 +21,155 @@ logging.basicConfig(
     filename=config.LOGGING_CONFIG['log_file_path'],
 )
 
-def main():
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parses the command line options of the analysis.
+
+    Only the standard library and the configuration are imported at this point, 
+    so that `python main.py --help` returns without loading pandas, scikit-learn or matplotlib.
+    """
+    parser = argparse.ArgumentParser(description='Analyze the Boston Housing dataset and generate a PDF report.')
+    parser.add_argument('--workers', type=int, default=None, 
+                        help=f"The number of stages run at once (default: {config.PIPELINE_CONFIG['max_workers']}).")
+    parser.add_argument('--no-cache', action='store_true', 
+                        help='Recompute every stage instead of reusing the stage cache of earlier runs.')
+    parser.add_argument('--profile', metavar='FUNCTION', default=config.PROFILING_CONFIG['cprofile_function'], 
+                        help='Profile the named analysis function (e.g. train_model) with cProfile.')
+    parser.add_argument('--trace-memory', action='store_true', 
+                        help='Record the peak memory of the analysis functions with tracemalloc instead of sampling the RSS.')
+    parser.add_argument('--cv', action='store_true', 
+                        help='Also cross-validate the model and compare it with a linear baseline on the same folds.')
+    parser.add_argument('--grid', action='store_true', 
+                        help='Also train the model grid of MODEL_GRID_CONFIG and report its leaderboard.')
+    parser.add_argument('--tune', action='store_true', 
+                        help=f"Also tune the hyperparameters with successive halving, within {config.TUNING_CONFIG['budget_seconds']} seconds.")
+    parser.add_argument('--cluster', action='store_true', 
+                        help="Also segment the houses with a clustering sweep over CLUSTERING_CONFIG['k_range'].")
+    return parser.parse_args(argv)
+
+
+def build_pipeline(stage_cache, renderer, registry, args=None):
+    """Defines the stages of the analysis with their inputs and outputs.
+
+    The stages are listed in report order. Preprocessing and feature selection reuse the results of 
+    unchanged stages from earlier runs through the stage cache. The optional stages are only added 
+    if their command line option is given in args.
+
+    Returns:
+        pipeline.Pipeline: The analysis pipeline.
+    """
+    from analysis import data_loading, data_exploration, data_preprocessing, feature_engineering, model_building, evaluation, pipeline
+    args = args or parse_args([])
+    analysis = pipeline.Pipeline()
+
+    # Downcast the loaded data to compact dtypes, which the later stages keep
+    if config.DTYPE_CONFIG['enabled']:
+        analysis.add('optimize_dtypes', data_loading.optimize_dtypes, inputs=('loaded_data',), outputs=('raw_data',), 
+                     chapter='Data Exploration')
+
+    # Explore the data
+    analysis.add('summary_statistics', data_exploration.summary_statistics, inputs=('raw_data',), 
+                 chapter='Data Exploration')
+
+    # Perform data preprocessing
+    analysis.add('remove_duplicates', partial(stage_cache.run, data_preprocessing.remove_duplicates), 
+                 inputs=('raw_data',), outputs=('deduplicated_data',), chapter='Data Preprocessing')
+    analysis.add('handle_missing_values', partial(stage_cache.run, data_preprocessing.handle_missing_values), 
+                 inputs=('deduplicated_data',), outputs=('complete_data',), chapter='Data Preprocessing', method='front')
+    analysis.add('handle_outliers', partial(stage_cache.run, data_preprocessing.handle_outliers), 
+                 inputs=('complete_data',), outputs=('clean_data',), chapter='Data Preprocessing', 
+                 method='iqr', negative_values=True, renderer=renderer)
+
+    # Perform feature engineering
+    analysis.add('visualize_features', feature_engineering.visualize_features, inputs=('clean_data',), 
+                 chapter='Feature Engineering', feature_list=['INDUS', 'RM', 'TAX', 'LSTAT', 'MEDV'], renderer=renderer)
+    analysis.add('select_features', partial(stage_cache.run, feature_engineering.select_features), 
+                 inputs=('clean_data',), outputs=('data',), chapter='Feature Engineering', 
+                 method='correlation', threshold=0.4, renderer=renderer)
+
+    # Build and evaluate a machine learning model
+    # The fitted model is saved to the model registry, from which analysis.inference can score new data
+    chapter = 'Model Building and Evaluation'
+    analysis.add('train_model', model_building.train_model, inputs=('data',), outputs=('y_test', 'y_pred'), chapter=chapter, 
+                 problem_type='regression', method='decision_tree', registry=registry, name='boston_housing')
+    analysis.add('evaluate_model', evaluation.evaluate_model, inputs=('y_test', 'y_pred'), chapter=chapter, 
+                 problem_type='regression', renderer=renderer)
+
+    # Cross-validate the model for more reliable metrics
+    if args.cv:
+        analysis.add('cross_validate_model', model_building.cross_validate_model, inputs=('data',), 
+                     outputs=('y_true', 'y_oof', 'fold_scores'), chapter=chapter, problem_type='regression', method='decision_tree')
+        analysis.add('evaluate_cross_validation', evaluation.evaluate_model, 
+                     inputs={'y_test': 'y_true', 'y_pred': 'y_oof', 'fold_scores': 'fold_scores'}, chapter=chapter, 
+                     problem_type='regression', renderer=renderer, title='Cross-Validation Evaluation')
+
+        # Compare the model with a linear baseline on the same folds, with a paired bootstrap
+        analysis.add('cross_validate_baseline', model_building.cross_validate_model, inputs=('data',), 
+                     outputs=(None, 'y_baseline', None), chapter=chapter, problem_type='regression', method='linear_regression')
+        analysis.add('compare_models', evaluation.compare_models, inputs=('y_true', 'y_oof', 'y_baseline'), chapter=chapter, 
+                     problem_type='regression', names=('Decision Tree', 'Linear Regression'))
+
+    # Compare several models and hyperparameters
+    if args.grid:
+        analysis.add('train_model_grid', model_building.train_model_grid, inputs=('data',), chapter=chapter, problem_type='regression')
+
+    # Tune the hyperparameters within the wall-clock budget
+    if args.tune:
+        analysis.add('tune_model', model_building.tune_model, inputs=('data',), chapter=chapter, problem_type='regression')
+
+    # Segment the houses, sweeping the number of clusters
+    if args.cluster:
+        analysis.add('cluster_sweep', model_building.cluster_sweep, inputs=('data',), chapter=chapter)
+
+    return analysis
+
+
+def main(args=None):
     # Start the timer
     start_time = time.time()
+    args = args or parse_args([])
+
+    # The analysis modules are imported here rather than at the top, so that parsing the options stays fast
+    from analysis import caching, data_loading, model_registry, report_generation, rendering, profiling
+    import pandas as pd
+    config.PROFILING_CONFIG['cprofile_function'] = args.profile
+    config.PROFILING_CONFIG['trace_memory'] = config.PROFILING_CONFIG['trace_memory'] or args.trace_memory
+    
+    # Record the calls of the instrumented analysis functions
+    run_profile = profiling.start_run()
 
     # Create a PDF object
     pdf = report_generation.PDF()
     pdf.cover_page('Boston Housing', 'ZHAO Cheng', '2024/09/06')
 
-    # Load data
-    data = data_loading.load_data('csv')
-    
-    # Explore the data
-    pdf.add_page()
-    pdf.chapter_title('Data Exploration')
-    data_exploration.summary_statistics(data, pdf)
-    
-    
-    # Perform data preprocessing
-    pdf.add_page()
-    pdf.chapter_title('Data Preprocessing')
-    data = data_preprocessing.remove_duplicates(data, pdf=pdf)
-    data = data_preprocessing.handle_missing_values(data, method='front', pdf=pdf)
-    data = data_preprocessing.handle_outliers(data, method='iqr', negative_values=True, pdf=pdf)
-    
-    # Perform feature engineering
-    pdf.add_page()
-    pdf.chapter_title('Feature Engineering')
-    feature_list = ['INDUS', 'RM', 'TAX', 'LSTAT', 'MEDV']
-    feature_engineering.visualize_features(data, feature_list, pdf=pdf)
-    data = feature_engineering.select_features(data, method='correlation', threshold=0.4, pdf=pdf)
+    # Figures are rendered in the background, and the report sections are added to the PDF once everything has run
+    renderer = rendering.FigureRenderer()
 
-    # Build and evaluate a machine learning model
-    pdf.add_page()
-    pdf.chapter_title('Model Building and Evaluation')
-    y_test, y_pred = model_building.train_model(data, problem_type='regression', method='decision_tree', pdf=pdf)
-    evaluation.evaluate_model(y_test, y_pred, problem_type='regression', pdf=pdf)
+    # Load data in chunks, reporting how far ingestion has got
+    chunks = data_loading.load_data('csv', 
+                                    chunksize=config.DATA_LOADING_CONFIG['chunk_size'],
+                                    progress=data_loading.print_progress)
+    data = pd.concat(chunks, ignore_index=True)
+
+    # Run the analysis as a pipeline, in which independent stages run concurrently
+    stage_cache = caching.StageCache(enabled=False if args.no_cache else None)
+    registry = model_registry.ModelRegistry()
+    analysis = build_pipeline(stage_cache, renderer, registry, args)
+    # scikit-learn is imported before the stages start, as concurrent first imports of it can fail
+    from analysis import model_building
+    analysis.run({'loaded_data' if config.DTYPE_CONFIG['enabled'] else 'raw_data': data}, max_workers=args.workers, 
+                 preload=model_building.estimator_modules())
     
+    # Add the report sections to the PDF in the order of the stages, waiting for the remaining figures
+    analysis.report(pdf)
+    renderer.close()
+    stage_cache.flush()
+
+    # Save the run record, and add the timings of the analysis functions to the report
+    run_profile.save()
+    if config.PROFILING_CONFIG['pdf_appendix']:
+        run_profile.report(pdf)
+
     # Save PDF reports
     pdf.save_pdf()
     
@@ -76,4 +183,4 @@ def main():
     print('Time elapsed:', end_time - start_time, 'seconds.')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main(parse_args())
\ No newline at end of file
@@ -0,0 +1,101 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+
+class SearchSite:
+    """The search results served by the stand-in server, as keyword -> pages -> (title, author, date) videos."""
+
+    def __init__(self):
+        self.results = {}
+        self.requests = []
+        # The (keyword, page) pairs that fail with a server error
+        self.failing = set()
+        self.delay = 0.02
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.max_in_flight = 0
+
+    def video(self, keyword, page, position):
+        return (f'{keyword} video {page}-{position}', f'author {position}', f'· 2024-10-{page:02d}')
+
+    def add_keyword(self, keyword, n_pages, per_page=3):
+        self.results[keyword] = [[self.video(keyword, page, position) for position in range(per_page)]
+                                 for page in range(1, n_pages + 1)]
+
+    def set_videos(self, keyword, videos, per_page=3):
+        self.results[keyword] = [videos[start:start + per_page] for start in range(0, len(videos), per_page)]
+
+    def videos(self, keyword):
+        return [video for page in self.results[keyword] for video in page]
+
+    def records(self, keyword, pages=None):
+        pages = range(1, len(self.results[keyword]) + 1) if pages is None else pages
+        return [{'Keyword': keyword, 'Page': page, 'Title': title, 'Author': author, 'Dates': date}
+                for page in pages for title, author, date in self.results[keyword][page - 1]]
+
+    def render(self, keyword, page):
+        pages = self.results.get(keyword, [])
+        videos = pages[page - 1] if 1 <= page <= len(pages) else []
+        cards = ''.join(
+            '<div class="bili-video-card"><div class="bili-video-card__wrap">'
+            f'<h3 class="bili-video-card__info--tit" title="{title}">{title}</h3>'
+            f'<span class="bili-video-card__info--author">{author}</span>'
+            f'<span class="bili-video-card__info--date"> {date} </span>'
+            '</div></div>' for title, author, date in videos)
+        # Like the real pagination, only a window of page buttons around the current page is shown,
+        # but the last page is always present
+        numbers = sorted({*range(max(page - 2, 1), min(page + 2, len(pages)) + 1), len(pages)}) if len(pages) > 1 else []
+        buttons = ''.join(f'<button class="vui_button vui_pagenation--btn vui_pagenation--btn-num">{number}</button>'
+                          for number in numbers)
+        return f'<html><body><div class="video-list">{cards}</div><div class="vui_pagenation">{buttons}</div></body></html>'
+
+    def handle(self, keyword, page):
+        with self._lock:
+            self.requests.append((keyword, page))
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            time.sleep(self.delay)
+            return self.render(keyword, page)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+@pytest.fixture
+def search_site():
+    """A local stand-in for the search endpoint, yielding the SearchSite with its search URL as site.url."""
+    site = SearchSite()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            keyword, page = query['keyword'][0], int(query['page'][0])
+            if (keyword, page) in site.failing:
+                site.requests.append((keyword, page))
+                self.send_error(503)
+                return
+            body = site.handle(keyword, page).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    site.url = f'http://127.0.0.1:{server.server_address[1]}/all'
+    try:
+        yield site
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
@@ -0,0 +1,95 @@
+import json
+import os
+import time
+
+import pytest
+
+from benchmarks import run
+
+
+def record(benchmark='data_loading.load_data', rows=1000, machine='host', status='ok', seconds=1.0, **fields):
+    dataset = {'extra_columns': 0, 'missing_rate': 0.01, 'duplicate_rate': 0.01, 'outlier_rate': 0.005, 'seed': 42}
+    return {'run': fields.pop('run', 'r'), 'benchmark': benchmark, 'rows': rows, 'machine': machine, 'status': status,
+            'min_seconds': seconds, **dataset, **fields}
+
+
+def test_find_baseline_returns_the_latest_successful_record_of_the_same_case():
+    history = [record(run='1', seconds=1.0),
+               record(run='2', seconds=2.0),
+               record(run='3', status='failed'),
+               record(run='4', rows=2000),
+               record(run='5', machine='other'),
+               record(run='6', seed=7),
+               record(run='7', benchmark='main')]
+
+    assert run.find_baseline(history, record())['run'] == '2'
+    assert run.find_baseline(history, record(rows=2000))['run'] == '4'
+    assert run.find_baseline(history, record(missing_rate=0.5)) is None
+    assert run.find_baseline([], record()) is None
+
+
+@pytest.mark.parametrize('seconds, baseline_seconds, regression', [
+    (1.3, 1.0, True),      # 30 % slower
+    (1.1, 1.0, False),     # within the threshold
+    (0.5, 1.0, False),     # faster
+    (0.03, 0.01, False),   # 200 % slower, but within the noise floor
+])
+def test_compare_flags_slowdowns_above_the_threshold_and_the_noise_floor(seconds, baseline_seconds, regression):
+    current = record(seconds=seconds)
+
+    run._compare(current, record(run='base', seconds=baseline_seconds), threshold=0.2)
+
+    assert current['regression'] == regression
+    assert current['baseline_run'] == 'base'
+    assert current['change'] == pytest.approx(seconds / baseline_seconds - 1)
+
+
+@pytest.mark.parametrize('current, baseline', [(record(status='failed'), record()), (record(), None)])
+def test_compare_does_not_flag_without_two_timings(current, baseline):
+    run._compare(current, baseline, threshold=0.2)
+
+    assert current['regression'] is False
+    assert 'change' not in current
+
+
+def test_run_benchmarks_appends_to_the_history_and_compares_with_it(tmp_path, monkeypatch):
+    history_path = str(tmp_path / 'history' / 'history.jsonl')
+    cwd = os.getcwd()
+
+    def fake_benchmarks():
+        return {'fast': (lambda context: None, None),
+                'failing': (lambda context: 1 / 0, None),
+                'in memory only': (lambda context: None, 100)}
+
+    monkeypatch.setattr(run, '_benchmarks', fake_benchmarks)
+    monkeypatch.setattr(run, 'prepare_context', lambda path, rows: {'path': path})
+    first = run.run_benchmarks([200], repeat=1, include_main=False, history_path=history_path)
+
+    assert os.getcwd() == cwd
+    assert dict(zip(first['benchmark'], first['status'])) == {'fast': 'ok', 'failing': 'failed', 'in memory only': 'skipped'}
+    assert first['error'][first['benchmark'] == 'failing'].iloc[0].startswith('ZeroDivisionError')
+    assert not first['regression'].any() and 'baseline_seconds' not in first
+
+    # A second run is compared with the first, and the slowdown of a benchmark is flagged
+    monkeypatch.setattr(run, '_benchmarks', lambda: {'fast': (lambda context: time.sleep(0.2), None)})
+    second = run.run_benchmarks([200], repeat=1, include_main=False, history_path=history_path)
+
+    assert second['regression'].tolist() == [True]
+    assert second['baseline_seconds'].iloc[0] == first['min_seconds'][first['benchmark'] == 'fast'].iloc[0]
+    with open(history_path) as file:
+        history = [json.loads(line) for line in file]
+    assert [entry['benchmark'] for entry in history] == ['fast', 'failing', 'in memory only', 'fast']
+    assert history[-1]['regression'] is True
+
+
+def test_run_benchmarks_times_the_analysis_functions_on_a_tiny_dataset(tmp_path):
+    history_path = str(tmp_path / 'history.jsonl')
+
+    results = run.run_benchmarks([300], repeat=1, include=['load_data', 'remove_duplicates', 'evaluate_model'],
+                                 include_main=False, data_dir=str(tmp_path), history_path=history_path)
+
+    assert sorted(results['benchmark']) == ['data_loading.load_data', 'data_preprocessing.remove_duplicates',
+                                            'evaluation.evaluate_model']
+    assert (results['status'] == 'ok').all(), results.get('error')
+    assert (results['min_seconds'] > 0).all()
+    assert len(run.load_history(history_path)) == 3
@@ -0,0 +1,148 @@
+import os
+import pickle
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import caching, data_loading, data_preprocessing
+from analysis.config import OUTLIER_CONFIG
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'a': rng.normal(size=200), 'b': rng.normal(size=200)})
+
+
+def key(data, **params):
+    return caching.stage_key(data_preprocessing.handle_outliers, data, dict(method='iqr', **params))
+
+
+def test_stage_key_is_stable(data):
+    assert key(data) == key(data)
+    assert key(data) != key(data, negative_values=True)
+    assert key(data) != key(data.iloc[1:])
+
+
+def test_stage_key_covers_the_configuration_the_stage_reads(data, monkeypatch):
+    before = key(data)
+    monkeypatch.setitem(OUTLIER_CONFIG, 'iqr_factor', 3.0)
+    assert key(data) != before
+
+
+def test_stage_key_covers_the_helpers_the_stage_calls(data, monkeypatch):
+    before = key(data)
+
+    def iqr_bounds(data, approximate=False):
+        return None
+
+    monkeypatch.setattr(data_preprocessing, 'iqr_bounds', iqr_bounds)
+    assert key(data) != before
+
+
+def test_stage_cache_treats_unreadable_entries_as_misses(data, tmp_path, monkeypatch):
+    cache = caching.StageCache(cache_dir=str(tmp_path), enabled=True)
+    calls = []
+
+    def stage(data, pdf=None):
+        calls.append(len(data))
+        return data.head()
+
+    # An entry holding an instance of a class that no longer exists
+    module = types.ModuleType('removed_module')
+    module.Removed = type('Removed', (), {'__module__': 'removed_module'})
+    monkeypatch.setitem(sys.modules, 'removed_module', module)
+    entry = pickle.dumps({'data': module.Removed()})
+    monkeypatch.delitem(sys.modules, 'removed_module')
+    (tmp_path / f'{caching.stage_key(stage, data, {})}.pkl').write_bytes(entry)
+
+    pd.testing.assert_frame_equal(cache.run(stage, data), data.head())
+    pd.testing.assert_frame_equal(cache.run(stage, data), data.head())
+    assert calls == [len(data)]
+
+
+@pytest.fixture
+def document(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 1000
+    data = pd.DataFrame({'id': np.arange(n),
+                         'price': rng.normal(100, 10, size=n).round(2),
+                         'name': rng.choice(['alpha', 'beta', 'gamma delta', 'ünïcode', ''], size=n),
+                         'city': rng.choice(['Paris', 'Lyon', None], size=n),
+                         'flag': rng.random(n) < 0.5})
+    path = tmp_path / 'document.csv'
+    data.to_csv(path, index=False)
+    return str(path)
+
+
+def cache_files_load_without_pickle(cache):
+    for name in os.listdir(cache.cache_dir):
+        if name.endswith('.npy'):
+            np.load(os.path.join(cache.cache_dir, name), allow_pickle=False)
+
+
+def test_columnar_cache_restores_the_parsed_dtypes_without_pickle(document):
+    parsed = pd.read_csv(document)
+
+    first = data_loading.load_data('csv', document, use_cache=True)
+    cached = data_loading.load_data('csv', document, use_cache=True)
+
+    cache = caching.ColumnarCache(document)
+    assert cache.is_valid()
+    cache_files_load_without_pickle(cache)
+    # Copied, as the numeric columns are memory-mapped
+    pd.testing.assert_frame_equal(first.copy(), parsed)
+    pd.testing.assert_frame_equal(cached.copy(), parsed)
+    assert cached['name'].dtype == parsed['name'].dtype and cached['city'].isna().sum() == parsed['city'].isna().sum()
+
+
+def test_columnar_cache_streams_the_parsed_chunks(document):
+    parsed = pd.concat(pd.read_csv(document, chunksize=300), ignore_index=True)
+
+    first = pd.concat(data_loading.load_data('csv', document, chunksize=300, use_cache=True), ignore_index=True)
+    cached = pd.concat(data_loading.load_data('csv', document, chunksize=300, use_cache=True), ignore_index=True)
+    projected = caching.ColumnarCache(document).load(usecols=['city', 'id'])
+
+    pd.testing.assert_frame_equal(first, parsed)
+    pd.testing.assert_frame_equal(cached, parsed)
+    pd.testing.assert_frame_equal(projected, parsed[['id', 'city']])
+
+
+def test_columnar_cache_skips_columns_it_cannot_store_without_pickle(tmp_path):
+    source = tmp_path / 'document.xlsx'
+    source.write_bytes(b'stand-in')
+    cache = caching.ColumnarCache(str(source))
+    mixed = pd.DataFrame({'value': [1, 'a', 2.5], 'text': ['x', 'y', 'z']})
+
+    chunks = list(cache.build([mixed]))
+
+    assert len(chunks) == 1 and chunks[0] is mixed
+    assert not cache.is_valid()
+    assert not os.path.exists(cache.cache_dir)
+
+
+@pytest.mark.parametrize('chunksize', [None, 2])
+def test_explicit_dtypes_keep_leading_zeros_through_the_cache(tmp_path, chunksize):
+    path = tmp_path / 'addresses.csv'
+    path.write_text('zip,rooms\n01234,3\n00012,4\n98765,5\n')
+
+    def load(**options):
+        data = data_loading.load_data('csv', str(path), chunksize=chunksize, **options)
+        return data if chunksize is None else pd.concat(data, ignore_index=True)
+
+    # The first load builds the cache of the explicit dtypes, the second one reads it
+    uncached = load(dtype={'zip': str}, use_cache=False)
+    first = load(dtype={'zip': str}, use_cache=True)
+    cached = load(dtype={'zip': str}, use_cache=True)
+    inferred = load(use_cache=True)
+
+    assert uncached['zip'].tolist() == ['01234', '00012', '98765']
+    pd.testing.assert_frame_equal(first.copy(), uncached)
+    pd.testing.assert_frame_equal(cached.copy(), uncached)
+    assert caching.ColumnarCache(str(path), dtype={'zip': str}).is_valid()
+    # The cache of the inferred dtypes is separate
+    assert inferred['zip'].tolist() == [1234, 12, 98765]
+    assert load(dtype={'zip': str}, use_cache=True)['zip'].tolist() == ['01234', '00012', '98765']
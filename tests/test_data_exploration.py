@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.data_exploration import summary_statistics
+from analysis.streaming import StatisticsAccumulator
+
+MOMENTS = ['count', 'mean', 'std', 'min', 'max']
+
+
+def make_data(rng, n):
+    data = pd.DataFrame({'price': rng.lognormal(3, 1, size=n),
+                         'rooms': rng.integers(1, 9, size=n),
+                         'shifted': rng.normal(1e6, 1, size=n),
+                         'city': rng.choice(['Paris', 'Lyon', 'Nice'], size=n)})
+    data.loc[rng.random(n) < 0.1, 'price'] = np.nan
+    data.loc[rng.random(n) < 0.05, 'city'] = None
+    return data
+
+
+def split(data, rng, n_chunks):
+    """Splits the rows at random points into n_chunks chunks, some of which may be empty."""
+    cuts = np.sort(rng.integers(0, len(data) + 1, size=n_chunks - 1))
+    return [data.iloc[start:stop] for start, stop in zip([0, *cuts], [*cuts, len(data)])]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_merged_chunk_accumulators_match_describe(seed):
+    rng = np.random.default_rng(seed)
+    data = make_data(rng, int(rng.integers(2000, 6000)))
+    parts = []
+    for chunk in split(data, rng, int(rng.integers(2, 20))):
+        part = StatisticsAccumulator(seed=seed)
+        part.update(chunk)
+        parts.append(part)
+
+    total = StatisticsAccumulator()
+    for part in parts[::-1]:
+        total.merge(part)
+
+    expected = data.describe().loc[MOMENTS]
+    pd.testing.assert_frame_equal(total.describe().loc[MOMENTS], expected, rtol=1e-9)
+    assert total.n_rows == len(data)
+    pd.testing.assert_series_equal(total.null_counts, data.isnull().sum())
+    assert total.total_missing() == data.isnull().sum().sum()
+    assert len(total.sample) == 5 and total.sample.index.isin(data.index).all()
+
+
+def test_summary_statistics_accepts_a_dataframe_chunks_or_an_accumulator(capsys):
+    rng = np.random.default_rng(0)
+    # Fewer rows than the sketch size, so the quartiles are exact as well
+    data = make_data(rng, 600)
+    chunks = split(data, rng, 7)
+    accumulator = StatisticsAccumulator()
+    for chunk in chunks[:3]:
+        accumulator.update(chunk)
+    rest = StatisticsAccumulator()
+    for chunk in chunks[3:]:
+        rest.update(chunk)
+    accumulator.merge(rest)
+
+    results = [summary_statistics(data), summary_statistics(iter(chunks)), summary_statistics(accumulator)]
+
+    assert results[2] is accumulator
+    for stats in results:
+        pd.testing.assert_frame_equal(stats.describe(), data.describe(), rtol=1e-9)
+        pd.testing.assert_frame_equal(stats.info(), results[0].info())
+        assert (stats.n_rows, stats.n_columns, stats.total_missing()) == (600, 4, data.isnull().sum().sum())
+    assert capsys.readouterr().out.count(f'Total number of missing values:  {data.isnull().sum().sum()}') == 3
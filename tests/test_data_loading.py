@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import data_loading
+from analysis.config import DTYPE_CONFIG
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        'code': np.array([0, 1, 1, 0], dtype=np.int64),
+        'negative': np.array([-3, 1, 2, 300], dtype=np.int64),
+        'whole': [1.0, 24.0, np.nan, 5.0],
+        'short': [0.00632, 396.9, 6.575, 15.3],
+        'precise': [123456789.123, 1.0, 2.0, 3.0],
+        'author': ['a', 'b', 'a', 'a'],
+        'title': ['w', 'x', 'y', 'z'],
+    })
+
+
+def test_optimize_dtypes_is_lossless_by_default(data):
+    optimized = data_loading.optimize_dtypes(data)
+
+    assert optimized['code'].dtype == np.uint8
+    assert optimized['negative'].dtype == np.int16
+    assert optimized['whole'].dtype == np.float32
+    assert optimized['short'].dtype == np.float64
+    assert optimized['precise'].dtype == np.float64
+    assert isinstance(optimized['author'].dtype, pd.CategoricalDtype)
+    assert not isinstance(optimized['title'].dtype, pd.CategoricalDtype)
+    numeric = ['code', 'negative', 'whole', 'short', 'precise']
+    pd.testing.assert_frame_equal(optimized[numeric].astype(np.float64), data[numeric].astype(np.float64))
+
+
+def test_optimize_dtypes_keeps_short_decimals_in_decimal_mode(data, monkeypatch):
+    monkeypatch.setitem(DTYPE_CONFIG, 'float_downcast', 'decimal')
+    optimized = data_loading.optimize_dtypes(data)
+
+    assert optimized['short'].dtype == np.float32
+    assert [float(str(value)) for value in optimized['short'].to_numpy()] == data['short'].tolist()
+    # 123456789.123 has more significant digits than float32 can keep
+    assert optimized['precise'].dtype == np.float64
+
+
+def test_is_short_decimal():
+    values = np.array([0.0, 0.1, -2.5e-5, 396.9, 123456.0, 1234567.0, np.pi, 123456789.123, 1e40, np.nan])
+    assert data_loading._is_short_decimal(values).tolist() == [True, True, True, True, True, False, False, False, False, False]
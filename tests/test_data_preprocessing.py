@@ -0,0 +1,22 @@
+import os
+
+import pandas as pd
+import pytest
+
+from analysis import data_preprocessing
+from analysis.config import DATA_PATH, PROCESSED_DATA_CONFIG
+
+
+@pytest.mark.parametrize('save_steps', [False, True])
+def test_cleaning_steps_only_save_their_data_if_enabled(tmp_path, monkeypatch, save_steps):
+    monkeypatch.setitem(DATA_PATH, 'processed', str(tmp_path / 'processed'))
+    monkeypatch.setitem(PROCESSED_DATA_CONFIG, 'save_steps', save_steps)
+    data = pd.DataFrame({'a': [1, 1, 2], 'b': [3, 3, 4]})
+
+    result = data_preprocessing.remove_duplicates(data)
+
+    assert len(result) == 2
+    path = tmp_path / 'processed' / 'data_drop_duplicates.csv'
+    assert os.path.exists(path) == save_steps
+    if save_steps:
+        pd.testing.assert_frame_equal(pd.read_csv(path), result.reset_index(drop=True))
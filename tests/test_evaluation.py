@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import metrics
+
+from analysis.config import BOOTSTRAP_CONFIG
+from analysis.evaluation import (ClassificationMetrics, RegressionMetrics, batch_metrics, bootstrap_metrics, clustering_metrics,
+                                 compare_models, compute_metrics, metric_accumulator)
+
+
+def random_chunks(rng, n, n_chunks):
+    """Splits the positions 0..n-1 at random points into n_chunks chunks, some of which may be empty."""
+    cuts = np.sort(rng.integers(0, n + 1, size=n_chunks - 1))
+    return np.split(np.arange(n), cuts)
+
+
+def merged(problem_type, y_true, y_pred, chunks, rng):
+    """Accumulates every chunk separately and merges the accumulators in a random order and grouping."""
+    parts = []
+    for chunk in chunks:
+        part = metric_accumulator(problem_type)
+        part.update(y_true[chunk], y_pred[chunk])
+        parts.append(part)
+    rng.shuffle(parts)
+    # Merge the first half pairwise into the second, then everything into one accumulator
+    half = len(parts) // 2
+    for left, right in zip(parts[:half], parts[half:]):
+        right.merge(left)
+    total = metric_accumulator(problem_type)
+    for part in parts[half:]:
+        total.merge(part)
+    return total
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_merged_regression_metrics_match_sklearn(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(500, 5000))
+    y_true = rng.normal(100, 20, size=n)
+    y_pred = y_true + rng.normal(0, 5, size=n)
+
+    total = merged('regression', y_true, y_pred, random_chunks(rng, n, int(rng.integers(1, 30))), rng)
+
+    result = total.result()
+    assert isinstance(total, RegressionMetrics)
+    assert result['R^2'] == pytest.approx(metrics.r2_score(y_true, y_pred), rel=1e-10)
+    assert result['MAE'] == pytest.approx(metrics.mean_absolute_error(y_true, y_pred), rel=1e-10)
+    assert result['MSE'] == pytest.approx(metrics.mean_squared_error(y_true, y_pred), rel=1e-10)
+    assert np.sqrt(result['MSE']) == pytest.approx(metrics.root_mean_squared_error(y_true, y_pred), rel=1e-10)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('labels', [np.array(['high', 'low', 'medium', 'none', 'rare']), np.array([3, 1, 4, 0, 2])])
+def test_merged_classification_metrics_match_sklearn(seed, labels):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(500, 5000))
+    # Sorting the true labels leaves most labels out of most chunks, and 'rare' only appears in predictions
+    y_true = np.sort(rng.choice(labels[:4], size=n, p=[0.5, 0.3, 0.15, 0.05]))
+    y_pred = np.where(rng.random(n) < 0.7, y_true, rng.choice(labels, size=n))
+
+    total = merged('classification', y_true, y_pred, random_chunks(rng, n, int(rng.integers(2, 30))), rng)
+
+    result = total.result()
+    assert isinstance(total, ClassificationMetrics)
+    assert sorted(total.labels) == sorted(labels)
+    assert result['Accuracy'] == pytest.approx(metrics.accuracy_score(y_true, y_pred))
+    for name, score in (('Precision', metrics.precision_score), ('Recall', metrics.recall_score), ('F1', metrics.f1_score)):
+        assert result[name] == pytest.approx(score(y_true, y_pred, average='weighted', zero_division=0)), name
+    np.testing.assert_array_equal(total.confusion_matrix().to_numpy(),
+                                  metrics.confusion_matrix(y_true, y_pred, labels=total.labels.to_numpy()))
+
+
+def test_a_label_seen_again_is_not_added_twice():
+    accumulator = ClassificationMetrics()
+    accumulator.update(['a', 'b'], ['a', 'a'])
+    accumulator.update(['b', 'c'], ['c', 'b'])
+
+    assert list(accumulator.labels) == ['a', 'b', 'c']
+    assert accumulator.positions == {'a': 0, 'b': 1, 'c': 2}
+    assert accumulator.matrix.sum() == 4
+
+
+@pytest.mark.parametrize('problem_type', ['regression', 'classification'])
+def test_batch_metrics_match_sklearn_on_every_resample(problem_type):
+    rng = np.random.default_rng(0)
+    n, n_resamples = 300, 20
+    if problem_type == 'regression':
+        y_true = rng.normal(size=n)
+        y_preds = [y_true + rng.normal(0, 0.5, size=n), np.full(n, y_true.mean())]
+    else:
+        # Label codes, where code 3 is rare enough to be missing from some resamples
+        y_true = rng.choice(4, size=n, p=[0.5, 0.3, 0.18, 0.02])
+        y_preds = [np.where(rng.random(n) < 0.8, y_true, rng.integers(0, 4, size=n)), np.zeros(n, dtype=int)]
+    index = rng.integers(0, n, size=(n_resamples, n))
+
+    results = batch_metrics(y_true, y_preds, index, problem_type)
+
+    for y_pred, result in zip(y_preds, results):
+        for resample, rows in enumerate(index):
+            truth, prediction = y_true[rows], y_pred[rows]
+            if problem_type == 'regression':
+                expected = {'MSE': metrics.mean_squared_error(truth, prediction),
+                            'MAE': metrics.mean_absolute_error(truth, prediction),
+                            'R^2': metrics.r2_score(truth, prediction)}
+            else:
+                expected = {'Accuracy': metrics.accuracy_score(truth, prediction),
+                            'Precision': metrics.precision_score(truth, prediction, average='weighted', zero_division=0),
+                            'Recall': metrics.recall_score(truth, prediction, average='weighted', zero_division=0),
+                            'F1': metrics.f1_score(truth, prediction, average='weighted', zero_division=0)}
+            for name, value in expected.items():
+                assert result[name][resample] == pytest.approx(value, abs=1e-12), (name, resample)
+
+
+def blobs(rng, n, centers):
+    labels = rng.integers(0, len(centers), size=n)
+    return np.asarray(centers, dtype=float)[labels] + rng.normal(size=(n, len(centers[0]))), labels
+
+
+def test_clustering_metrics_match_sklearn_below_the_sample_size():
+    X, labels = blobs(np.random.default_rng(0), 300, [(0, 0), (4, 0), (0, 4)])
+
+    result = clustering_metrics(X, labels, sample_size=1000)
+
+    assert result['Silhouette'] == pytest.approx(metrics.silhouette_score(X, labels))
+    assert result['Calinski-Harabasz'] == pytest.approx(metrics.calinski_harabasz_score(X, labels))
+    assert result['Davies-Bouldin'] == pytest.approx(metrics.davies_bouldin_score(X, labels))
+
+
+def test_the_sampled_silhouette_is_close_to_the_exact_one():
+    X, labels = blobs(np.random.default_rng(1), 3000, [(0, 0), (4, 0), (0, 4), (4, 4)])
+
+    sampled = clustering_metrics(X, labels, sample_size=500, random_state=0)['Silhouette']
+
+    assert sampled == pytest.approx(metrics.silhouette_score(X, labels), abs=0.03)
+    assert sampled == metrics.silhouette_score(X, labels, sample_size=500, random_state=0)
+
+
+@pytest.mark.parametrize('labels', [np.zeros(10, dtype=int), np.arange(10)])
+def test_clustering_metrics_are_nan_without_a_clustering(labels):
+    X = np.random.default_rng(0).normal(size=(10, 2))
+
+    assert all(np.isnan(value) for value in clustering_metrics(X, labels).values())
+
+
+def regression_predictions(rng, n=400):
+    y_true = rng.normal(20, 5, size=n)
+    good = y_true + rng.normal(0, 1, size=n)
+    worse = y_true + rng.normal(0, 4, size=n)
+    return y_true, good, worse
+
+
+@pytest.mark.parametrize('problem_type', ['regression', 'classification'])
+def test_bootstrap_intervals_bracket_the_point_estimates(problem_type):
+    rng = np.random.default_rng(0)
+    if problem_type == 'regression':
+        y_true, y_pred, _ = regression_predictions(rng)
+    else:
+        y_true = rng.choice(['a', 'b', 'c'], size=400)
+        y_pred = np.where(rng.random(400) < 0.8, y_true, rng.choice(['a', 'b', 'c'], size=400))
+
+    intervals = bootstrap_metrics(y_true, y_pred, problem_type, n_resamples=500, random_state=0)
+
+    estimates = compute_metrics(y_true, y_pred, problem_type)
+    assert intervals['Metric'].tolist() == list(estimates)
+    assert intervals['Estimate'].tolist() == pytest.approx(list(estimates.values()))
+    assert (intervals['Lower'] < intervals['Estimate']).all() and (intervals['Estimate'] < intervals['Upper']).all()
+    assert (intervals['Std Error'] > 0).all()
+    assert intervals.attrs['n_resamples'] == 500
+    pd.testing.assert_frame_equal(intervals, bootstrap_metrics(y_true, y_pred, problem_type, n_resamples=500, random_state=0))
+
+
+def test_bootstrap_batches_draw_the_same_resamples(monkeypatch):
+    y_true, y_pred, _ = regression_predictions(np.random.default_rng(0))
+    whole = bootstrap_metrics(y_true, y_pred, 'regression', n_resamples=100, random_state=0)
+
+    # Seven resamples per batch
+    monkeypatch.setitem(BOOTSTRAP_CONFIG, 'max_batch_elements', 7 * len(y_true))
+    batched = bootstrap_metrics(y_true, y_pred, 'regression', n_resamples=100, random_state=0)
+
+    pd.testing.assert_frame_equal(batched, whole)
+
+
+def test_compare_models_flags_a_clearly_worse_baseline():
+    y_true, good, worse = regression_predictions(np.random.default_rng(0))
+
+    comparison = compare_models(y_true, good, worse, 'regression', names=('Model', 'Baseline'), n_resamples=500, 
+                                random_state=0).set_index('Metric')
+
+    assert (comparison['Significant'] == 'yes').all()
+    assert comparison.loc['MSE', 'Upper'] < 0 and comparison.loc['MAE', 'Upper'] < 0 and comparison.loc['R^2', 'Lower'] > 0
+    assert (comparison['Model Better'] == 1).all()
+    assert comparison.loc['MSE', 'Difference'] == pytest.approx(compute_metrics(y_true, good, 'regression')['MSE'] 
+                                                                - compute_metrics(y_true, worse, 'regression')['MSE'])
+
+
+def test_compare_models_does_not_flag_equivalent_models():
+    y_true, good, _ = regression_predictions(np.random.default_rng(0))
+    # The same errors on other samples
+    shuffled = y_true + np.random.default_rng(1).permutation(good - y_true)
+
+    comparison = compare_models(y_true, good, shuffled, 'regression', n_resamples=500, random_state=0)
+
+    assert (comparison['Significant'] == 'no').all()
+    assert ((comparison['Lower'] < 0) & (comparison['Upper'] > 0)).all()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import feature_engineering
+from analysis.config import VISUALIZATION_CONFIG
+from analysis.correlation import correlation_matrix, target_correlations
+
+
+def make_data(rng, n=500, n_features=10, missing_rate=0.0):
+    """Features with a range of correlations with the target, which is the last column."""
+    latent = rng.normal(size=n)
+    weights = np.linspace(-1, 1, n_features)
+    data = pd.DataFrame({f'x{i}': weight * latent + rng.normal(size=n) for i, weight in enumerate(weights)})
+    data['code'] = rng.integers(0, 5, size=n)
+    data['target'] = latent + rng.normal(scale=0.5, size=n)
+    if missing_rate:
+        data = data.mask(rng.random(data.shape) < missing_rate)
+    return data
+
+
+@pytest.mark.parametrize('missing_rate', [0.0, 0.1])
+@pytest.mark.parametrize('block_size', [3, 256])
+def test_target_correlations_match_dataframe_corr(missing_rate, block_size):
+    data = make_data(np.random.default_rng(0), missing_rate=missing_rate)
+    # A text column is left out, as by DataFrame.corr(numeric_only=True)
+    data.insert(2, 'city', 'Paris')
+
+    correlations = target_correlations(data, block_size=block_size)
+
+    expected = data.corr(numeric_only=True)['target']
+    pd.testing.assert_series_equal(correlations, expected, rtol=1e-10, check_names=False)
+    assert correlations['target'] == pytest.approx(1.0)
+
+
+def test_target_correlations_in_float32_are_close():
+    data = make_data(np.random.default_rng(1), missing_rate=0.05)
+
+    correlations = target_correlations(data, dtype='float32', block_size=4)
+
+    assert correlations.dtype == np.float32
+    np.testing.assert_allclose(correlations, data.corr()['target'], atol=1e-4)
+
+
+@pytest.mark.parametrize('missing_rate', [0.0, 0.1])
+@pytest.mark.parametrize('block_size', [64, 100000])
+def test_correlation_matrix_matches_dataframe_corr(missing_rate, block_size):
+    data = make_data(np.random.default_rng(2), missing_rate=missing_rate)
+
+    matrix = correlation_matrix(data, block_size=block_size)
+
+    pd.testing.assert_frame_equal(matrix, data.corr(), rtol=1e-9, atol=1e-12)
+
+
+def test_select_features_shows_the_features_most_correlated_with_the_target(monkeypatch):
+    data = make_data(np.random.default_rng(3), n_features=12)
+    monkeypatch.setitem(VISUALIZATION_CONFIG, 'correlation_matrix_max_columns', 5)
+    monkeypatch.setitem(VISUALIZATION_CONFIG, 'correlation_matrix_annotate_max', 4)
+    specs = []
+    monkeypatch.setattr(feature_engineering, 'draw', lambda spec, renderer=None: specs.append(spec) or spec.path)
+
+    selected = feature_engineering.select_features(data, threshold=0.4)
+
+    correlations = data.corr()['target']
+    top = correlations.drop('target').abs().sort_values(ascending=False).index[:4]
+    expected_columns = correlations[top].sort_values(ascending=False).index.tolist() + ['target']
+    (spec,) = specs
+    assert spec.params['columns'] == expected_columns
+    np.testing.assert_allclose(spec.params['matrix'], data[expected_columns].corr().to_numpy(), atol=1e-12)
+    assert spec.params['annotate'] is False
+    assert selected.columns.tolist() == correlations.index[correlations.abs() >= 0.4].tolist()
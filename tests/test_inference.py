@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import model_building
+from analysis.evaluation import compute_metrics
+from analysis.inference import predict_file, prepare_features
+from analysis.model_registry import ModelRegistry
+
+
+@pytest.fixture
+def houses():
+    rng = np.random.default_rng(0)
+    n = 1000
+    data = pd.DataFrame({'RM': rng.normal(6, 1, size=n), 'LSTAT': rng.gamma(3, 4, size=n), 'TAX': rng.integers(200, 700, size=n)})
+    data['MEDV'] = 5 * data['RM'] - 0.5 * data['LSTAT'] + rng.normal(size=n)
+    return data
+
+
+def test_predict_file_matches_predicting_the_whole_frame(houses, tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    model_building.train_model(houses, 'regression', 'decision_tree', registry=registry, name='houses')
+    model, meta = registry.load('houses')
+    # New data with missing features, the columns in another order and an extra column
+    new = houses.sample(frac=1, random_state=1).reset_index(drop=True)
+    new.loc[::7, 'RM'] = np.nan
+    new = new[['MEDV', 'TAX', 'LSTAT', 'RM']].assign(ID=np.arange(len(new)))
+    new.to_csv(tmp_path / 'new.csv', index=False)
+
+    n_rows, metrics = predict_file('houses', str(tmp_path / 'new.csv'), str(tmp_path / 'predictions.csv'), chunksize=97,
+                                   max_workers=2, registry_root=registry.root)
+
+    expected = model.predict(prepare_features(new, meta['preprocessing']))
+    predictions = pd.read_csv(tmp_path / 'predictions.csv')
+    assert n_rows == len(new)
+    pd.testing.assert_frame_equal(predictions.drop(columns='prediction'), new)
+    np.testing.assert_allclose(predictions['prediction'], expected)
+    expected_metrics = compute_metrics(new['MEDV'].to_numpy(), expected, 'regression')
+    assert metrics == pytest.approx(expected_metrics, rel=1e-9)
+
+
+def test_predict_file_without_the_target_only_writes_predictions(houses, tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    model_building.train_model(houses, 'regression', 'linear_regression', registry=registry, name='houses')
+    houses.drop(columns='MEDV').to_csv(tmp_path / 'new.csv', index=False)
+
+    n_rows, metrics = predict_file('houses', str(tmp_path / 'new.csv'), str(tmp_path / 'predictions.csv'), chunksize=300,
+                                   max_workers=1, registry_root=registry.root)
+
+    model, _ = registry.load('houses')
+    assert (n_rows, metrics) == (len(houses), None)
+    np.testing.assert_allclose(pd.read_csv(tmp_path / 'predictions.csv')['prediction'],
+                               model.predict(houses.drop(columns='MEDV')))
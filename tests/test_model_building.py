@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import model_building
+from analysis.config import INCREMENTAL_CONFIG, MODEL_CONFIG, TUNING_CONFIG
+from analysis.evaluation import LOWER_IS_BETTER
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def regression_chunks():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(4000, 3))
+    data = pd.DataFrame(X, columns=['a', 'b', 'c'])
+    data['y'] = X @ [1.0, 2.0, 3.0] + rng.normal(size=len(X))
+    return lambda: (data.iloc[start:start + 500] for start in range(0, len(data), 500))
+
+
+@pytest.fixture
+def checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setitem(INCREMENTAL_CONFIG, 'checkpoint_every', 2)
+    return str(tmp_path / 'regression_sgd.joblib')
+
+
+def interrupt_after(chunks, n_chunks):
+    def stream():
+        for index, chunk in enumerate(chunks()):
+            if index == n_chunks:
+                raise Interrupted
+            yield chunk
+    return stream
+
+
+def test_train_incremental_holds_out_the_same_rows_every_epoch(regression_chunks, checkpoint):
+    _, history = model_building.train_incremental(regression_chunks, 'regression', 'sgd', epochs=3, checkpoint=checkpoint)
+
+    validation_rows = history.pivot(index='Chunks', columns='Epoch', values='Validation Rows')
+    assert (validation_rows.nunique(axis=1) == 1).all()
+    # Every epoch trains on the same number of rows
+    trained = history.groupby('Epoch')['Rows Trained'].max().diff().dropna()
+    assert trained.nunique() == 1
+
+
+def test_train_incremental_resumes_a_matching_checkpoint(regression_chunks, checkpoint):
+    _, expected = model_building.train_incremental(regression_chunks, 'regression', 'sgd', checkpoint=checkpoint)
+    with pytest.raises(Interrupted):
+        model_building.train_incremental(interrupt_after(regression_chunks, 5), 'regression', 'sgd', checkpoint=checkpoint)
+
+    _, resumed = model_building.train_incremental(regression_chunks, 'regression', 'sgd', checkpoint=checkpoint)
+
+    pd.testing.assert_frame_equal(resumed.drop(columns='Time (s)'), expected.drop(columns='Time (s)'))
+
+
+@pytest.mark.parametrize('other_run', ['params', 'data'])
+def test_train_incremental_ignores_the_checkpoint_of_another_run(regression_chunks, checkpoint, other_run, capsys):
+    with pytest.raises(Interrupted):
+        model_building.train_incremental(interrupt_after(regression_chunks, 5), 'regression', 'sgd', checkpoint=checkpoint)
+
+    if other_run == 'params':
+        _, history = model_building.train_incremental(regression_chunks, 'regression', 'sgd', checkpoint=checkpoint, alpha=0.01)
+    else:
+        shuffled = lambda: (chunk.sample(frac=1, random_state=0) for chunk in regression_chunks())
+        _, history = model_building.train_incremental(shuffled, 'regression', 'sgd', checkpoint=checkpoint)
+
+    assert 'belongs to a different run' in capsys.readouterr().out
+    # Trained from the first chunk rather than from the checkpoint
+    assert history['Chunks'].iloc[0] == 2
+    assert history['Rows Trained'].iloc[0] < 1000
+
+
+def test_cross_validate_model_passes_n_jobs_to_the_estimator(regression_chunks, capsys):
+    data = next(regression_chunks())
+
+    y_true, y_oof, fold_scores = model_building.cross_validate_model(
+        data, 'regression', 'random_forest', strategy='kfold', n_splits=3, cv_jobs=1, n_estimators=5, n_jobs=2)
+
+    assert 'RandomForestRegressor(n_estimators=5, n_jobs=2)' in capsys.readouterr().out
+    assert len(fold_scores) == 3
+    assert len(y_true) == len(y_oof) == len(data)
+
+
+@pytest.fixture
+def tiny_search(monkeypatch):
+    """Nine depths of a decision tree, tuned over 10, 30 and all 96 training rows of 120 rows."""
+    monkeypatch.setitem(MODEL_CONFIG, 'search_space', {'regression': {'decision_tree': {'max_depth': list(range(1, 10))}}})
+    monkeypatch.setitem(TUNING_CONFIG, 'resource', 'n_samples')
+    monkeypatch.setitem(TUNING_CONFIG, 'factor', 3)
+    monkeypatch.setitem(TUNING_CONFIG, 'min_samples', 10)
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(120, 3)), columns=['a', 'b', 'c'])
+    data['y'] = np.sin(3 * data['a']) + data['b'] ** 2 + rng.normal(scale=0.1, size=len(data))
+    return data
+
+
+def test_tune_model_halves_the_candidates_every_rung(tiny_search):
+    method, params, history = model_building.tune_model(tiny_search, 'regression', budget=600, n_jobs=1)
+
+    rungs = history.groupby('Rung').agg(candidates=('Params', 'size'), resource=('Resource', 'first'))
+    assert rungs['candidates'].tolist() == [9, 3, 1]
+    assert rungs['resource'].tolist() == [10, 30, 96]
+    # Every rung continues with the best third of the previous rung
+    for rung in (1, 2):
+        previous, following = history[history['Rung'] == rung], history[history['Rung'] == rung + 1]
+        best = previous.nsmallest(len(following), 'MSE', keep='first')['Params']
+        assert sorted(following['Params']) == sorted(best)
+    last = history[history['Rung'] == 3].iloc[0]
+    assert method == 'decision_tree' and last['Params'] == f"max_depth={params['max_depth']}"
+
+
+def test_tune_model_stops_before_a_rung_that_exceeds_the_budget(tiny_search, capsys):
+    method, params, history = model_building.tune_model(tiny_search, 'regression', budget=1e-6, n_jobs=1)
+
+    assert 'Stopped before rung 2' in capsys.readouterr().out
+    assert history['Rung'].unique().tolist() == [1] and len(history) == 9
+    best = history.loc[history['MSE'].idxmin()]
+    assert best['Params'] == f"max_depth={params['max_depth']}"
+
+
+def test_cluster_sweep_scores_every_number_of_clusters_and_selects_the_best():
+    rng = np.random.default_rng(0)
+    centers = np.array([(0, 0), (6, 0), (0, 6), (6, 6)])
+    data = pd.DataFrame(centers[rng.integers(0, 4, size=400)] + rng.normal(size=(400, 2)), columns=['a', 'b'])
+    data['target'] = rng.normal(size=len(data))
+
+    best_k, model, sweep = model_building.cluster_sweep(data, k_range=[2, 3, 4, 5, 6], method='kmeans', n_jobs=1)
+
+    assert sweep['Clusters'].tolist() == [2, 3, 4, 5, 6]
+    assert sweep[['Inertia', 'Silhouette', 'Calinski-Harabasz', 'Davies-Bouldin']].notna().all().all()
+    assert sweep['Inertia'].is_monotonic_decreasing
+    assert best_k == 4 == sweep.loc[sweep['Silhouette'].idxmax(), 'Clusters']
+    assert len(np.unique(model.predict(data[['a', 'b']].to_numpy()))) == 4
+
+
+@pytest.mark.parametrize('problem_type, metric, candidates', [
+    ('regression', 'MSE', [('decision_tree', {'max_depth': 1}), ('linear_regression', {}), ('decision_tree', {})]),
+    ('classification', 'Accuracy', [('decision_tree', {'max_depth': 1}), ('logistic_regression', {}), ('decision_tree', {})]),
+])
+def test_train_model_grid_ranks_the_candidates_by_the_metric(problem_type, metric, candidates):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 3))
+    data = pd.DataFrame(X, columns=['a', 'b', 'c'])
+    signal = X @ [1.0, 2.0, 3.0] + rng.normal(size=len(X))
+    data['y'] = signal if problem_type == 'regression' else (signal > 0).astype(int)
+
+    leaderboard = model_building.train_model_grid(data, problem_type, candidates=candidates, n_jobs=1)
+
+    assert leaderboard.index.tolist() == [1, 2, 3]
+    assert sorted(leaderboard['Method']) == sorted(method for method, params in candidates)
+    # Errors are ranked lowest first and scores highest first
+    assert (metric in LOWER_IS_BETTER) == (problem_type == 'regression')
+    ranked = leaderboard[metric]
+    assert ranked.is_monotonic_increasing if metric in LOWER_IS_BETTER else ranked.is_monotonic_decreasing
+    assert leaderboard['Method'].iloc[0] in ('linear_regression', 'logistic_regression')
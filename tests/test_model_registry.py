@@ -0,0 +1,67 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from analysis.model_registry import ModelRegistry
+
+
+def fitted(slope):
+    x = np.arange(10.0).reshape(-1, 1)
+    return LinearRegression().fit(x, slope * x.ravel())
+
+
+def test_saved_models_are_loaded_back_by_version(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    preprocessing = {'features': ['x'], 'target': 'y', 'fill_values': {'x': 4.5}}
+
+    assert registry.versions('line') == [] and registry.latest_version('line') is None
+    first = registry.save('line', fitted(1.0), preprocessing=preprocessing, metadata={'problem_type': 'regression'})
+    second = registry.save('line', fitted(2.0), preprocessing=preprocessing)
+    registry.save('other', fitted(3.0))
+
+    assert (first, second) == (1, 2)
+    assert registry.versions('line') == [1, 2] and registry.latest_version('line') == 2
+    latest, meta = registry.load('line')
+    older, older_meta = registry.load('line', version=1)
+    assert latest.predict([[1.0]]) == pytest.approx([2.0]) and older.predict([[1.0]]) == pytest.approx([1.0])
+    assert meta['version'] == 2 and older_meta['version'] == 1
+    assert older_meta['preprocessing'] == preprocessing and older_meta['problem_type'] == 'regression'
+    assert 'problem_type' not in meta and meta['estimator'] == 'LinearRegression()'
+    assert registry.metadata('line', 1) == older_meta
+    # Nothing but the versions is left in the model directory
+    assert sorted(os.listdir(tmp_path / 'models' / 'line')) == ['v1', 'v2']
+    with open(tmp_path / 'models' / 'line' / 'v2' / 'meta.json') as file:
+        assert json.load(file) == meta
+
+
+def test_a_version_saved_concurrently_is_not_overwritten(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path))
+    registry.save('line', fitted(1.0))
+    # Another process saves version 2 after this one has looked up the latest version
+    latest_version, lookups = registry.latest_version, []
+
+    def stale_latest_version(name):
+        lookups.append(name)
+        return 1 if len(lookups) == 1 else latest_version(name)
+
+    monkeypatch.setattr(registry, 'latest_version', stale_latest_version)
+    os.makedirs(tmp_path / 'line' / 'v2')
+    (tmp_path / 'line' / 'v2' / 'marker').write_text('other process')
+
+    version = registry.save('line', fitted(2.0))
+
+    assert version == 3
+    assert (tmp_path / 'line' / 'v2' / 'marker').read_text() == 'other process'
+    assert registry.load('line')[0].predict([[1.0]]) == pytest.approx([2.0])
+
+
+@pytest.mark.parametrize('version', [None, 3])
+def test_missing_models_raise_file_not_found(tmp_path, version):
+    registry = ModelRegistry(str(tmp_path))
+    registry.save('line', fitted(1.0))
+
+    with pytest.raises(FileNotFoundError):
+        registry.load('missing' if version is None else 'line', version)
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from joblib import cpu_count
+
+from analysis import model_building
+from analysis.config import MODEL_CONFIG, PIPELINE_CONFIG
+from analysis.pipeline import Pipeline, _StageOutput
+
+
+def chatty(name, started, pdf=None):
+    # Both stages print while the other is running
+    print(f'{name} 1')
+    started.wait()
+    for line in range(2, 5):
+        print(f'{name} {line}')
+    return name
+
+
+def test_concurrent_stages_print_their_output_in_one_piece(capsys):
+    started = threading.Barrier(2, timeout=5)
+    pipeline = Pipeline()
+    pipeline.add('a', chatty, outputs=('a',), name='a', started=started)
+    pipeline.add('b', chatty, outputs=('b',), name='b', started=started)
+
+    values = pipeline.run(max_workers=2)
+
+    assert values == {'a': 'a', 'b': 'b'}
+    lines = [line for line in capsys.readouterr().out.splitlines() if line[:2] in ('a ', 'b ')]
+    assert lines in ([f'a {line}' for line in range(1, 5)] + [f'b {line}' for line in range(1, 5)],
+                     [f'b {line}' for line in range(1, 5)] + [f'a {line}' for line in range(1, 5)])
+    assert not isinstance(sys.stdout, _StageOutput)
+
+
+def test_the_output_of_a_failed_stage_is_printed(capsys):
+    def fail(pdf=None):
+        print('about to fail')
+        raise ValueError('failed')
+
+    pipeline = Pipeline().add('fail', fail).add('other', lambda pdf=None: None)
+
+    with pytest.raises(RuntimeError, match='Stage fail failed'):
+        pipeline.run(max_workers=2)
+
+    assert 'about to fail' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_the_worker_processes_of_concurrent_stages_are_capped(monkeypatch, max_workers):
+    monkeypatch.setitem(MODEL_CONFIG, 'n_jobs', -1)
+    monkeypatch.setitem(PIPELINE_CONFIG, 'stage_jobs', None)
+
+    pipeline = Pipeline()
+    pipeline.add('resolve', lambda pdf=None: model_building._n_jobs(), outputs=('n_jobs',))
+    pipeline.add('explicit', lambda pdf=None: model_building._n_jobs(3), outputs=('explicit',))
+    values = pipeline.run(max_workers=max_workers)
+
+    assert values['n_jobs'] == (-1 if max_workers == 1 else max(cpu_count() // 2, 1))
+    assert values['explicit'] == 3
+
+
+COLD_RUN = '''
+import sys
+import numpy as np
+import pandas as pd
+from analysis import model_building
+from analysis.pipeline import Pipeline
+
+assert 'sklearn' not in sys.modules
+
+def split(data, pdf=None):
+    from sklearn.model_selection import train_test_split
+    return len(train_test_split(data, random_state=0)[0])
+
+rng = np.random.default_rng(0)
+data = pd.DataFrame(rng.normal(size=(200, 4)), columns=['a', 'b', 'c', 'target'])
+pipeline = Pipeline()
+pipeline.add('split', split, inputs=('data',), outputs=('n_train',))
+pipeline.add('train_model', model_building.train_model, inputs=('data',), outputs=(None, None), 
+             problem_type='regression', method='decision_tree')
+pipeline.add('cross_validate_model', model_building.cross_validate_model, inputs=('data',), outputs=(None, None, None), 
+             problem_type='regression', method='linear_regression', n_splits=3, cv_jobs=1)
+pipeline.add('build_model', lambda pdf=None: model_building.build_model('clustering', 'kmeans'), outputs=('kmeans',))
+values = pipeline.run({'data': data}, max_workers=4, preload=model_building.estimator_modules())
+print('n_train', values['n_train'])
+'''
+
+
+@pytest.mark.parametrize('attempt', range(3))
+def test_concurrent_stages_importing_sklearn_start_in_a_cold_interpreter(tmp_path, attempt):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+
+    result = subprocess.run([sys.executable, '-c', COLD_RUN], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+
+    assert result.returncode == 0, result.stderr
+    assert 'n_train 150' in result.stdout
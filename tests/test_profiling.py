@@ -0,0 +1,97 @@
+import os
+import threading
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from analysis import profiling
+from analysis.config import PROFILING_CONFIG
+
+MB = 2**20
+
+
+@pytest.fixture
+def run(monkeypatch):
+    monkeypatch.setitem(PROFILING_CONFIG, 'enabled', True)
+    return profiling.start_run()
+
+
+@pytest.fixture
+def traced():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def records(run):
+    return run.to_frame().set_index('Function')['Peak Memory (MB)']
+
+
+@profiling.instrument
+def allocate(megabytes, then=None):
+    block = np.ones(megabytes * MB // 8)
+    if then is not None:
+        then()
+    return block.sum()
+
+
+@profiling.instrument
+def small():
+    return np.ones(MB // 8).sum()
+
+
+def test_nested_calls_keep_their_own_traced_peak(run, traced):
+    allocate(50, then=small)
+
+    peaks = records(run)
+    assert (run.to_frame()['Memory Source'] == 'tracemalloc').all()
+    assert 50 <= peaks['test_profiling.allocate'] < 55
+    assert 1 <= peaks['test_profiling.small'] < 5
+
+
+def test_concurrent_calls_keep_their_own_traced_peak(run, traced):
+    started, release = threading.Barrier(2), threading.Event()
+
+    @profiling.instrument
+    def hold(megabytes):
+        # The peak is reached and freed before the other call starts
+        total = np.ones(megabytes * MB // 8).sum()
+        started.wait()
+        release.wait()
+        return total
+
+    thread = threading.Thread(target=hold, args=(40,))
+    thread.start()
+    started.wait()
+    # The call started beside the first one resets the global peak, which must not lose the peak of the first
+    small()
+    release.set()
+    thread.join()
+
+    peaks = records(run)
+    assert 40 <= peaks['test_profiling.hold'] < 50
+    assert 1 <= peaks['test_profiling.small'] < 45
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='The current RSS cannot be read')
+def test_rss_peak_is_measured_per_call(run):
+    allocate(200)
+    # A later, smaller call does not report the high-water mark of the process
+    small()
+
+    peaks = records(run)
+    assert (run.to_frame()['Memory Source'] == 'rss').all()
+    assert peaks['test_profiling.allocate'] >= 150
+    assert peaks['test_profiling.small'] < 50
+
+
+def test_every_profiled_call_keeps_its_own_statistics(run, tmp_path, monkeypatch):
+    monkeypatch.setitem(PROFILING_CONFIG, 'cprofile_function', 'small')
+    monkeypatch.setitem(PROFILING_CONFIG, 'cprofile_dir', str(tmp_path))
+    monkeypatch.setattr(profiling, '_profiled_calls', {})
+
+    small()
+    small()
+
+    assert sorted(os.listdir(tmp_path)) == ['small_1.prof', 'small_2.prof']
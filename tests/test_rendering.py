@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from analysis.config import VISUALIZATION_CONFIG
+from analysis.rendering import (FigureRenderer, PlotSpec, decimate_lttb, decimate_minmax, draw, line_points, render,
+                                scatter_points)
+
+
+def spec(path=None):
+    rng = np.random.default_rng(0)
+    return PlotSpec('histograms', path, figsize=(4, 3), dpi=50, columns=['a', 'b'],
+                    values=[rng.normal(size=100), np.append(rng.normal(size=99), np.nan)], title='Histograms')
+
+
+def test_render_saves_an_opaque_png_of_the_figure_size(tmp_path):
+    path = str(tmp_path / 'histograms.png')
+
+    assert render(spec(path)) == path
+
+    with Image.open(path) as image:
+        assert image.format == 'PNG' and image.mode == 'RGB'
+        assert image.size == (200, 150)
+
+
+def test_render_without_a_path_returns_the_png_bytes(tmp_path):
+    path = str(tmp_path / 'histograms.png')
+    render(spec(path))
+
+    image = render(spec())
+
+    assert image[:8] == b'\x89PNG\r\n\x1a\n'
+    with open(path, 'rb') as file:
+        assert file.read() == image
+
+
+def test_every_plot_kind_renders(tmp_path):
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=50)
+    specs = [PlotSpec('boxplot', columns=['a'], values=[values]),
+             PlotSpec('scatter_grid', features=['a'], target='y', points=[{'x': values, 'y': values}], title='Scatter'),
+             PlotSpec('correlation_matrix', columns=['a', 'b'], matrix=np.array([[1.0, 0.5], [0.5, 1.0]])),
+             PlotSpec('regression_scatter', points={'x': values, 'y': values}, min_val=-3, max_val=3),
+             PlotSpec('regression_line', actual={'x': np.arange(50), 'y': values}, predicted={'x': np.arange(50), 'y': values})]
+
+    for plot in specs:
+        plot.dpi = 30
+        assert render(plot)[:4] == b'\x89PNG', plot.kind
+
+
+def test_the_renderer_renders_in_the_background(tmp_path):
+    paths = [str(tmp_path / f'figure_{index}.png') for index in range(3)]
+
+    with FigureRenderer(max_workers=1) as renderer:
+        futures = [draw(spec(path), renderer) for path in paths]
+        results = [future.result(timeout=60) for future in futures]
+
+    assert results == paths
+    with Image.open(paths[0]) as background, Image.open(render(spec(str(tmp_path / 'direct.png')))) as direct:
+        assert np.array_equal(np.asarray(background), np.asarray(direct))
+
+
+def random_walk(seed, n):
+    rng = np.random.default_rng(seed)
+    y = rng.normal(size=n).cumsum()
+    # Sharp spikes, which a decimated line must not cut off
+    y[rng.integers(1, n - 1, size=2)] = y.max() + 50, y.min() - 50
+    return y
+
+
+@pytest.mark.parametrize('n, max_points', [(10_000, 500), (10_001, 100), (1_234, 3)])
+def test_lttb_keeps_the_endpoints_and_spikes_with_the_requested_length(n, max_points):
+    y = random_walk(n, n)
+
+    index = decimate_lttb(np.arange(n), y, max_points)
+
+    assert len(index) == max_points
+    assert index[0] == 0 and index[-1] == n - 1
+    assert (np.diff(index) > 0).all()
+    if max_points > 3:
+        assert y.argmax() in index and y.argmin() in index
+
+
+@pytest.mark.parametrize('n, max_points', [(10_000, 500), (10_001, 100), (999, 11)])
+def test_minmax_keeps_the_endpoints_and_the_envelope_within_the_requested_length(n, max_points):
+    y = random_walk(n, n)
+
+    index = decimate_minmax(y, max_points)
+
+    assert len(index) <= max_points
+    assert index[0] == 0 and index[-1] == n - 1
+    assert (np.diff(index) > 0).all()
+    assert y.argmax() in index and y.argmin() in index
+    # The min and max of every bucket are kept
+    bucket_size = -(-n // ((max_points - 2) // 2))
+    for start in range(0, n, bucket_size):
+        bucket = y[start:start + bucket_size]
+        assert start + bucket.argmin() in index and start + bucket.argmax() in index
+
+
+def test_short_lines_are_not_decimated():
+    y = np.arange(10.0)
+
+    assert decimate_lttb(np.arange(10), y, 20).tolist() == list(range(10))
+    assert decimate_minmax(y, 20).tolist() == list(range(10))
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_line_points_are_decimated_above_the_threshold(monkeypatch, method):
+    monkeypatch.setitem(VISUALIZATION_CONFIG, 'aggregation_threshold', 1000)
+    monkeypatch.setitem(VISUALIZATION_CONFIG, 'line_max_points', 200)
+    monkeypatch.setitem(VISUALIZATION_CONFIG, 'line_decimation', method)
+    y = random_walk(0, 5000)
+
+    small, large = line_points(y[:1000]), line_points(y)
+
+    np.testing.assert_array_equal(small['x'], np.arange(1000))
+    np.testing.assert_array_equal(small['y'], y[:1000])
+    assert len(large['x']) == 200 if method == 'lttb' else len(large['x']) <= 200
+    np.testing.assert_array_equal(large['y'], y[large['x']])
+    assert large['y'].max() == y.max() and large['y'].min() == y.min()
+
+
+def test_scatter_points_become_a_2d_histogram_above_the_threshold(monkeypatch):
+    monkeypatch.setitem(VISUALIZATION_CONFIG, 'aggregation_threshold', 1000)
+    monkeypatch.setitem(VISUALIZATION_CONFIG, 'density_bins', 20)
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=1001), rng.normal(size=1001)
+    x[0] = np.nan
+
+    small, large = scatter_points(x[:1000], y[:1000]), scatter_points(x, y)
+
+    assert set(small) == {'x', 'y'} and len(small['x']) == 1000
+    assert set(large) == {'counts', 'xedges', 'yedges'}
+    assert large['counts'].shape == (20, 20) and large['counts'].sum() == 1000
+    assert large['xedges'][0] == np.nanmin(x) and large['xedges'][-1] == np.nanmax(x)
+    # The histogram is drawn instead of the points
+    image = render(PlotSpec('regression_scatter', figsize=(3, 3), dpi=30, points=large, min_val=-3, max_val=3))
+    assert image[:4] == b'\x89PNG'
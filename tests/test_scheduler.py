@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from crawler.scheduler import crawl
+from crawler.sinks import open_sink
+
+
+def test_crawl_parses_every_page_of_every_keyword_in_order(search_site):
+    search_site.add_keyword('python', n_pages=7)
+    search_site.add_keyword('pandas', n_pages=2)
+    search_site.add_keyword('empty', n_pages=0)
+
+    videos = crawl(['python', 'pandas', 'empty', 'python'], max_workers=4, search_url=search_site.url)
+
+    expected = pd.DataFrame(search_site.records('python') + search_site.records('pandas'),
+                            columns=['Keyword', 'Page', 'Title', 'Author', 'Dates'])
+    pd.testing.assert_frame_equal(videos, expected)
+    # Every page is fetched once, and the first page of a keyword before any other
+    assert sorted(search_site.requests) == sorted([('python', page) for page in range(1, 8)]
+                                                  + [('pandas', 1), ('pandas', 2), ('empty', 1)])
+    for keyword in ('python', 'pandas'):
+        pages = [page for key, page in search_site.requests if key == keyword]
+        assert pages[0] == 1
+    assert 1 < search_site.max_in_flight <= 4
+
+
+def test_crawl_stops_at_max_pages(search_site):
+    search_site.add_keyword('python', n_pages=5)
+    search_site.add_keyword('pandas', n_pages=2)
+
+    videos = crawl(['python', 'pandas'], max_pages=3, max_workers=2, search_url=search_site.url)
+
+    assert videos.groupby('Keyword', sort=False)['Page'].unique().map(list).to_dict() == {'python': [1, 2, 3],
+                                                                                           'pandas': [1, 2]}
+    assert len(search_site.requests) == 5
+    assert search_site.max_in_flight <= 2
+
+
+@pytest.mark.parametrize('extension', ['csv', 'jsonl'])
+def test_crawl_writes_every_record_to_a_sink(search_site, tmp_path, extension):
+    search_site.add_keyword('python', n_pages=4)
+
+    with open_sink(str(tmp_path / f'videos.{extension}'), append=False) as sink:
+        n_records = crawl(['python'], search_url=search_site.url, sink=sink)
+
+    written = (pd.read_csv(sink.path) if extension == 'csv' else pd.read_json(sink.path, lines=True))
+    assert n_records == len(written) == 12
+    # A sink receives pages in completion order
+    written = written.sort_values(['Page'], kind='stable').reset_index(drop=True)
+    expected = pd.DataFrame(search_site.records('python'))
+    pd.testing.assert_frame_equal(written.astype(str), expected.astype(str))
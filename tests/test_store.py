@@ -0,0 +1,111 @@
+from urllib.error import HTTPError
+
+import pandas as pd
+import pytest
+
+from crawler.scheduler import HTTPFetcher, crawl
+from crawler.store import CrawlStore
+
+COLUMNS = ['Keyword', 'Page', 'Title', 'Author', 'Dates']
+
+
+def no_retries(search_url):
+    return HTTPFetcher(search_url, retries=1)
+
+
+@pytest.fixture
+def store(tmp_path):
+    with CrawlStore(str(tmp_path / 'state' / 'crawl_state.sqlite')) as store:
+        yield store
+
+
+def test_an_interrupted_crawl_resumes_at_the_pages_not_visited(search_site, store, capsys):
+    search_site.add_keyword('python', n_pages=6)
+    search_site.add_keyword('pandas', n_pages=2)
+    search_site.failing.add(('python', 4))
+
+    with pytest.raises(HTTPError):
+        crawl(['pandas', 'python'], max_workers=2, fetcher=no_retries, search_url=search_site.url, store=store)
+
+    visited = store.visited_pages('python')
+    assert 1 in visited and 4 not in visited
+    assert store.page_count('python') == 6
+
+    search_site.failing.clear()
+    search_site.requests.clear()
+    visited = {keyword: store.visited_pages(keyword) for keyword in ('pandas', 'python')}
+    videos = crawl(['pandas', 'python'], max_workers=2, fetcher=no_retries, search_url=search_site.url, store=store)
+
+    assert 'Resuming the crawl of "python"' in capsys.readouterr().out
+    assert sorted(search_site.requests) == sorted((keyword, page) for keyword, pages in (('pandas', 2), ('python', 6))
+                                                  for page in range(1, pages + 1) if page not in visited[keyword])
+    expected = pd.DataFrame(search_site.records('pandas') + search_site.records('python'), columns=COLUMNS)
+    pd.testing.assert_frame_equal(videos, expected)
+
+
+def test_a_crawl_of_a_new_store_path_starts_from_scratch(search_site, tmp_path):
+    search_site.add_keyword('python', n_pages=3)
+
+    with CrawlStore(str(tmp_path / 'first.sqlite')) as first:
+        crawl(['python'], search_url=search_site.url, store=first)
+    search_site.requests.clear()
+    with CrawlStore(str(tmp_path / 'second.sqlite')) as second:
+        videos = crawl(['python'], search_url=search_site.url, store=second)
+
+    assert sorted(search_site.requests) == [('python', 1), ('python', 2), ('python', 3)]
+    assert len(videos) == 9
+
+
+def test_an_incremental_crawl_stops_at_the_videos_already_seen(search_site, store, capsys):
+    search_site.add_keyword('python', n_pages=5)
+    crawl(['python'], search_url=search_site.url, store=store)
+
+    # Four new videos are published, which pushes the older ones back by a page and a bit
+    new_videos = [(f'python new {index}', 'author new', '· 2024-10-18') for index in range(4)]
+    search_site.set_videos('python', new_videos + search_site.videos('python'))
+    search_site.requests.clear()
+    videos = crawl(['python'], search_url=search_site.url, store=store, incremental=True)
+
+    assert search_site.requests == [('python', 1), ('python', 2)]
+    assert 'Reached the videos already seen for "python"' in capsys.readouterr().out
+    expected = pd.DataFrame([{'Keyword': 'python', 'Page': 1 if index < 3 else 2, 'Title': title, 'Author': author,
+                              'Dates': date} for index, (title, author, date) in enumerate(new_videos)], columns=COLUMNS)
+    pd.testing.assert_frame_equal(videos, expected)
+    assert len(store.videos(['python'])) == 19
+
+    # Nothing new has been published since
+    search_site.requests.clear()
+    videos = crawl(['python'], search_url=search_site.url, store=store, incremental=True)
+    assert search_site.requests == [('python', 1)]
+    assert videos.empty
+
+
+def test_an_incremental_crawl_requires_a_store(search_site):
+    with pytest.raises(ValueError):
+        crawl(['python'], search_url=search_site.url, incremental=True)
+
+
+def test_reset_forgets_the_visited_pages_but_keeps_the_seen_videos(search_site, store, capsys):
+    search_site.add_keyword('python', n_pages=3)
+    search_site.add_keyword('pandas', n_pages=2)
+    crawl(['python', 'pandas'], search_url=search_site.url, store=store)
+
+    store.reset('python')
+
+    assert store.visited_pages('python') == set()
+    assert store.page_count('python') is None
+    assert store.visited_pages('pandas') == {1, 2}
+    stored = store.videos(['python', 'pandas'])
+    assert len(stored) == 15
+
+    # A new crawl revisits every page of the keyword, where every video is already known
+    search_site.requests.clear()
+    capsys.readouterr()
+    videos = crawl(['python', 'pandas'], search_url=search_site.url, store=store)
+    assert sorted(search_site.requests) == [('python', 1), ('python', 2), ('python', 3)]
+    assert capsys.readouterr().out.count('(3 videos, 0 new)') == 3
+    pd.testing.assert_frame_equal(videos, stored)
+
+    store.reset()
+    assert store.visited_pages('python') == store.visited_pages('pandas') == set()
+    assert len(store.videos()) == 15
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.streaming import DistinctSketch, QuantileSketch
+
+QUANTILES = np.linspace(0.01, 0.99, 99)
+
+
+def rank_error(sorted_values, estimates, quantiles):
+    """Returns the largest difference between the true normalized rank of an estimate and its quantile."""
+    return np.abs(np.searchsorted(sorted_values, estimates) / sorted_values.size - quantiles).max()
+
+
+def merge_pairwise(sketches):
+    while len(sketches) > 1:
+        for left, right in zip(sketches[::2], sketches[1::2]):
+            left.merge(right)
+        sketches = sketches[::2]
+    return sketches[0]
+
+
+@pytest.mark.parametrize('k, tolerance', [(200, 0.025), (1000, 0.006)])
+@pytest.mark.parametrize('seed', range(3))
+def test_quantile_sketch_is_within_its_rank_error(k, tolerance, seed):
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(size=500_000)
+    sketch = QuantileSketch(k, seed=seed)
+    for chunk in np.array_split(values, 50):
+        sketch.update(chunk)
+
+    sorted_values = np.sort(values)
+    assert sketch.n == values.size
+    assert rank_error(sorted_values, sketch.quantile(QUANTILES), QUANTILES) <= tolerance
+    ranks = sketch.rank(np.quantile(values, QUANTILES)) / values.size
+    assert np.abs(ranks - QUANTILES).max() <= tolerance
+    # The memory use stays far below the number of values
+    assert sum(level.size for level in sketch.levels) < 10 * k
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_merged_quantile_sketches_are_within_the_rank_error(seed):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=400_000)
+    chunks = np.split(values, np.sort(rng.integers(0, values.size, size=36)))
+    sketches = []
+    for index, chunk in enumerate(chunks):
+        sketch = QuantileSketch(200, seed=index)
+        sketch.update(chunk)
+        sketches.append(sketch)
+
+    merged = merge_pairwise(sketches)
+
+    assert merged.n == values.size
+    assert rank_error(np.sort(values), merged.quantile(QUANTILES), QUANTILES) <= 0.025
+
+
+def test_quantile_sketch_is_exact_until_it_compacts():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=150)
+    left, right = QuantileSketch(200), QuantileSketch(200)
+    left.update(np.append(values[:100], np.nan))
+    right.update(values[100:])
+    left.merge(right)
+
+    np.testing.assert_allclose(left.quantile(QUANTILES), pd.Series(values).quantile(QUANTILES).to_numpy())
+    assert np.isnan(QuantileSketch().quantile(0.5))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_distinct_sketch_is_within_its_relative_error(seed):
+    rng = np.random.default_rng(seed)
+    values = np.floor(rng.random(300_000) * 1e6) + seed * 1e7
+    sketch = DistinctSketch(1024)
+    for chunk in np.array_split(values, 30):
+        sketch.update(chunk)
+
+    exact = np.unique(values).size
+    # The standard error is about 1 / sqrt(k), about 3 %
+    assert abs(sketch.count() / exact - 1) <= 0.12
+
+
+def test_merged_distinct_sketches_equal_the_sketch_of_all_values():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 50_000, size=200_000).astype(str)
+    whole = DistinctSketch(512)
+    whole.update(values)
+    # Overlapping chunks share many values, which a merge must count once
+    sketches = []
+    for start in range(0, values.size, 15_000):
+        sketch = DistinctSketch(512)
+        sketch.update(values[start:start + 20_000])
+        sketches.append(sketch)
+
+    merged = merge_pairwise(sketches)
+
+    np.testing.assert_array_equal(merged.hashes, whole.hashes)
+    assert merged.count() == whole.count()
+
+
+def test_distinct_sketch_is_exact_below_k():
+    sketch, other = DistinctSketch(1024), DistinctSketch(1024)
+    sketch.update(['a', 'b', None, 'a'])
+    other.update(pd.Series(['b', 'c', np.nan]))
+    sketch.merge(other)
+
+    assert sketch.count() == 3